@@ -0,0 +1,185 @@
+"""
+Persistent on-disk cache of audio analysis results.
+
+Per-frame crispness scores (.npy, memory-mapped on load) and candidate peaks
+(.npz) are stored per source, keyed by a fast content fingerprint of the
+file plus every parameter that changes the analysis. Selection parameters
+(TARGET_DURATION, PRE_ROLL, POST_ROLL, ...) are not part of the key, so
+re-tuning them goes straight to selection and cutting.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+# Bump when the feature/score computation changes.
+# 2: scores and peaks changed since version 1 (coarse-to-fine windows, PCM store audio)
+CACHE_VERSION = 2
+FINGERPRINT_CHUNK = 64 * 1024
+FINGERPRINT_SAMPLES = 16  # Evenly spaced chunks hashed besides head and tail
+PATH_INDEX = "paths.json"
+
+
+def cache_home():
+    """Per-user cache directory of the application (honours XDG_CACHE_HOME)."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "asmr-pro-cutter")
+
+
+def default_cache_dir():
+    return os.path.join(cache_home(), "analysis")
+
+
+def fingerprint(path):
+    """Fast content fingerprint: file size plus hashes of the head, the tail and evenly spaced chunks."""
+    size = os.path.getsize(path)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(size).encode())
+    with open(path, "rb") as f:
+        if size <= FINGERPRINT_CHUNK * (FINGERPRINT_SAMPLES + 2):
+            h.update(f.read())
+        else:
+            offsets = [0, size - FINGERPRINT_CHUNK]
+            offsets += [size * i // (FINGERPRINT_SAMPLES + 1) for i in range(1, FINGERPRINT_SAMPLES + 1)]
+            for offset in offsets:
+                f.seek(offset)
+                h.update(f.read(FINGERPRINT_CHUNK))
+    return h.hexdigest()
+
+
+def _params_digest(params):
+    text = json.dumps({"version": CACHE_VERSION, **params}, sort_keys=True)
+    return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+
+
+class CachedAnalysis:
+    """One cache entry: memory-mapped scores plus candidate peaks."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.scores = np.load(os.path.join(path, "scores.npy"), mmap_mode="r")
+        with np.load(os.path.join(path, "candidates.npz")) as candidates:
+            self.candidate_frames = candidates["frames"]
+            self.candidate_heights = candidates["heights"]
+
+    @property
+    def mean_score(self):
+        return self.meta["mean_score"]
+
+
+class AnalysisCache:
+    """Directory of analysis entries with LRU eviction above `max_bytes`.
+
+    Entries are named `<fingerprint>-<params digest>`. When a source path is
+    seen again with different content, the entries of its old fingerprint
+    are dropped.
+    """
+
+    def __init__(self, root=None, max_bytes=2 * 1024 ** 3):
+        self.root = root or default_cache_dir()
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+    def _entry_path(self, fp, params):
+        return os.path.join(self.root, f"{fp}-{_params_digest(params)}")
+
+    def get(self, video_path, params):
+        """Cached analysis for this source and parameters, or None."""
+        fp = self._check_source(video_path)
+        path = self._entry_path(fp, params)
+        if not os.path.isfile(os.path.join(path, "meta.json")):
+            return None
+        try:
+            entry = CachedAnalysis(path)
+        except (OSError, ValueError, KeyError):
+            # Damaged entry: drop it and recompute
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        # Record the access for LRU eviction
+        os.utime(os.path.join(path, "meta.json"))
+        return entry
+
+    def put(self, video_path, params, scores, mean_score, candidate_frames, candidate_heights):
+        """Store an analysis result (written to a temp dir, then renamed into place)."""
+        fp = self._check_source(video_path)
+        path = self._entry_path(fp, params)
+        tmp = tempfile.mkdtemp(prefix=".tmp-", dir=self.root)
+        try:
+            np.save(os.path.join(tmp, "scores.npy"), np.asarray(scores, dtype=np.float32))
+            np.savez(os.path.join(tmp, "candidates.npz"),
+                     frames=np.asarray(candidate_frames), heights=np.asarray(candidate_heights))
+            meta = {
+                "source": os.path.abspath(video_path),
+                "fingerprint": fp,
+                "params": params,
+                "mean_score": float(mean_score),
+                "n_frames": int(len(scores)),
+                "created": time.time(),
+            }
+            with open(os.path.join(tmp, "meta.json"), "w") as f:
+                json.dump(meta, f, indent=2)
+            try:
+                os.rename(tmp, path)
+            except OSError:
+                # Another process stored the same entry first
+                shutil.rmtree(tmp, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        self.evict(keep=path)
+
+    def evict(self, keep=None):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        total = 0
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(e.stat().st_size for e in os.scandir(path))
+                last_used = os.path.getmtime(os.path.join(path, "meta.json"))
+            except OSError:
+                continue
+            entries.append((last_used, size, path))
+            total += size
+
+        for last_used, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def _check_source(self, video_path):
+        """Fingerprint the source and drop entries left over from older contents of the same path."""
+        fp = fingerprint(video_path)
+        index_path = os.path.join(self.root, PATH_INDEX)
+        try:
+            with open(index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+
+        source = os.path.abspath(video_path)
+        old = index.get(source)
+        if old == fp:
+            return fp
+        if old is not None and old not in (v for k, v in index.items() if k != source):
+            for name in os.listdir(self.root):
+                if name.startswith(old + "-"):
+                    shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+        index[source] = fp
+        fd, tmp = tempfile.mkstemp(prefix=".paths-", dir=self.root)
+        with os.fdopen(fd, "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp, index_path)
+        return fp
@@ -0,0 +1,131 @@
+"""
+Audio ingest: decode a source's audio track straight into float32 numpy
+arrays by piping raw PCM out of the bundled ffmpeg binary.
+
+No temporary WAV is written and the samples are read directly into their
+final buffer, so a multi-hour source costs one decode and no extra copies.
+"""
+import subprocess
+import tempfile
+
+import numpy as np
+
+from smart_render import get_ffmpeg_exe, probe_media
+
+SAMPLE_RATE = 44100
+READ_CHUNK = 1 << 20  # Bytes requested from the pipe per read
+
+
+def _ffmpeg_pcm_cmd(video_path, sr):
+    return [
+        get_ffmpeg_exe(), "-hide_banner", "-nostdin", "-loglevel", "error",
+        "-i", video_path,
+        "-map", "0:a:0", "-vn",
+        "-ac", "1", "-ar", str(sr),
+        "-f", "f32le", "-acodec", "pcm_f32le",
+        "-",
+    ]
+
+
+def _start(video_path, sr):
+    """Start decoding to a stdout pipe. Returns (process, stderr file)."""
+    # stderr goes to a file: a pipe read only after stdout drains can fill
+    # up with errors of a corrupt source and stall ffmpeg (and the reader)
+    errors = tempfile.TemporaryFile()
+    try:
+        return subprocess.Popen(_ffmpeg_pcm_cmd(video_path, sr), stdout=subprocess.PIPE, stderr=errors), errors
+    except BaseException:
+        errors.close()
+        raise
+
+
+def _stop(proc, errors, kill):
+    """Close the pipe (killing ffmpeg when `kill`) and return (exit code, stderr text)."""
+    proc.stdout.close()
+    if kill and proc.poll() is None:
+        proc.kill()
+    returncode = proc.wait()
+    errors.seek(0)
+    message = errors.read().decode(errors="replace").strip()
+    errors.close()
+    return returncode, message
+
+
+def _fill(pipe, buf):
+    """Read from pipe into the uint8 view `buf` until it is full or EOF. Returns bytes read."""
+    view = memoryview(buf)
+    filled = 0
+    while filled < len(view):
+        n = pipe.readinto(view[filled:filled + READ_CHUNK])
+        if not n:
+            break
+        filled += n
+    return filled
+
+
+def load_audio(video_path, sr=SAMPLE_RATE, out=None, duration=None):
+    """Decode the first audio stream of `video_path` as mono float32 at `sr` Hz.
+
+    Args:
+        video_path: Path to a media file with an audio stream
+        sr: Target sample rate
+        out: Optional 1-D float32 array to decode into. Decoding stops when
+            it is full. If None, a buffer is sized from the source duration.
+        duration: Source duration in seconds (optional, avoids a probe)
+
+    Returns:
+        (y, sr) where y is a view of the filled part of the buffer.
+    """
+    if out is not None:
+        if out.dtype != np.float32 or out.ndim != 1 or not out.flags.c_contiguous:
+            raise ValueError("out must be a contiguous 1-D float32 array")
+        buf = out
+    else:
+        if duration is None:
+            duration = probe_media(video_path)["duration"] or 0.0
+        # One extra second of headroom for rounding in the container duration
+        buf = np.empty(int((duration + 1.0) * sr), dtype=np.float32)
+
+    proc, errors = _start(video_path, sr)
+    try:
+        filled = _fill(proc.stdout, buf.view(np.uint8))
+        if out is None:
+            # Duration estimate was short: keep growing until EOF
+            while filled == buf.nbytes:
+                buf = np.resize(buf, len(buf) + max(len(buf) // 4, sr))
+                filled += _fill(proc.stdout, buf.view(np.uint8)[filled:])
+    finally:
+        # Caller's buffer is full: stop decoding the rest
+        returncode, message = _stop(proc, errors, kill=out is not None)
+
+    if returncode != 0 and not (out is not None and filled == buf.nbytes):
+        raise RuntimeError(f"Audio decoding failed for {video_path}: {message}")
+
+    return buf[:filled // 4], sr
+
+
+def iter_audio_blocks(video_path, sr=SAMPLE_RATE, block_samples=SAMPLE_RATE * 30):
+    """Yield consecutive mono float32 blocks of the audio stream.
+
+    The same buffer is reused for every block, so callers must copy a block
+    if they keep it past the next iteration. Memory use is independent of
+    the source duration.
+    """
+    buf = np.empty(block_samples, dtype=np.float32)
+    raw = buf.view(np.uint8)
+    proc, errors = _start(video_path, sr)
+    finished = False
+    try:
+        while True:
+            filled = _fill(proc.stdout, raw)
+            if filled:
+                yield buf[:filled // 4]
+            if filled < raw.nbytes:
+                break
+        finished = True
+    finally:
+        # Consumer stopped early: no need to decode the rest
+        returncode, message = _stop(proc, errors, kill=not finished)
+
+    if finished and returncode != 0:
+        raise RuntimeError(f"Audio decoding failed for {video_path}: {message}")
@@ -0,0 +1,76 @@
+"""
+Batch scheduler for processing many videos.
+
+Audio analysis (CPU-bound) of upcoming videos runs in a process pool while
+earlier videos are encoded on a separate set of encode slots, so analysis
+and encoder time overlap. Each file succeeds or fails on its own.
+"""
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+BatchResult = namedtuple("BatchResult", ["video_path", "output_folder", "error"])
+
+
+def default_analysis_workers():
+    """Leave one core for the encode slots and the main process."""
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def run_batch(video_paths, analyze, render, analysis_workers=None, encode_slots=1, on_error=None):
+    """Analyze and render every video, overlapping the two stages.
+
+    Args:
+        video_paths: Videos to process
+        analyze: analyze(video_path) -> analysis. Must be picklable; runs in a
+            worker process (or inline when analysis_workers is 0)
+        render: render(video_path, analysis) -> output folder. Runs on one of
+            `encode_slots` threads in this process
+        analysis_workers: Size of the analysis process pool (default: cores - 1)
+        encode_slots: Videos encoded at the same time
+        on_error: Optional callback(video_path, exception) for failed files
+
+    Returns:
+        BatchResult list in the order of `video_paths`.
+    """
+    if analysis_workers is None:
+        analysis_workers = default_analysis_workers()
+    results = {}
+
+    def fail(video_path, error):
+        results[video_path] = BatchResult(video_path, None, error)
+        if on_error is not None:
+            on_error(video_path, error)
+
+    def render_one(video_path, analysis):
+        try:
+            results[video_path] = BatchResult(video_path, render(video_path, analysis), None)
+        except Exception as e:
+            fail(video_path, e)
+
+    with ThreadPoolExecutor(max_workers=max(1, encode_slots), thread_name_prefix="batch-encode") as encoders:
+        encode_futures = []
+        if analysis_workers <= 0:
+            for video_path in video_paths:
+                try:
+                    analysis = analyze(video_path)
+                except Exception as e:
+                    fail(video_path, e)
+                    continue
+                encode_futures.append(encoders.submit(render_one, video_path, analysis))
+        else:
+            with ProcessPoolExecutor(max_workers=analysis_workers) as analyzers:
+                pending = {analyzers.submit(analyze, path): path for path in video_paths}
+                # Hand each video to the encoders as soon as its analysis is done
+                for future in as_completed(pending):
+                    video_path = pending[future]
+                    try:
+                        analysis = future.result()
+                    except Exception as e:
+                        fail(video_path, e)
+                        continue
+                    encode_futures.append(encoders.submit(render_one, video_path, analysis))
+        for future in encode_futures:
+            future.result()
+
+    return [results[path] for path in video_paths]
@@ -0,0 +1,286 @@
+"""
+End-to-end benchmark of the ASMR Pro Cutter pipeline on synthetic sources.
+
+Every stage of generate_asmr_short is timed separately (decode,
+crispness index, peak finding/selection, encode) and the wall time, CPU
+time and peak RSS of each stage are written to a JSON file, together with
+how well the planted clicks were found. Runs CPU-only with libx264.
+
+    python -m benchmarks.bench                       # default cases
+    python -m benchmarks.bench --cases 60min-360p --render-mode smart
+    python -m benchmarks.bench --compare old.json new.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import audio_ingest
+import main
+import smart_render
+import streaming_analysis
+from benchmarks import synth
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# name: (duration in seconds, width, height)
+CASES = {
+    "1min-360p": (60, 640, 360),
+    "1min-1080p": (60, 1920, 1080),
+    "10min-720p": (600, 1280, 720),
+    "60min-360p": (3600, 640, 360),
+    "180min-360p": (10800, 640, 360),
+}
+DEFAULT_CASES = ("1min-360p", "1min-1080p", "10min-720p")
+
+CPU_PRESET = {
+    "codec": "libx264",
+    "quality_param": "-crf",
+    "quality_value": "18",
+    "preset": "veryfast",
+    "extra_params": ["-profile:v", "high"],
+}
+TOLERANCE = 0.05  # Seconds between a detected event and a planted click to count as a hit
+
+
+def _current_rss():
+    """Resident set size of this process in bytes, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class StageMeter:
+    """Wall time, CPU time and peak RSS of named pipeline stages."""
+
+    def __init__(self, sample_interval=0.01):
+        self.sample_interval = sample_interval
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        peak = [_current_rss() or 0]
+        done = threading.Event()
+
+        def sample():
+            while not done.wait(self.sample_interval):
+                peak[0] = max(peak[0], _current_rss() or 0)
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        children0 = _children_cpu()
+        cpu0 = time.process_time()
+        wall0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall0
+            cpu = time.process_time() - cpu0
+            children = _children_cpu() - children0
+            done.set()
+            sampler.join()
+            if not peak[0] and resource is not None:
+                # No /proc: fall back to the process-wide high-water mark
+                peak[0] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+            self.stages[name] = {
+                "wall_s": round(wall, 4),
+                "cpu_s": round(cpu, 4),
+                "children_cpu_s": round(children, 4),  # ffmpeg subprocesses
+                "peak_rss_mb": round(peak[0] / 1024 ** 2, 1),
+            }
+
+
+def _children_cpu():
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _hits(times, targets, tolerance=TOLERANCE):
+    """How many `times` lie within `tolerance` of some target."""
+    if len(times) == 0 or len(targets) == 0:
+        return 0
+    targets = np.asarray(targets)
+    idx = np.clip(np.searchsorted(targets, times), 1, len(targets) - 1)
+    nearest = np.minimum(np.abs(times - targets[idx - 1]), np.abs(times - targets[idx]))
+    return int((nearest <= tolerance).sum())
+
+
+def run_case(name, video_path, clicks, workdir, config, merge, sr=audio_ingest.SAMPLE_RATE):
+    duration, width, height = CASES[name]
+    meter = StageMeter()
+
+    if duration >= config.streaming_min_duration:
+        # Long sources are decoded and scored in one bounded-memory pass
+        with meter.stage("decode+crispness"):
+            scores, mean_score = streaming_analysis.analyze_video(
+                video_path, os.path.join(workdir, "scores.npy"),
+                sr=sr, hop_length=config.hop_length, min_freq=config.min_freq,
+            )
+    else:
+        with meter.stage("decode"):
+            y, sr = audio_ingest.load_audio(video_path, sr=sr, duration=duration)
+        with meter.stage("crispness"):
+            scores = main.calculate_crispness_index(y, sr, hop_length=config.hop_length, min_freq=config.min_freq)
+            mean_score = float(np.mean(scores))
+        del y
+
+    with meter.stage("peaks+selection"):
+        frames, heights = streaming_analysis.local_peaks(scores, mean_score * config.peak_threshold)
+        moments = main.select_moments(frames, heights, sr, duration, config)
+        clips = main.plan_clips(moments, duration, config)
+    del scores
+
+    clip_folder = os.path.join(workdir, "clips")
+    os.makedirs(clip_folder)
+    jobs = main.clip_jobs(clips, clip_folder)
+    with meter.stage("encode"):
+        if merge:
+            main.render_merged(video_path, jobs, CPU_PRESET, os.path.join(clip_folder, "final_short.mp4"), config)
+        else:
+            main.render_separate_clips(video_path, jobs, CPU_PRESET, synth.FPS, config)
+
+    candidate_times = frames * config.hop_length / sr
+    thumps = [t + synth.CLICK_PERIOD / 2 for t in clicks]
+    selected = np.asarray([t for t, _ in moments])
+    return {
+        "case": name,
+        "duration_s": duration,
+        "resolution": f"{width}x{height}",
+        "render_mode": config.render_mode,
+        "merge": merge,
+        "stages": meter.stages,
+        "total_wall_s": round(sum(s["wall_s"] for s in meter.stages.values()), 4),
+        "accuracy": {
+            "planted_clicks": len(clicks),
+            "candidates": int(len(frames)),
+            # Planted clicks with a candidate peak nearby
+            "click_recall": round(_hits(np.asarray(clicks), np.sort(candidate_times)) / max(1, len(clicks)), 4),
+            "selected": int(len(selected)),
+            # Selected events on a click, out of as many as could be
+            "selection_hit_rate": round(_hits(selected, clicks) / max(1, min(len(selected), len(clicks))), 4),
+            # Selected events on a low-frequency thump (should stay 0)
+            "thump_selections": _hits(selected, thumps),
+        },
+    }
+
+
+def environment(config=None):
+    config = config or main.job_config()
+
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=BENCH_DIR, capture_output=True, text=True).stdout.strip()
+        except OSError:
+            return ""
+
+    ffmpeg_version = smart_render.run_ffmpeg(["-version"], capture_stdout=True).decode(errors="replace")
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "ffmpeg": ffmpeg_version.splitlines()[0] if ffmpeg_version else "",
+        "hop_length": config.hop_length,
+        "min_freq": config.min_freq,
+        "threads": config.threads,
+    }
+
+
+def compare(old_path, new_path):
+    """Print per-stage wall time changes between two result files."""
+    with open(old_path) as f:
+        old = {c["case"]: c for c in json.load(f)["cases"]}
+    with open(new_path) as f:
+        new = json.load(f)["cases"]
+
+    print(f"{'case':<28}{'stage':<20}{'old s':>10}{'new s':>10}{'change':>10}")
+    for case in new:
+        if case["case"] not in old:
+            continue
+        label = f"{case['case']} ({case['render_mode']}{', merge' if case['merge'] else ''})"
+        for stage, stats in case["stages"].items():
+            before = old[case["case"]]["stages"].get(stage)
+            if before is None:
+                continue
+            change = (stats["wall_s"] - before["wall_s"]) / before["wall_s"] * 100 if before["wall_s"] else 0.0
+            print(f"{label:<28}{stage:<20}{before['wall_s']:>10.3f}{stats['wall_s']:>10.3f}{change:>+9.1f}%")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=list(DEFAULT_CASES))
+    parser.add_argument("--all", action="store_true", help="run every case (up to 3 hours of source)")
+    parser.add_argument("--render-mode", choices=("reencode", "smart", "copy"), default="reencode")
+    parser.add_argument("--merge", action="store_true", help="render one merged short instead of separate clips")
+    parser.add_argument("--threads", type=int, default=main.THREADS, help="encoder threads per session")
+    parser.add_argument("--sources-dir", default=os.path.join(BENCH_DIR, "sources"),
+                        help="where generated sources are kept between runs")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<time>_<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two results files and exit")
+    return parser.parse_args(argv)
+
+
+def run(argv=None):
+    args = parse_args(argv)
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    # Without the render cache every run measures a full encode
+    config = main.job_config(threads=args.threads, render_mode=args.render_mode, render_cache=False)
+    main.preload()  # Library import time is not part of any stage
+    env = environment(config)
+    os.makedirs(args.sources_dir, exist_ok=True)
+    results = {"environment": env, "cases": []}
+
+    for name in (sorted(CASES, key=lambda n: CASES[n]) if args.all else args.cases):
+        duration, width, height = CASES[name]
+        video_path = os.path.join(args.sources_dir, f"{name}.mp4")
+        print(f"\n=== {name}: preparing source ===")
+        clicks = synth.make_source(video_path, duration, width, height)
+
+        workdir = tempfile.mkdtemp(prefix="asmr_bench_")
+        try:
+            print(f"=== {name}: running pipeline ===")
+            case = run_case(name, video_path, clicks, workdir, config, args.merge)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        results["cases"].append(case)
+        for stage, stats in case["stages"].items():
+            print(f"  {stage:<18} {stats['wall_s']:>8.2f}s wall  {stats['cpu_s']:>8.2f}s cpu  "
+                  f"{stats['peak_rss_mb']:>8.1f} MB")
+        print(f"  accuracy: {case['accuracy']}")
+
+    output = args.output
+    if output is None:
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(BENCH_DIR, "results", f"{stamp}_{env['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    sys.exit(run())
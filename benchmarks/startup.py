@@ -0,0 +1,102 @@
+"""
+Startup-time benchmark: how long until the CLI and the GUI are usable.
+
+Each measurement starts a fresh interpreter (so nothing is cached in
+memory) and records the wall time until:
+
+    cli_help      `python main.py --help` has exited
+    import_main   `import main` has finished
+    gui_window    the main window has been created and drawn
+    gui_preload   ... and the background preload of the heavy libraries is done
+
+Every measurement is repeated and the median and minimum are written to a
+JSON file. gui_window and gui_preload are skipped (null) without a display.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --repeat 10 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from benchmarks.bench import BENCH_DIR, environment
+
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+GUI_WINDOW = """
+import sys, threading, time, tkinter as tk
+import gui
+root = tk.Tk()
+app = gui.ASMRCutterGUI(root)
+root.update()
+print("window", time.time(), flush=True)
+if "--preload" in sys.argv:
+    # root.update() ran the idle callback that starts the preload thread
+    for thread in threading.enumerate():
+        if thread.name == "preload":
+            thread.join()
+    print("preload", time.time(), flush=True)
+root.destroy()
+"""
+
+MEASUREMENTS = {
+    "cli_help": ([os.path.join(REPO_DIR, "main.py"), "--help"], None),
+    "import_main": (["-c", "import main"], None),
+    "gui_window": (["-c", GUI_WINDOW], "window"),
+    "gui_preload": (["-c", GUI_WINDOW, "--preload"], "preload"),
+}
+
+
+def measure(args, marker=None):
+    """Seconds from starting the interpreter until it exits, or until it prints `marker`."""
+    start = time.time()
+    proc = subprocess.run([sys.executable, *args], cwd=REPO_DIR, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed")
+    if marker is None:
+        return time.time() - start
+    for line in proc.stdout.splitlines():
+        if line.startswith(marker + " "):
+            return float(line.split()[1]) - start
+    raise RuntimeError(f"no '{marker}' line in the output")
+
+
+def run(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/startup_<time>_<commit>.json)")
+    args = parser.parse_args(argv)
+
+    env = environment()
+    results = {"environment": env, "startup": {}}
+    for name, (cmd, marker) in MEASUREMENTS.items():
+        try:
+            times = [measure(cmd, marker) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"  {name:<14} skipped: {e}")
+            results["startup"][name] = None
+            continue
+        results["startup"][name] = {
+            "median_s": round(statistics.median(times), 4),
+            "min_s": round(min(times), 4),
+            "runs": [round(t, 4) for t in times],
+        }
+        print(f"  {name:<14} {statistics.median(times):>8.3f}s median  {min(times):>8.3f}s min")
+
+    output = args.output
+    if output is None:
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(BENCH_DIR, "results", f"startup_{stamp}_{env['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    sys.exit(run())
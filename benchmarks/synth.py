@@ -0,0 +1,58 @@
+"""
+Synthetic ASMR test sources generated with ffmpeg's lavfi sources.
+
+The audio is a pink noise bed with mains hum, crisp broadband clicks at
+known times and low-frequency thumps in between (which MIN_FREQ should
+ignore). The video is ffmpeg's testsrc2 pattern, encoded with libx264.
+"""
+import os
+
+from smart_render import run_ffmpeg
+
+SAMPLE_RATE = 44100
+FPS = 30
+GOP = 60                # Keyframe every 2 s, so smart render has whole GOPs to copy
+CLICK_OFFSET = 2.0      # Seconds to the first click
+CLICK_PERIOD = 3.7      # Seconds between clicks (thumps fall halfway between)
+CLICK_LENGTH = 0.03     # Seconds of each click burst
+
+
+def click_times(duration, offset=CLICK_OFFSET, period=CLICK_PERIOD):
+    """Times (seconds) of the clicks planted in a source of `duration` seconds."""
+    times = []
+    t = offset
+    while t < duration - 1.0:
+        times.append(round(t, 6))
+        t = offset + len(times) * period
+    return times
+
+
+def _audio_graph(duration, offset=CLICK_OFFSET, period=CLICK_PERIOD):
+    u = f"mod(t-{offset},{period})"
+    k = f"floor((t-{offset})/{period})"
+    v = f"mod(t-{offset + period / 2},{period})"
+    # Decaying white noise burst with a per-click amplitude
+    click = (f"gte(t,{offset})*lt({u},{CLICK_LENGTH})*(0.5+0.3*sin({k}*1.7))"
+             f"*(2*random(0)-1)*exp(-{u}*250)")
+    # 60 Hz thump, loud but entirely below MIN_FREQ
+    thump = f"gte(t,{offset + period / 2})*lt({v},0.2)*0.6*sin(2*PI*60*{v})*exp(-{v}*20)"
+    return (
+        f"aevalsrc='{click}+{thump}':s={SAMPLE_RATE}:d={duration}[c];"
+        f"anoisesrc=c=pink:a=0.02:r={SAMPLE_RATE}:d={duration}[n];"
+        f"sine=f=100:r={SAMPLE_RATE}:d={duration},volume=0.05[h];"
+        f"[c][n][h]amix=inputs=3:normalize=0[a]"
+    )
+
+
+def make_source(path, duration, width, height):
+    """Render a synthetic source to `path` (skipped if it already exists). Returns the click times."""
+    if not os.path.exists(path):
+        tmp = path + ".part.mp4"
+        graph = f"testsrc2=s={width}x{height}:r={FPS}:d={duration}[v];" + _audio_graph(duration)
+        run_ffmpeg(
+            ["-filter_complex", graph, "-map", "[v]", "-map", "[a]",
+             "-c:v", "libx264", "-preset", "ultrafast", "-crf", "30", "-g", GOP, "-pix_fmt", "yuv420p",
+             "-c:a", "aac", "-b:a", "128k", tmp]
+        )
+        os.replace(tmp, path)
+    return click_times(duration)
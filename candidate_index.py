@@ -0,0 +1,196 @@
+"""
+Library-wide index of candidate moments, in SQLite.
+
+Every analyzed video's candidate peaks are recorded with their event time,
+crispness score and raw feature breakdown (onset flux, spectral centroid in
+Hz, zero-crossing rate). A compilation then picks the best moments across
+many videos ("best 58 seconds of this week's uploads") straight from the
+index, without analyzing any source again.
+
+Each video keeps the candidates of its latest analysis; indexing it again
+(or after its content changed) replaces them. The database lives in
+~/.cache/asmr-pro-cutter/candidates.sqlite unless another path is given.
+"""
+import os
+import sqlite3
+import time
+from collections import namedtuple
+
+from analysis_cache import cache_home
+from cutlist import Clip
+
+INDEX_VERSION = 1
+
+# One indexed candidate (feature values are None when they could not be computed)
+Moment = namedtuple("Moment", ["source", "t_event", "score", "onset", "centroid", "zcr"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    fingerprint TEXT NOT NULL,
+    duration REAL NOT NULL,
+    fps REAL,
+    mtime REAL NOT NULL,
+    params TEXT,
+    indexed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS videos_mtime ON videos (mtime);
+CREATE TABLE IF NOT EXISTS candidates (
+    video_id INTEGER NOT NULL REFERENCES videos (id) ON DELETE CASCADE,
+    t_event REAL NOT NULL,
+    score REAL NOT NULL,
+    onset REAL,
+    centroid REAL,
+    zcr REAL,
+    PRIMARY KEY (video_id, t_event)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS candidates_score ON candidates (score DESC);
+"""
+
+
+def default_index_path():
+    return os.path.join(cache_home(), "candidates.sqlite")
+
+
+class CandidateIndex:
+    """Connection to a candidate index; usable as a context manager.
+
+    Several processes may index videos into the same database: writes are
+    short transactions and wait for each other.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_index_path()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=30.0)
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.execute("PRAGMA journal_mode = WAL")
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, INDEX_VERSION):
+            raise RuntimeError(f"{self.path} is a candidate index of version {version}, expected {INDEX_VERSION}")
+        with self.db:
+            self.db.executescript(SCHEMA)
+            self.db.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add_video(self, video_path, fingerprint, duration, fps, times, scores, features=None, params=None):
+        """Record (or replace) the candidates of one video.
+
+        times/scores: event time in seconds and crispness score per candidate.
+        features: optional (3, n) raw onset/centroid/ZCR values per candidate.
+        params: analysis parameters the candidates come from (stored as given, a JSON string).
+        """
+        path = os.path.abspath(video_path)
+        if features is None:
+            rows = [(float(t), float(s), None, None, None) for t, s in zip(times, scores)]
+        else:
+            rows = [(float(t), float(s), float(o), float(c), float(z))
+                    for t, s, o, c, z in zip(times, scores, *features)]
+        with self.db:
+            self.db.execute("DELETE FROM videos WHERE path = ?", (path,))
+            video_id = self.db.execute(
+                "INSERT INTO videos (path, fingerprint, duration, fps, mtime, params, indexed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, fingerprint, float(duration), fps, os.path.getmtime(path), params, time.time()),
+            ).lastrowid
+            self.db.executemany(
+                "INSERT OR REPLACE INTO candidates (video_id, t_event, score, onset, centroid, zcr)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [(video_id,) + row for row in rows],
+            )
+
+    def is_current(self, video_path, fingerprint, params=None):
+        """Whether the video is indexed with this content fingerprint and these analysis params."""
+        row = self.db.execute("SELECT fingerprint, params FROM videos WHERE path = ?",
+                              (os.path.abspath(video_path),)).fetchone()
+        return row is not None and tuple(row) == (fingerprint, params)
+
+    def remove_missing(self):
+        """Drop videos whose file no longer exists. Returns their paths."""
+        gone = [path for (path,) in self.db.execute("SELECT path FROM videos") if not os.path.exists(path)]
+        with self.db:
+            self.db.executemany("DELETE FROM videos WHERE path = ?", [(path,) for path in gone])
+        return gone
+
+    def _filters(self, since, folder):
+        where, args = [], []
+        if since is not None:
+            where.append("v.mtime >= ?")
+            args.append(float(since))
+        if folder is not None:
+            prefix = os.path.join(os.path.abspath(folder), "")
+            where.append("substr(v.path, 1, ?) = ?")
+            args += [len(prefix), prefix]
+        return (" WHERE " + " AND ".join(where)) if where else "", args
+
+    def videos(self, since=None, folder=None):
+        """{path: (duration, fps, mtime)} of the indexed videos matching the filters."""
+        where, args = self._filters(since, folder)
+        rows = self.db.execute(f"SELECT v.path, v.duration, v.fps, v.mtime FROM videos v{where}", args)
+        return {path: (duration, fps, mtime) for path, duration, fps, mtime in rows}
+
+    def top_moments(self, since=None, folder=None, limit=None):
+        """Moments of the videos matching the filters, best score first (a lazy iterator).
+
+        since: only videos whose file was modified at or after this Unix time
+        folder: only videos inside this folder
+        """
+        where, args = self._filters(since, folder)
+        sql = (f"SELECT v.path, c.t_event, c.score, c.onset, c.centroid, c.zcr"
+               f" FROM candidates c JOIN videos v ON v.id = c.video_id{where} ORDER BY c.score DESC")
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(int(limit))
+        for row in self.db.execute(sql, args):
+            yield Moment(*row)
+
+
+def select_compilation(moments, videos, budget, pre_roll, post_roll, final_extra=0.0, max_per_video=None):
+    """Best moments across videos whose clip windows fit in `budget` seconds.
+
+    moments: Moment entries, best first (CandidateIndex.top_moments)
+    videos: {path: (duration, fps, mtime)} (CandidateIndex.videos)
+
+    Moments are taken greedily by score. A moment is skipped when its
+    window [t - pre_roll, t + post_roll] overlaps one already taken from the
+    same video, when its video already has `max_per_video` clips, or when it
+    does not fit in what is left of the budget (final_extra is kept aside
+    for the closing clip). Returns [(path, cutlist.Clip)] in compilation
+    order: videos by modification time, clips by time, the last clip
+    extended by final_extra.
+    """
+    remaining = budget - final_extra
+    taken = {}
+    for m in moments:
+        duration = videos[m.source][0]
+        t_start = max(0.0, m.t_event - pre_roll)
+        t_end = min(duration, m.t_event + post_roll)
+        length = t_end - t_start
+        if length <= 0 or length > remaining + 1e-9:
+            continue
+        clips = taken.setdefault(m.source, [])
+        if max_per_video is not None and len(clips) >= max_per_video:
+            continue
+        if any(t_start < c.t_end and c.t_start < t_end for c in clips):
+            continue
+        clips.append(Clip(m.t_event, t_start, t_end, m.score))
+        remaining -= length
+        if remaining < 1e-9:
+            break
+
+    order = sorted(taken, key=lambda path: (videos[path][2], path))
+    compilation = [(path, clip) for path in order for clip in sorted(taken[path], key=lambda c: c.t_start)]
+    if compilation:
+        path, last = compilation[-1]
+        t_end = min(videos[path][0], last.t_event + post_roll + final_extra)
+        compilation[-1] = (path, last._replace(t_end=max(last.t_end, t_end)))
+    return compilation
@@ -0,0 +1,105 @@
+"""
+Two-stage crispness analysis for small hop lengths.
+
+Only a few dozen moments of a source are kept, yet at a fine hop (128 or
+256 samples) computing the features of every frame dominates the
+analysis. `analyze` first scans the whole signal at every `stride`-th fine
+frame (FeatureEngine.strided_features: exact values at about 2 / stride of
+the cost), then computes every fine frame only in short windows around the
+scan frames that come near the peak threshold. For that choice the onset
+of each scan frame also counts the flux across the whole stride before
+it, since a short transient between two scan frames lifts a single fine
+frame. Candidate peaks are the local maxima of those windows.
+
+Frames inside the windows get the same features as in a full pass. The
+normalization peaks and the mean score are global statistics, taken over
+the windows plus the scan frames outside them, which stand in for the
+frames that were skipped. The result is an approximation of the full
+pass: peaks well above the threshold match it, while ones within a few
+percent of the threshold can be missed or added.
+"""
+import numpy as np
+
+from features import WEIGHTS, FeatureEngine, combine_scores, feature_peaks, mean_score
+from streaming_analysis import local_peaks
+
+COARSE_HOP = 1024     # Samples between scan frames (must divide N_FFT / 2)
+MIN_STRIDE = 4        # With fewer fine frames per scan frame, one full pass is cheaper
+REGION_FACTOR = 0.9   # Scan frames scoring above this x the peak threshold get a fine window
+
+
+def stride_for(hop_length):
+    """Fine frames per scan frame at `hop_length`, or None when two stages do not pay off."""
+    if COARSE_HOP % hop_length:
+        return None
+    stride = COARSE_HOP // hop_length
+    return stride if stride >= MIN_STRIDE else None
+
+
+def _windows(centers, pad, n_frames, merge_gap):
+    """Merged [start, stop) frame windows reaching `pad` frames around every center."""
+    if not len(centers):
+        return []
+    starts = np.maximum(0, centers - pad)
+    stops = np.minimum(n_frames, centers + pad + 1)
+    # Windows closer than the feature context are cheaper computed together
+    reach = np.maximum.accumulate(stops)
+    first = np.ones(len(starts), dtype=bool)
+    first[1:] = starts[1:] > reach[:-1] + merge_gap
+    idx = np.flatnonzero(first)
+    return list(zip(starts[idx].tolist(), np.maximum.reduceat(stops, idx).tolist()))
+
+
+def analyze(y, sr, hop_length, min_freq=0.0, peak_threshold=1.2, weights=WEIGHTS):
+    """Crispness peaks of `y` at `hop_length` from a scan plus fine windows.
+
+    Returns (scores, mean_score, frames, heights) like the full analysis
+    followed by local_peaks; scores are 0 outside the fine windows. Returns
+    None when `hop_length` is too coarse for a scan to save time.
+    """
+    stride = stride_for(hop_length)
+    if stride is None:
+        return None
+    engine = FeatureEngine(sr, hop_length, min_freq)
+    n_frames = 1 + len(y) // hop_length
+
+    # 1. Scan: every stride-th frame of the full analysis
+    scan, span_onset = engine.strided_features(y, stride, span_onset=True)
+    scan_frames = np.arange(scan.shape[1]) * stride
+    scan_scores = combine_scores(scan, feature_peaks(scan), weights)
+    # Scores with the onset taken over the whole stride before each scan frame,
+    # so short transients between scan frames still get a window
+    reach = scan.copy()
+    reach[0] = np.maximum(reach[0], span_onset - np.median(span_onset))
+    reach_scores = combine_scores(reach, feature_peaks(scan), weights)
+    near = reach_scores > REGION_FACTOR * peak_threshold * float(np.mean(scan_scores))
+    # The onset flux jumps from librosa's zero padding at the start: always refine the edges
+    near[[0, -1]] = True
+    near = scan_frames[near]
+
+    # 2. Every fine frame around the scan frames near the threshold
+    windows = _windows(near, 2 * stride, n_frames, merge_gap=sum(engine.context))
+    raws = [engine.features_range(y, start, stop) for start, stop in windows]
+
+    inside = np.zeros(n_frames, dtype=bool)
+    for start, stop in windows:
+        inside[start:stop] = True
+    outside = scan[:, ~inside[scan_frames]].astype(np.float64)
+    n_outside = n_frames - int(inside.sum())
+    gram = outside @ outside.T * (n_outside / max(1, outside.shape[1]))
+    peaks = feature_peaks(scan)
+    for raw in raws:
+        raw64 = raw.astype(np.float64)
+        gram += raw64 @ raw64.T
+        peaks = np.maximum(peaks, feature_peaks(raw))
+    mean = mean_score(gram, n_frames, peaks, weights)
+
+    scores = np.zeros(n_frames, dtype=np.float32)
+    frames, heights = [np.zeros(0, dtype=np.intp)], [np.zeros(0, dtype=np.float32)]
+    for (start, stop), raw in zip(windows, raws):
+        scores[start:stop] = combine_scores(raw, peaks, weights)
+        # Window edges are never peaks; every other frame has its true neighbours
+        idx, h = local_peaks(scores[start:stop], mean * peak_threshold)
+        frames.append(idx + start)
+        heights.append(h)
+    return scores, mean, np.concatenate(frames), np.concatenate(heights)
@@ -0,0 +1,170 @@
+"""
+Cut lists: the clip windows picked for a source, separate from rendering.
+
+A cut list is written as JSON (exact, meant to be edited by hand) and as
+a CMX3600 EDL for NLEs. Either format can be read back and rendered
+without analyzing the source again.
+"""
+import json
+import os
+import re
+from collections import namedtuple
+
+from smart_render import probe_media
+
+CUT_LIST_VERSION = 1
+
+# One clip window: event time, cut window and crispness score (None if unknown)
+Clip = namedtuple("Clip", ["t_event", "t_start", "t_end", "score"])
+
+
+class CutList:
+    """Source video plus the clip windows to render from it, in time order."""
+
+    def __init__(self, source, clips, duration=None, fps=None, settings=None):
+        self.source = source
+        self.clips = sorted(clips, key=lambda c: c.t_start)
+        self.duration = duration
+        self.fps = fps
+        self.settings = dict(settings or {})
+
+    def to_dict(self):
+        return {
+            "version": CUT_LIST_VERSION,
+            "source": self.source,
+            "duration": self.duration,
+            "fps": self.fps,
+            "settings": self.settings,
+            "clips": [
+                {
+                    "t_event": round(float(c.t_event), 6),
+                    "t_start": round(float(c.t_start), 6),
+                    "t_end": round(float(c.t_end), 6),
+                    "score": None if c.score is None else round(float(c.score), 6),
+                }
+                for c in self.clips
+            ],
+        }
+
+    def write_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
+
+    def write_edl(self, path, title=None):
+        """Write a CMX3600 EDL (non-drop-frame timecode at the source frame rate)."""
+        fps = self.fps or 30.0
+        base = int(round(fps))
+        name = os.path.basename(self.source)
+        lines = [f"TITLE: {title or os.path.splitext(name)[0]}", "FCM: NON-DROP FRAME", ""]
+        record = 0
+        for n, c in enumerate(self.clips, start=1):
+            f_in, f_out = int(round(c.t_start * fps)), int(round(c.t_end * fps))
+            rec_in, record = record, record + (f_out - f_in)
+            lines.append(
+                f"{n:03d}  AX       AA/V  C        "
+                f"{_timecode(f_in, base)} {_timecode(f_out, base)} {_timecode(rec_in, base)} {_timecode(record, base)}"
+            )
+            lines.append(f"* FROM CLIP NAME: {name}")
+            lines.append(f"* SOURCE FILE: {self.source}")
+            lines.append(f"* EVENT TIME: {c.t_event:.6f}")
+            if c.score is not None:
+                lines.append(f"* SCORE: {c.score:.6f}")
+            lines.append("")
+        with open(path, "w") as f:
+            f.write("\n".join(lines))
+        return path
+
+
+def _timecode(frames, base):
+    seconds, ff = divmod(frames, base)
+    minutes, ss = divmod(seconds, 60)
+    hh, mm = divmod(minutes, 60)
+    return f"{hh:02d}:{mm:02d}:{ss:02d}:{ff:02d}"
+
+
+def _frames(timecode, base):
+    hh, mm, ss, ff = (int(x) for x in re.split(r"[:;.]", timecode))
+    return ((hh * 60 + mm) * 60 + ss) * base + ff
+
+
+def _resolve(source, list_path):
+    # Relative sources are relative to the cut list
+    if source and not os.path.isabs(source):
+        source = os.path.join(os.path.dirname(os.path.abspath(list_path)), source)
+    return source
+
+
+def from_dict(data, list_path=None):
+    """CutList from to_dict() data; a relative source is relative to list_path."""
+    try:
+        source = _resolve(data["source"], list_path) if list_path else data["source"]
+        clips = []
+        for entry in data["clips"]:
+            t_start, t_end = float(entry["t_start"]), float(entry["t_end"])
+            if t_end <= t_start:
+                raise ValueError(f"clip ends before it starts: {entry}")
+            score = entry.get("score")
+            clips.append(Clip(float(entry.get("t_event", t_start)), t_start, t_end,
+                              None if score is None else float(score)))
+    except (KeyError, TypeError) as e:
+        name = f" '{list_path}'" if list_path else ""
+        raise ValueError(f"Invalid cut list{name}: {e!r}") from None
+    return CutList(source, clips, duration=data.get("duration"), fps=data.get("fps"),
+                   settings=data.get("settings"))
+
+
+def read_json(path):
+    with open(path) as f:
+        return from_dict(json.load(f), path)
+
+
+EDL_EVENT = re.compile(
+    r"^\d+\s+\S+\s+\S+\s+C\s+(\S+)\s+(\S+)\s+\S+\s+\S+\s*$"
+)
+
+
+def read_edl(path, source=None):
+    """Read the cut events of a CMX3600 EDL. The source comes from the
+    '* SOURCE FILE:' / '* FROM CLIP NAME:' comments unless given.
+    """
+    events = []
+    clip_name = None
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            m = EDL_EVENT.match(line)
+            if m:
+                events.append({"in": m.group(1), "out": m.group(2)})
+            elif events and line.startswith("*"):
+                key, _, value = line[1:].partition(":")
+                key, value = key.strip().upper(), value.strip()
+                if key == "SOURCE FILE" and source is None:
+                    source = value
+                elif key == "FROM CLIP NAME":
+                    clip_name = clip_name or value
+                elif key == "EVENT TIME":
+                    events[-1]["t_event"] = float(value)
+                elif key == "SCORE":
+                    events[-1]["score"] = float(value)
+    source = _resolve(source or clip_name, path)
+    if not source:
+        raise ValueError(f"No source video named in '{path}'")
+
+    info = probe_media(source)
+    fps = info["fps"] or 30.0
+    base = int(round(fps))
+    clips = []
+    for e in events:
+        t_start = _frames(e["in"], base) / fps
+        t_end = _frames(e["out"], base) / fps
+        if t_end > t_start:
+            clips.append(Clip(e.get("t_event", t_start), t_start, t_end, e.get("score")))
+    return CutList(source, clips, duration=info["duration"], fps=info["fps"])
+
+
+def read(path):
+    """Read a .json or .edl cut list."""
+    if path.lower().endswith(".edl"):
+        return read_edl(path)
+    return read_json(path)
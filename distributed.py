@@ -0,0 +1,380 @@
+"""
+Distributed mode: a coordinator splits a batch into tasks on a shared task
+queue (task_queue.py), and worker processes execute them, on this host or
+on other hosts that share the filesystem.
+
+    asmr-cutter-queue coordinator --workers 3          # queue video_input/, run 3 local workers
+    asmr-cutter-queue worker --queue /mnt/rec/video_input/.asmr_queue.sqlite   # on other hosts
+
+Every video becomes an "analyze" task (analysis, selection and cut list).
+Once it is done, the coordinator journals the plan and adds one "render"
+task per clip, or a single "merge" task with MERGE_CLIPS. Only the
+coordinator writes the job journals (job_journal.py), so --resume works as
+it does for local batches. Workers send heartbeats while a task runs. A
+task whose worker stops sending them is leased again, and a failing task
+is retried up to QUEUE_MAX_ATTEMPTS times.
+
+All hosts must see the videos and the output folders under the same
+paths. The job settings travel with every task, and each worker picks
+its own encoder (see main.job_preset).
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import sqlite3
+import threading
+import time
+
+import cutlist
+import job_journal
+import main
+import render_pool
+import task_queue
+from batch import BatchResult
+
+
+def default_queue_path(folder=None):
+    """QUEUE_PATH, or .asmr_queue.sqlite in `folder` (default: INPUT_FOLDER)."""
+    return main.QUEUE_PATH or os.path.join(os.path.abspath(folder or main.INPUT_FOLDER), ".asmr_queue.sqlite")
+
+
+def _describe(task):
+    name = os.path.basename(task.payload["video"])
+    if task.kind == "render":
+        return f"clip {task.payload['clip']['idx']} of '{name}'"
+    return f"{task.kind} '{name}'"
+
+
+class Worker:
+    """Leases tasks from the queue and runs them one at a time.
+
+    Stops when the coordinator has closed the queue and no task is left
+    (unless keep_running), or after the current task when stop() is called.
+    """
+
+    def __init__(self, queue_path, name=None, lease_seconds=60.0, poll_interval=1.0, retry_delay=10.0,
+                 keep_running=False):
+        self.queue_path = queue_path
+        self.name = name or task_queue.worker_name()
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+        self.keep_running = keep_running
+        self.stop_event = threading.Event()
+        self._presets = {}
+        self._cleaned = set()  # Output folders whose leftovers this worker removed
+
+    def _preset(self, config, video_path):
+        # Resolve (or calibrate) the encoder once per video, not once per clip
+        key = (config, video_path)
+        if key not in self._presets:
+            self._presets[key] = main.job_preset(config, video_path)
+        return self._presets[key]
+
+    def execute(self, task, cancel=None):
+        """Run one task and return its (JSON-serializable) result.
+
+        Outputs are discarded (job_journal.Cancelled) once `cancel` is set.
+        """
+        payload = task.payload
+        config = main.JobConfig(**payload["config"])
+        video_path = payload["video"]
+        if task.kind == "analyze":
+            cut_list = main.plan_asmr_short(video_path, None, config)
+            main.write_cut_list(cut_list, payload["output_folder"])
+            return cut_list.to_dict()
+
+        if payload["output_folder"] not in self._cleaned:
+            # Partial files of killed workers of this host (the coordinator only judges its own host)
+            job_journal.remove_leftovers(payload["output_folder"])
+            self._cleaned.add(payload["output_folder"])
+        preset = self._preset(config, video_path)
+        pcm = main.open_pcm_store(video_path, config)
+        if task.kind == "render":
+            job = render_pool.ClipJob(**payload["clip"])
+            result, = main.render_separate_clips(video_path, [job], preset, payload["fps"], config, pcm,
+                                                 cancel=cancel, clip_count=payload.get("clip_count"))
+            if result.error is not None:
+                raise result.error
+            return {"bytes": os.path.getsize(job.output_path)}
+        if task.kind == "merge":
+            jobs = [render_pool.ClipJob(**clip) for clip in payload["clips"]]
+            main.render_merged(video_path, jobs, preset, payload["output_path"], config, pcm, cancel=cancel)
+            return {"bytes": os.path.getsize(payload["output_path"])}
+        raise ValueError(f"Unknown task kind '{task.kind}'")
+
+    def _heartbeat(self, task, finished, lost):
+        # Own connection: SQLite connections stay in the thread that opened them
+        with task_queue.TaskQueue(self.queue_path) as queue:
+            while not finished.wait(self.lease_seconds / 3):
+                try:
+                    if not queue.heartbeat(task.id, self.name, self.lease_seconds):
+                        # Another worker may hold the task now: its outputs win
+                        print(f"⚠️ {self.name} lost the lease of {_describe(task)}, discarding its output")
+                        lost.set()
+                        return
+                except sqlite3.Error as e:
+                    print(f"⚠️ {self.name} could not send a heartbeat: {e}")
+
+    def _update(self, task, what, call, *args):
+        # A busy shared database must not stop the worker: the lease runs out and the task is run again
+        try:
+            return call(*args)
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ {self.name} could not {what} {_describe(task)}: {e}")
+            return None
+
+    def _run_task(self, queue, task):
+        print(f"▶ {self.name}: {_describe(task)} (attempt {task.attempts})")
+        finished = threading.Event()
+        lost = threading.Event()
+        beat = threading.Thread(target=self._heartbeat, args=(task, finished, lost), daemon=True)
+        beat.start()
+        try:
+            result = self.execute(task, lost)
+        except KeyboardInterrupt:
+            # Interrupted: hand the task to another worker without counting the attempt
+            finished.set()
+            self._update(task, "release", queue.release, task.id, self.name)
+            raise
+        except Exception as e:
+            finished.set()
+            beat.join()
+            if lost.is_set():
+                print(f"✗ {self.name}: {_describe(task)} discarded after its lease was lost")
+                return
+            print(f"✗ {self.name}: {_describe(task)} failed: {e}")
+            self._update(task, "fail", queue.fail, task.id, self.name, repr(e), self.retry_delay)
+            return
+        finished.set()
+        beat.join()
+        if self._update(task, "complete", queue.complete, task.id, self.name, result) is False:
+            print(f"⚠️ {self.name}: {_describe(task)} finished after its lease was lost, result dropped")
+
+    def run(self):
+        print(f"🔧 Worker {self.name} on '{self.queue_path}'")
+        with task_queue.TaskQueue(self.queue_path) as queue:
+            while not self.stop_event.is_set():
+                try:
+                    task = queue.lease(self.name, lease_seconds=self.lease_seconds)
+                    if task is None and not self.keep_running and queue.get_meta("closed") == "1":
+                        break
+                except sqlite3.OperationalError as e:
+                    print(f"⚠️ {self.name} could not lease a task: {e}")
+                    task = None
+                if task is None:
+                    self.stop_event.wait(self.poll_interval)
+                    continue
+                self._run_task(queue, task)
+        print(f"Worker {self.name} stopped.")
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def run_worker(queue_path, name=None, keep_running=False):
+    """Run a Worker with the queue settings of main (target of local worker processes)."""
+    worker = Worker(queue_path, name, lease_seconds=main.QUEUE_LEASE_SECONDS,
+                    poll_interval=main.QUEUE_POLL_INTERVAL, retry_delay=main.QUEUE_RETRY_DELAY,
+                    keep_running=keep_running)
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        pass
+
+
+class _Video:
+    """Coordinator state of one video."""
+
+    def __init__(self, video_path, output_folder, journal):
+        self.video_path = video_path
+        self.name = os.path.basename(video_path)
+        self.output_folder = output_folder
+        self.journal = journal
+        self.tasks = set()  # Ids of its unfinished tasks
+        self.outputs = 0
+        self.done = 0
+        self.failed = 0
+
+
+class Coordinator:
+    """Queues analysis and render tasks for a batch of videos and follows them to the end."""
+
+    def __init__(self, video_paths, queue_path, config=None, poll_interval=1.0, max_attempts=3):
+        self.video_paths = [os.path.abspath(p) for p in video_paths]
+        self.queue_path = queue_path
+        self.config = config or main.job_config()
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self._outstanding = {}  # task id -> _Video
+        self.results = []
+
+    def _put(self, queue, kind, video, key, **payload):
+        payload = dict(video=video.video_path, output_folder=video.output_folder,
+                       config=self.config._asdict(), **payload)
+        # Keyed by content, settings and target: a resumed coordinator adopts tasks still queued
+        key = f"{kind}:{video.journal.fingerprint}:{video.journal.settings}:{key}"
+        task_id = queue.put(kind, payload, key, self.max_attempts)
+        self._outstanding[task_id] = video
+        video.tasks.add(task_id)
+
+    def _planned(self, queue, video, cut_list):
+        if self.config.plan_only:
+            self._finish(video)
+            return
+        # Partial files of killed workers are never complete: start them over. Only
+        # those of dead processes of this host go; workers still writing keep theirs.
+        if self.config.resume:
+            job_journal.remove_leftovers(video.output_folder)
+        jobs = main.clip_jobs(cut_list.clips, video.output_folder)
+        if self.config.merge_clips:
+            output_path = os.path.join(video.output_folder, "final_short.mp4")
+            windows = [(job.t_start, job.t_end) for job in jobs]
+            if jobs and not video.journal.has_output(output_path, windows):
+                video.outputs = 1
+                self._put(queue, "merge", video, output_path, output_path=output_path,
+                          clips=[job._asdict() for job in jobs])
+        else:
+            kept = 0
+            for job in jobs:
+                if video.journal.has_output(job.output_path, [(job.t_start, job.t_end)]):
+                    kept += 1
+                    continue
+                self._put(queue, "render", video, f"{job.output_path}:{job.t_start}:{job.t_end}",
+                          clip=job._asdict(), fps=cut_list.fps, clip_count=len(jobs))
+            video.outputs = len(jobs) - kept
+            if kept:
+                print(f"  '{video.name}': {kept} clips were finished before, kept.")
+        if not video.tasks:
+            self._finish(video)
+
+    def _handle(self, queue, task):
+        video = self._outstanding.pop(task.id)
+        video.tasks.discard(task.id)
+        if task.state == "failed":
+            video.failed += 1
+            print(f"❌ {_describe(task)} failed after {task.attempts} attempts: {task.error}")
+        elif task.kind == "analyze":
+            cut_list = cutlist.from_dict(task.result)
+            video.journal.record_plan(cut_list)
+            print(f"📝 '{video.name}': {len(cut_list.clips)} clips planned ({task.worker})")
+            self._planned(queue, video, cut_list)
+            return
+        else:
+            output_path = task.payload["clip"]["output_path"] if task.kind == "render" else task.payload["output_path"]
+            clips = [task.payload["clip"]] if task.kind == "render" else task.payload["clips"]
+            try:
+                video.journal.record_output(output_path, [(c["t_start"], c["t_end"]) for c in clips])
+                video.done += 1
+                print(f"  ✓ '{video.name}' {video.done}/{video.outputs}: {output_path} ({task.worker})")
+            except OSError as e:
+                video.failed += 1
+                print(f"❌ {_describe(task)}: output missing after the task finished ({e})")
+        if not video.tasks:
+            self._finish(video)
+
+    def _finish(self, video):
+        if video.failed:
+            error = RuntimeError(f"{video.failed} tasks failed")
+            print(f"⚠️ '{video.name}': {video.failed} tasks failed (run again with --resume to retry them)")
+            self.results.append(BatchResult(video.video_path, None, error))
+            return
+        if not self.config.plan_only:
+            video.journal.finish()
+        print(f"✅ Completed '{video.name}'")
+        self.results.append(BatchResult(video.video_path, video.output_folder, None))
+
+    def _start(self, queue):
+        for video_path in self.video_paths:
+            output_folder = main.default_output_folder(video_path, self.config)
+            video = _Video(video_path, output_folder, main.open_job_journal(video_path, output_folder, self.config))
+            if video.journal.finished:
+                print(f"✓ '{video.name}' was completed before, skipping.")
+                self.results.append(BatchResult(video_path, output_folder, None))
+                continue
+            cut_list = video.journal.cut_list()
+            if cut_list is not None:
+                print(f"📝 '{video.name}': resuming from its {len(cut_list.clips)} planned clips")
+                self._planned(queue, video, cut_list)
+            else:
+                self._put(queue, "analyze", video, output_folder)
+
+    def run(self, local_workers=0):
+        """Queue every video, run `local_workers` worker processes here, and wait
+        until every task ended. Returns batch.BatchResult entries.
+        """
+        processes = []
+        with task_queue.TaskQueue(self.queue_path) as queue:
+            if not self.config.resume:
+                queue.clear()
+            queue.set_meta("closed", "0")
+            try:
+                self._start(queue)
+                print(f"Queued {len(self._outstanding)} tasks in '{self.queue_path}'.")
+                # Fresh interpreters: workers never inherit this process's open database
+                context = multiprocessing.get_context("spawn")
+                for n in range(local_workers if self._outstanding else 0):
+                    process = context.Process(target=run_worker, args=(self.queue_path,),
+                                              name=f"asmr-worker-{n + 1}")
+                    process.start()
+                    processes.append(process)
+                while self._outstanding:
+                    for task in queue.tasks(self._outstanding).values():
+                        if task.state in ("done", "failed"):
+                            self._handle(queue, task)
+                    if self._outstanding:
+                        time.sleep(self.poll_interval)
+            finally:
+                # Idle workers exit once the queue is closed
+                queue.set_meta("closed", "1")
+                for process in processes:
+                    process.join()
+        return self.results
+
+
+def cli(argv=None):
+    """Command line entry point (asmr-cutter-queue)."""
+    parser = argparse.ArgumentParser(description="Process videos with a coordinator and workers sharing a task queue.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    coordinator = commands.add_parser("coordinator", help="queue the videos of a folder and wait for their tasks")
+    coordinator.add_argument("--folder", default=main.INPUT_FOLDER,
+                             help=f"folder of the videos (default: {main.INPUT_FOLDER})")
+    coordinator.add_argument("--queue", help="queue database (default: .asmr_queue.sqlite in the folder)")
+    coordinator.add_argument("--workers", type=int, default=0, help="worker processes to run on this host")
+    coordinator.add_argument("--resume", action="store_true",
+                             help="continue interrupted jobs: skip finished videos and keep finished clips")
+    coordinator.add_argument("--plan", action="store_true", help="only write each video's cut list, no encoding")
+    worker = commands.add_parser("worker", help="run tasks from a queue")
+    worker.add_argument("--queue", help=f"queue database (default: .asmr_queue.sqlite in {main.INPUT_FOLDER})")
+    worker.add_argument("--name", help="worker name in the queue (default: host:pid)")
+    worker.add_argument("--keep-running", action="store_true",
+                        help="keep waiting for tasks after the coordinator finished")
+    args = parser.parse_args(argv)
+
+    if args.command == "worker":
+        run_worker(args.queue or default_queue_path(), args.name, args.keep_running)
+        return
+
+    if not os.path.isdir(args.folder):
+        print(f"Folder '{args.folder}/' not found")
+        return
+    video_paths = [os.path.join(args.folder, f) for f in sorted(os.listdir(args.folder))
+                   if f.endswith(main.VIDEO_EXTENSIONS)]
+    config = main.job_config(plan_only=args.plan, resume=args.resume)
+    coordinator = Coordinator(video_paths, args.queue or default_queue_path(args.folder), config,
+                              poll_interval=main.QUEUE_POLL_INTERVAL, max_attempts=main.QUEUE_MAX_ATTEMPTS)
+    results = coordinator.run(local_workers=args.workers)
+    failed = [r for r in results if r.error is not None]
+    if failed:
+        print(f"\n⚠️  {len(failed)} of {len(results)} videos failed:")
+        for r in failed:
+            print(f"  - {os.path.basename(r.video_path)}")
+    print(f"\n{'='*60}")
+    print("🎬 PROCESSING COMPLETE!")
+    print(f"{'='*60}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,179 @@
+"""
+Which video encoders work on this machine, and which preset to use.
+
+ffmpeg builds list hardware encoders (NVENC, QSV, AMF) whether or not the
+GPU and driver to run them are present. `encoder_available` opens an
+encoder on a few tiny test frames, and the answers are cached per host and
+ffmpeg binary in ~/.cache/asmr-pro-cutter/encoders.json. `resolve`
+returns the requested preset if its encoder opens; otherwise it falls back
+to the software x264/x265 presets instead of failing on every clip.
+
+`calibrate` optionally encodes a few seconds of the real source with every
+usable preset and picks the fastest one whose SSIM against the source
+reaches a quality target.
+
+    python encoders.py                # probe again and list usable encoders
+"""
+import json
+import os
+import platform
+import re
+import tempfile
+import threading
+import time
+
+from analysis_cache import cache_home, fingerprint
+from smart_render import _ts, get_ffmpeg_exe, probe_media, run_ffmpeg, video_encoder_args
+
+SOFTWARE_FALLBACKS = ("x264", "x265")  # Presets tried when the requested encoder does not open
+CALIBRATION_SECONDS = 4.0   # Seconds of the source encoded per candidate preset
+CALIBRATION_MIN_SSIM = 0.97  # Quality target: SSIM of the sample against the source
+PROBE_CACHE_VERSION = 1
+
+_lock = threading.Lock()
+_cache = None
+
+
+def probe_cache_path():
+    return os.path.join(cache_home(), "encoders.json")
+
+
+def _ffmpeg_id():
+    """Identifies this host and ffmpeg binary: probe results are only reused for the same pair."""
+    exe = get_ffmpeg_exe()
+    st = os.stat(exe)
+    return f"{PROBE_CACHE_VERSION}:{platform.node()}:{exe}:{st.st_size}:{int(st.st_mtime)}"
+
+
+def _load():
+    global _cache
+    if _cache is None:
+        ffmpeg_id = _ffmpeg_id()
+        try:
+            with open(probe_cache_path()) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        if data.get("ffmpeg") != ffmpeg_id:
+            data = {"ffmpeg": ffmpeg_id}
+        data.setdefault("encoders", {})
+        data.setdefault("calibration", {})
+        _cache = data
+    return _cache
+
+
+def _save():
+    path = probe_cache_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(_cache, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _try_encoder(codec):
+    """True if ffmpeg can open `codec` and encode a few frames."""
+    try:
+        run_ffmpeg([
+            "-f", "lavfi", "-i", "color=c=black:s=256x144:r=25:d=0.2",
+            "-c:v", codec, "-pix_fmt", "yuv420p", "-f", "null", "-",
+        ])
+        return True
+    except RuntimeError:
+        return False
+
+
+def encoder_available(codec, refresh=False):
+    """Whether the ffmpeg encoder `codec` works here (probed once, then cached)."""
+    with _lock:
+        cache = _load()
+        if refresh or codec not in cache["encoders"]:
+            cache["encoders"][codec] = _try_encoder(codec)
+            _save()
+        return cache["encoders"][codec]
+
+
+def resolve(name, presets, fallbacks=SOFTWARE_FALLBACKS):
+    """Name of preset `name` if its encoder works here, else of the first working fallback."""
+    tried = []
+    for candidate in (name,) + tuple(f for f in fallbacks if f != name):
+        preset = presets.get(candidate)
+        if preset is None:
+            continue
+        if encoder_available(preset["codec"]):
+            return candidate
+        tried.append(f"{candidate} ({preset['codec']})")
+    raise RuntimeError(f"No usable video encoder, tried: {', '.join(tried)}")
+
+
+def _ssim(encoded_path, video_path, t_start, seconds):
+    """Mean SSIM of an encoded sample against the same window of the source."""
+    text = run_ffmpeg([
+        "-i", encoded_path,
+        "-ss", _ts(t_start), "-t", _ts(seconds), "-i", video_path,
+        "-lavfi", "[0:v]setpts=PTS-STARTPTS[a];[1:v]setpts=PTS-STARTPTS[b];[a][b]ssim",
+        "-f", "null", "-",
+    ], loglevel="info").decode(errors="replace")
+    m = re.search(r"All:(\d+(?:\.\d+)?)", text)
+    return float(m.group(1)) if m else 0.0
+
+
+def measure_preset(video_path, preset, t_start, seconds, threads=4):
+    """Encode `seconds` of the source with `preset`: {"fps": frames per second, "ssim": quality}."""
+    info = probe_media(video_path)
+    with tempfile.TemporaryDirectory(prefix="asmr_calibrate_") as workdir:
+        sample = os.path.join(workdir, "sample.mp4")
+        started = time.perf_counter()
+        run_ffmpeg(["-ss", _ts(t_start), "-t", _ts(seconds), "-i", video_path, "-an"]
+                   + video_encoder_args(preset, threads) + [sample])
+        elapsed = time.perf_counter() - started
+        return {
+            "fps": round(seconds * (info["fps"] or 30.0) / max(elapsed, 1e-6), 1),
+            "ssim": round(_ssim(sample, video_path, t_start, seconds), 5),
+        }
+
+
+def calibrate(video_path, presets, seconds=CALIBRATION_SECONDS, min_ssim=CALIBRATION_MIN_SSIM, threads=4):
+    """Fastest usable preset on a sample of `video_path` whose SSIM reaches `min_ssim`.
+
+    Every preset whose encoder opens here is tried on the same window from
+    the middle of the source. If none reaches the target, the one with the
+    best SSIM wins. Returns (name, {name: measurement}); the choice is
+    cached per source and preset settings.
+    """
+    key = json.dumps([fingerprint(video_path), presets, seconds, min_ssim, threads], sort_keys=True)
+    with _lock:
+        cached = _load()["calibration"].get(key)
+    if cached is not None and cached["name"] in presets:
+        return cached["name"], cached["results"]
+
+    duration = probe_media(video_path)["duration"] or seconds
+    t_start = max(0.0, duration / 2 - seconds / 2)
+    results = {}
+    for name, preset in presets.items():
+        if encoder_available(preset["codec"]):
+            try:
+                results[name] = measure_preset(video_path, preset, t_start, min(seconds, duration), threads)
+            except RuntimeError:
+                continue  # Opens on a test pattern but not on this source
+    if not results:
+        raise RuntimeError("No usable video encoder to calibrate")
+
+    good = [n for n, r in results.items() if r["ssim"] >= min_ssim]
+    if good:
+        name = max(good, key=lambda n: results[n]["fps"])
+    else:
+        name = max(results, key=lambda n: results[n]["ssim"])
+    with _lock:
+        _load()["calibration"][key] = {"name": name, "results": results}
+        _save()
+    return name, results
+
+
+if __name__ == "__main__":
+    import main
+
+    for name, preset in main.GPU_PRESETS.items():
+        ok = encoder_available(preset["codec"], refresh=True)
+        print(f"  {'✓' if ok else '✗'} {name:<10} {preset['codec']}")
+    print(f"Results cached in {probe_cache_path()}")
@@ -0,0 +1,204 @@
+"""
+Frame-level audio features behind the crispness index.
+
+FeatureEngine computes one magnitude spectrogram per signal and derives all
+three features from the bins above MIN_FREQ. Every raw feature value only
+depends on the samples around its own frame, so the same engine serves the
+in-memory analysis and the block-wise streaming analysis (see
+streaming_analysis.py). Normalization is applied afterwards from
+per-feature peaks, which can be tracked as running statistics.
+"""
+import numpy as np
+
+N_FFT = 2048
+N_MELS = 64
+# SCORING FORMULA weights: Onset (impact), Centroid (quality), ZCR (sharpness)
+WEIGHTS = (0.5, 0.3, 0.2)
+
+
+def frame_context(hop_length, n_fft=N_FFT):
+    """(left, right) frames of signal context every frame's raw features depend on."""
+    half = -(-n_fft // (2 * hop_length))  # ceil(n_fft / 2 / hop) in frames
+    # Onset flux looks back one extra STFT frame plus librosa's centering shift
+    return 2 * half + 2, half + 1
+
+
+class FeatureEngine:
+    """Onset flux, spectral centroid and zero-crossing rate from a single STFT.
+
+    Only bins at or above `min_freq` contribute, so low-frequency rumble
+    does not affect any feature.
+    """
+
+    def __init__(self, sr, hop_length, min_freq=0.0, n_fft=N_FFT):
+        self.sr = sr
+        self.hop_length = hop_length
+        self.n_fft = n_fft
+        # Keep at least a sliver of spectrum below Nyquist
+        self.min_freq = min(float(min_freq), 0.45 * sr)
+
+        # librosa takes seconds to import: load it on first use, not with the module
+        import librosa
+        freqs = librosa.fft_frequencies(sr=sr, n_fft=n_fft)
+        self._band = freqs >= self.min_freq
+        self._freqs = freqs[self._band][:, np.newaxis].astype(np.float32)
+        self._mel_basis = librosa.filters.mel(
+            sr=sr, n_fft=n_fft, n_mels=N_MELS, fmin=self.min_freq
+        )[:, self._band]
+
+    @property
+    def context(self):
+        """(left, right) frames of signal context every frame's raw features depend on."""
+        return frame_context(self.hop_length, self.n_fft)
+
+    def _spectrum(self, y, hop_length):
+        import librosa
+        S = np.abs(librosa.stft(y, n_fft=self.n_fft, hop_length=hop_length, pad_mode="constant"))
+        return S[self._band]
+
+    def _log_mel(self, power):
+        import librosa
+        return librosa.power_to_db(self._mel_basis @ power, top_db=None)
+
+    def _centroid_zcr(self, S, power):
+        total_mag = S.sum(axis=0)
+        total_power = power.sum(axis=0)
+
+        # 2. Spectral Centroid (Brightness)
+        spectral_centroid = np.divide(
+            (self._freqs * S).sum(axis=0), total_mag,
+            out=np.zeros_like(total_mag), where=total_mag > 0,
+        )
+
+        # 3. Zero Crossing Rate (Typical of sharp metallic/plastic sounds).
+        # Rice's formula: crossings per sample = 2 * rms frequency / sr.
+        mean_sq_freq = np.divide(
+            (self._freqs ** 2 * power).sum(axis=0), total_power,
+            out=np.zeros_like(total_power), where=total_power > 0,
+        )
+        zcr = 2.0 * np.sqrt(mean_sq_freq) / self.sr
+        return spectral_centroid, zcr
+
+    def features(self, y):
+        """Raw features per frame: float32 array of shape (3, n_frames) in WEIGHTS order."""
+        import librosa
+        S = self._spectrum(y, self.hop_length)
+        power = S ** 2
+
+        # 1. Onset Strength (Suddenness): log-mel flux of the band.
+        # No global top_db clamp, so each frame only depends on nearby samples.
+        onset_env = librosa.onset.onset_strength(
+            S=self._log_mel(power), sr=self.sr, n_fft=self.n_fft, hop_length=self.hop_length
+        )
+        spectral_centroid, zcr = self._centroid_zcr(S, power)
+        return np.stack([onset_env, spectral_centroid, zcr]).astype(np.float32)
+
+    def features_range(self, y, start, stop):
+        """Raw features of frames [start, stop) of the whole signal `y`.
+
+        Only the samples around those frames are analyzed; the values equal
+        the matching columns of features(y).
+        """
+        left, right = self.context
+        first = max(0, start - left)
+        end = min(len(y), (stop + right) * self.hop_length)
+        raw = self.features(y[first * self.hop_length:end])
+        return raw[:, start - first:stop - first]
+
+    def features_at(self, y, frames):
+        """Raw features of the given frames of features(y), shape (3, len(frames)).
+
+        `y` can be any sliceable signal (e.g. a memory map). Frames closer
+        than the feature context share one features_range call.
+        """
+        frames = np.asarray(frames, dtype=np.intp)
+        out = np.zeros((3, len(frames)), dtype=np.float32)
+        if not len(frames):
+            return out
+        order = np.argsort(frames, kind="stable")
+        ordered = frames[order]
+        splits = np.flatnonzero(np.diff(ordered) > sum(self.context)) + 1
+        for group in np.split(np.arange(len(frames)), splits):
+            first, last = ordered[group[0]], ordered[group[-1]]
+            raw = self.features_range(y, first, last + 1)
+            out[:, order[group]] = raw[:, ordered[group] - first]
+        return out
+
+    def strided_features(self, y, stride, span_onset=False):
+        """Raw features of frames 0, stride, 2 * stride, ... of features(y).
+
+        Every column equals the matching one of a full analysis, at about
+        2 / stride of its cost: centroid and ZCR come from an STFT at
+        hop_length * stride, and the onset flux of frame t compares the
+        spectra centred n_fft / 2 and n_fft / 2 + hop_length samples before
+        it (librosa's centering shift), taken from that STFT and from a
+        second one offset by hop_length. n_fft / 2 must be a multiple of
+        hop_length * stride.
+
+        With `span_onset`, also returns the flux across each whole stride
+        (frames t - stride to t): a transient between two scan frames puts
+        its onset on a single fine frame, which only this flux sees.
+        """
+        hop = self.hop_length * stride
+        half = self.n_fft // 2
+        if half % hop:
+            raise ValueError(f"n_fft / 2 ({half}) is not a multiple of hop_length * stride ({hop})")
+        n_frames = -(-(1 + len(y) // self.hop_length) // stride)
+
+        S = self._spectrum(y, hop)[:, :n_frames]
+        power = S ** 2
+        spectral_centroid, zcr = self._centroid_zcr(S, power)
+
+        # Fine frame t = m * stride; before t = half / hop_length + 1 librosa's padding makes it 0
+        shift = half // hop
+        onset_env = np.zeros(n_frames, dtype=np.float32)
+        span_env = np.zeros(n_frames, dtype=np.float32)
+        if n_frames > shift + 1:
+            log_mel = self._log_mel(power)
+            # Frame j is centred hop_length samples before frame j of S
+            early = self._spectrum(np.concatenate([np.zeros(self.hop_length, dtype=y.dtype), y]), hop)
+            log_early = self._log_mel(early[:, :n_frames - shift] ** 2)
+            flux = np.maximum(0.0, log_mel[:, 1:n_frames - shift] - log_early[:, 1:n_frames - shift])
+            onset_env[shift + 1:] = flux.mean(axis=0)
+            span = np.maximum(0.0, log_mel[:, 1:n_frames - shift] - log_mel[:, :n_frames - shift - 1])
+            span_env[shift + 1:] = span.mean(axis=0)
+        raw = np.stack([onset_env, spectral_centroid, zcr]).astype(np.float32)
+        return (raw, span_env) if span_onset else raw
+
+
+def crispness_features(y, sr, hop_length, min_freq=0.0):
+    """Raw features of a whole signal (see FeatureEngine.features)."""
+    return FeatureEngine(sr, hop_length, min_freq).features(y)
+
+
+def feature_peaks(raw):
+    """Per-feature max absolute value (the librosa.util.normalize reference)."""
+    if raw.shape[1] == 0:
+        return np.zeros(raw.shape[0], dtype=np.float64)
+    return np.abs(raw).max(axis=1).astype(np.float64)
+
+
+def _scales(peaks):
+    # Same rule as librosa.util.normalize: tiny norms are left unchanged
+    tiny = np.finfo(np.float32).tiny
+    return np.where(np.asarray(peaks) < tiny, 1.0, peaks)
+
+
+def combine_scores(raw, peaks, weights=WEIGHTS):
+    """Crispness score per frame from raw features and their normalization peaks."""
+    coeffs = (np.asarray(weights) / _scales(peaks)).astype(np.float32)
+    combined_score = coeffs @ raw
+    # Square it to clearly separate top sounds from average ones
+    return combined_score ** 2
+
+
+def mean_score(gram, n_frames, peaks, weights=WEIGHTS):
+    """Mean crispness score from the feature Gram matrix (sum of raw_i * raw_j).
+
+    Lets the adaptive peak threshold be computed from running statistics
+    instead of the full score array.
+    """
+    if n_frames == 0:
+        return 0.0
+    coeffs = np.asarray(weights, dtype=np.float64) / _scales(peaks)
+    return float(coeffs @ gram @ coeffs / n_frames)
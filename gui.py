@@ -9,28 +9,70 @@ from pathlib import Path
 
 # Import main logic
 import main
+import loudness
+import progress
 
 SETTINGS_FILE = "settings.json"
 
-class TextRedirector:
-    def __init__(self, text_widget, root):
-        self.text_widget = text_widget
-        self.root = root
+# Share of the progress bar covered by each pipeline stage
+PROGRESS_STAGES = {
+    "analysis": (0.0, 0.3),
+    "clips": (0.3, 1.0),
+    "merge": (0.3, 1.0),
+}
 
+class LogPump:
+    """Collects log text and progress updates from the worker thread and
+    hands them to Tk in batches, a fixed number of times per second.
+    
+    `write` only appends to a buffer, so chatty output cannot flood the Tk
+    event queue; of the progress updates only the latest one is shown.
+    """
+    FLUSH_INTERVAL_MS = 100
+    MAX_LOG_LINES = 5000  # Older lines are dropped to keep the widget fast
+    
+    def __init__(self, root, text_widget, on_progress):
+        self.root = root
+        self.text_widget = text_widget
+        self.on_progress = on_progress
+        self._lock = threading.Lock()
+        self._chunks = []
+        self._progress = None
+        self.root.after(self.FLUSH_INTERVAL_MS, self._tick)
+    
     def write(self, string):
-        self.root.after(0, lambda: self._insert(string))
-
-    def _insert(self, string):
-        try:
-            self.text_widget.config(state=tk.NORMAL)
-            self.text_widget.insert(tk.END, string)
-            self.text_widget.see(tk.END)
-            self.text_widget.config(state=tk.DISABLED)
-        except:
-            pass
-
+        with self._lock:
+            self._chunks.append(string)
+    
     def flush(self):
         pass
+    
+    def progress(self, update):
+        with self._lock:
+            self._progress = update
+    
+    def pump(self):
+        """Show everything buffered so far (Tk thread only)."""
+        with self._lock:
+            chunks, self._chunks = self._chunks, []
+            update, self._progress = self._progress, None
+        if chunks:
+            try:
+                self.text_widget.config(state=tk.NORMAL)
+                self.text_widget.insert(tk.END, "".join(chunks))
+                lines = int(self.text_widget.index("end-1c").split(".")[0])
+                if lines > self.MAX_LOG_LINES:
+                    self.text_widget.delete("1.0", f"{lines - self.MAX_LOG_LINES}.0")
+                self.text_widget.see(tk.END)
+                self.text_widget.config(state=tk.DISABLED)
+            except tk.TclError:
+                pass
+        if update is not None:
+            self.on_progress(update)
+    
+    def _tick(self):
+        self.pump()
+        self.root.after(self.FLUSH_INTERVAL_MS, self._tick)
 
 class ASMRCutterGUI:
     def __init__(self, root):
@@ -54,6 +96,9 @@ class ASMRCutterGUI:
         self.threads = tk.IntVar(value=main.THREADS)
         self.merge_clips = tk.BooleanVar(value=main.MERGE_CLIPS)
         self.audio_normalize = tk.BooleanVar(value=main.AUDIO_NORMALIZE)
+        self.normalize_mode = tk.StringVar(value=main.NORMALIZE_MODE)
+        self.plan_only = tk.BooleanVar(value=main.PLAN_ONLY)
+        self.render_mode = tk.StringVar(value=main.RENDER_MODE)
         self.processing = False
         
         # Load saved settings if exist
@@ -61,6 +106,9 @@ class ASMRCutterGUI:
         
         self.create_menu()
         self.setup_ui()
+        
+        # Load the analysis/encoding libraries once the window is up
+        self.root.after_idle(lambda: threading.Thread(target=main.preload, name="preload", daemon=True).start())
     
     def create_menu(self):
         menubar = tk.Menu(self.root)
@@ -72,6 +120,8 @@ class ASMRCutterGUI:
         file_menu.add_command(label="Save Settings", command=self.save_settings)
         file_menu.add_command(label="Load Settings", command=self.load_settings)
         file_menu.add_separator()
+        file_menu.add_command(label="Render Cut List...", command=self.render_cut_list)
+        file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.root.quit)
         
         # Help Menu
@@ -114,6 +164,9 @@ ASMR Pro Cutter - Quick Guide
    - GPU Preset: Choose your GPU brand (NVIDIA, Intel, AMD) for hardware acceleration.
    - Quality (CQ): Lower is better quality (0-51). 18 is near lossless.
    - Audio bitrate: 320k is recommended for ASMR.
+   - Render mode: "smart" re-encodes only the frames around each cut and
+     copies the rest (much faster on 4K). "copy" snaps cuts to keyframes
+     and never re-encodes (quick previews).
 
 6. Start Processing:
    Click the green button and wait. The log will show progress.
@@ -149,7 +202,10 @@ Features:
             "audio_bitrate": self.audio_bitrate.get(),
             "threads": self.threads.get(),
             "merge_clips": self.merge_clips.get(),
-            "audio_normalize": self.audio_normalize.get()
+            "audio_normalize": self.audio_normalize.get(),
+            "normalize_mode": self.normalize_mode.get(),
+            "plan_only": self.plan_only.get(),
+            "render_mode": self.render_mode.get()
         }
         try:
             with open(SETTINGS_FILE, 'w') as f:
@@ -181,6 +237,9 @@ Features:
             self.threads.set(settings.get("threads", main.THREADS))
             self.merge_clips.set(settings.get("merge_clips", main.MERGE_CLIPS))
             self.audio_normalize.set(settings.get("audio_normalize", main.AUDIO_NORMALIZE))
+            self.normalize_mode.set(settings.get("normalize_mode", main.NORMALIZE_MODE))
+            self.plan_only.set(settings.get("plan_only", main.PLAN_ONLY))
+            self.render_mode.set(settings.get("render_mode", main.RENDER_MODE))
         except Exception as e:
             print(f"Error loading settings: {e}")
         
@@ -280,6 +339,16 @@ Features:
             offvalue=False
         ).pack(anchor=tk.W, pady=(5, 0))
         
+        # Plan only option
+        tk.Checkbutton(
+            output_frame,
+            text="Plan only: write the cut list (cut_list.json / .edl) without encoding",
+            variable=self.plan_only,
+            font=("Segoe UI", 9),
+            onvalue=True,
+            offvalue=False
+        ).pack(anchor=tk.W)
+        
         # 3. Parameters
         params_frame = tk.LabelFrame(main_frame, text="⚙️ Clip Parameters", font=("Segoe UI", 10, "bold"), padx=10, pady=10)
         params_frame.pack(fill=tk.X, pady=(0, 10))
@@ -375,12 +444,23 @@ Features:
         tk.Label(advanced_grid, text="Audio Normalize:", font=("Segoe UI", 9)).grid(row=2, column=0, sticky=tk.W, pady=5)
         tk.Checkbutton(
             advanced_grid,
-            text="Normalize audio levels (max volume)",
+            text="Normalize audio levels",
             variable=self.audio_normalize,
             font=("Segoe UI", 9),
             onvalue=True,
             offvalue=False
-        ).grid(row=2, column=1, columnspan=2, sticky=tk.W, padx=5)
+        ).grid(row=2, column=1, sticky=tk.W, padx=5)
+        normalize_frame = tk.Frame(advanced_grid)
+        normalize_frame.grid(row=2, column=2, sticky=tk.W, padx=10)
+        ttk.Combobox(
+            normalize_frame,
+            textvariable=self.normalize_mode,
+            values=list(loudness.MODES),
+            state="readonly",
+            font=("Segoe UI", 9),
+            width=6
+        ).pack(side=tk.LEFT)
+        tk.Label(normalize_frame, text=f"(peak = max volume, lufs = {main.NORMALIZE_LUFS:g} LUFS loudness, capped by the peak level)", font=("Segoe UI", 8, "italic"), fg="#666").pack(side=tk.LEFT, padx=5)
         
         # Encoding settings
         encoding_frame = tk.LabelFrame(main_frame, text="🎞️ Encoding Settings", font=("Segoe UI", 10, "bold"), padx=10, pady=10)
@@ -390,11 +470,11 @@ Features:
         encoding_grid.pack(fill=tk.X)
         
         # GPU Preset
-        tk.Label(encoding_grid, text="GPU Preset:", font=("Segoe UI", 9)).grid(row=0, column=0, sticky=tk.W, pady=5)
+        tk.Label(encoding_grid, text="Encoder Preset:", font=("Segoe UI", 9)).grid(row=0, column=0, sticky=tk.W, pady=5)
         preset_combo = ttk.Combobox(
             encoding_grid,
             textvariable=self.encoding_preset,
-            values=["nvidia", "intel", "amd"],
+            values=list(main.GPU_PRESETS),
             state="readonly",
             font=("Segoe UI", 9),
             width=12
@@ -450,6 +530,19 @@ Features:
         ).grid(row=3, column=1, sticky=tk.W, padx=10)
         tk.Label(encoding_grid, text="(Number of CPU threads for encoding)", font=("Segoe UI", 8, "italic"), fg="#666").grid(row=3, column=2, sticky=tk.W, padx=10)
         
+        # Render mode
+        tk.Label(encoding_grid, text="Render mode:", font=("Segoe UI", 9)).grid(row=4, column=0, sticky=tk.W, pady=5)
+        render_combo = ttk.Combobox(
+            encoding_grid,
+            textvariable=self.render_mode,
+            values=["reencode", "smart", "copy"],
+            state="readonly",
+            font=("Segoe UI", 9),
+            width=12
+        )
+        render_combo.grid(row=4, column=1, sticky=tk.W, padx=10)
+        tk.Label(encoding_grid, text="(smart = copy whole GOPs, copy = keyframe-snapped preview)", font=("Segoe UI", 8, "italic"), fg="#666").grid(row=4, column=2, sticky=tk.W, padx=10)
+        
         # Clip info duration
         self.clip_info = tk.Label(
             params_grid, 
@@ -482,8 +575,10 @@ Features:
         self.process_btn.pack(fill=tk.X)
         
         # Progress bar
-        self.progress = ttk.Progressbar(main_frame, mode='indeterminate')
-        self.progress.pack(fill=tk.X, pady=(0, 10))
+        self.progress = ttk.Progressbar(main_frame, mode='indeterminate', maximum=100)
+        self.progress.pack(fill=tk.X, pady=(0, 2))
+        self.progress_label = tk.Label(main_frame, text="", font=("Segoe UI", 9), fg="gray")
+        self.progress_label.pack(anchor=tk.W, pady=(0, 8))
         
         # 5. Log Output
         log_frame = tk.LabelFrame(main_frame, text="📋 Log", font=("Segoe UI", 10, "bold"), padx=10, pady=10)
@@ -500,6 +595,7 @@ Features:
             height=20
         )
         self.log_text.pack(fill=tk.BOTH, expand=True)
+        self.log_pump = LogPump(self.root, self.log_text, self.show_progress)
         
         self.log("✅ Ready. Select a video and press START PROCESSING.")
         self.log("💡 If you don't select an output folder, it will be created automatically in the same folder as the video.")
@@ -532,11 +628,29 @@ Features:
             self.log(f"📁 Output set to: {folder}")
     
     def log(self, message):
-        self.log_text.config(state=tk.NORMAL)
-        self.log_text.insert(tk.END, message + "\n")
-        self.log_text.see(tk.END)
-        self.log_text.config(state=tk.DISABLED)
-        self.root.update_idletasks()
+        # Through the pump, so it lands after any output still buffered
+        self.log_pump.write(message + "\n")
+        self.log_pump.pump()
+    
+    def show_progress(self, update):
+        lo, hi = PROGRESS_STAGES.get(update.stage, (0.0, 1.0))
+        fraction = min(1.0, update.done / update.total) if update.total else 1.0
+        if str(self.progress.cget("mode")) != "determinate":
+            self.progress.stop()
+            self.progress.config(mode="determinate")
+        self.progress["value"] = 100 * (lo + (hi - lo) * fraction)
+        
+        if update.stage == "analysis":
+            text = f"Analyzing audio... {fraction:.0%}"
+        elif update.stage == "clips":
+            text = f"Clip {update.done}/{update.total}"
+            if update.info.get("fps"):
+                text += f" · {update.info['fps']:.0f} fps"
+        elif update.stage == "merge":
+            text = "Merged video saved" if fraction >= 1.0 else "Merging clips..."
+        else:
+            text = f"{update.stage}: {fraction:.0%}"
+        self.progress_label.config(text=text)
     
     def start_processing(self):
         if self.processing:
@@ -551,47 +665,79 @@ Features:
             messagebox.showerror("Error", "Video file does not exist!")
             return
         
-        # Update parameters in main module
-        main.TARGET_DURATION = self.target_duration.get()
-        main.PRE_ROLL = self.pre_roll.get()
-        main.POST_ROLL = self.post_roll.get()
-        main.FINAL_CLIP_EXTRA = self.final_clip_extra.get()
-        main.MIN_FREQ = self.min_freq.get()
-        main.HOP_LENGTH = self.hop_length.get()
-        main.ENCODING_PRESET = self.encoding_preset.get()
-        main.ENCODING_QUALITY = self.encoding_quality.get()
-        main.AUDIO_BITRATE = self.audio_bitrate.get()
-        main.THREADS = self.threads.get()
-        main.MERGE_CLIPS = self.merge_clips.get()
-        main.AUDIO_NORMALIZE = self.audio_normalize.get()
+        output_folder = self.output_folder.get() if self.output_folder.get() else None
+        video = self.input_video.get()
+        config = self.job_config()
+        what = "Cut list" if config.plan_only else "Clips"
+        self.start_worker(lambda: main.process_single_video(video, output_folder, config=config), what)
+    
+    def render_cut_list(self):
+        """Render a (possibly hand-edited) cut list without analyzing the video again."""
+        if self.processing:
+            messagebox.showwarning("In Progress", "Processing already in progress!")
+            return
+        
+        path = filedialog.askopenfilename(
+            title="Select cut list to render",
+            filetypes=[("Cut lists", "*.json *.edl"), ("All files", "*.*")]
+        )
+        if not path:
+            return
         
+        output_folder = self.output_folder.get() if self.output_folder.get() else None
+        config = self.job_config()
+        self.start_worker(lambda: main.render_cut_list_file(path, output_folder, config), "Clips")
+    
+    def job_config(self):
+        """Settings of the form as a main.JobConfig (main's own settings stay untouched)."""
+        return main.job_config(
+            target_duration=self.target_duration.get(),
+            pre_roll=self.pre_roll.get(),
+            post_roll=self.post_roll.get(),
+            final_clip_extra=self.final_clip_extra.get(),
+            min_freq=self.min_freq.get(),
+            hop_length=self.hop_length.get(),
+            encoding_preset=self.encoding_preset.get(),
+            encoding_quality=self.encoding_quality.get(),
+            audio_bitrate=self.audio_bitrate.get(),
+            threads=self.threads.get(),
+            merge_clips=self.merge_clips.get(),
+            audio_normalize=self.audio_normalize.get(),
+            normalize_mode=self.normalize_mode.get(),
+            render_mode=self.render_mode.get(),
+            plan_only=self.plan_only.get(),
+        )
+    
+    def start_worker(self, job, what):
         # Start in separate thread
         self.processing = True
         self.process_btn.config(state=tk.DISABLED, text="⏳ Processing in progress...", bg="#666666")
+        self.progress.config(mode="indeterminate", value=0)
         self.progress.start(10)
+        self.progress_label.config(text="Starting...")
         self.log("\n" + "="*60)
         self.log("🚀 STARTING PROCESSING...")
         self.log("="*60)
         
-        thread = threading.Thread(target=self.run_processing, daemon=True)
+        thread = threading.Thread(target=self.run_processing, args=(job, what), daemon=True)
         thread.start()
     
-    def run_processing(self):
+    def run_processing(self, job, what):
+        """Run job() (returns the output folder) with its output sent to the log."""
         try:
             # Redirect stdout to capture prints in real-time
             from contextlib import redirect_stdout, redirect_stderr
             
-            output_folder = self.output_folder.get() if self.output_folder.get() else None
-            
-            # Create redirector
-            redirector = TextRedirector(self.log_text, self.root)
-            
-            # Redirect both stdout and stderr to the log window
-            with redirect_stdout(redirector), redirect_stderr(redirector):
-                result_folder = main.process_single_video(self.input_video.get(), output_folder)
+            # Redirect both stdout and stderr to the log window, in batches
+            progress.add_listener(self.log_pump.progress)
+            try:
+                with redirect_stdout(self.log_pump), redirect_stderr(self.log_pump):
+                    result_folder = job()
+            finally:
+                progress.remove_listener(self.log_pump.progress)
             
-            self.root.after(0, lambda: self.log(f"\n✅ Clips saved to: {result_folder}"))
-            self.root.after(0, lambda: messagebox.showinfo("Completed", f"Processing completed!\n\nClips saved to:\n{result_folder}"))
+            self.root.after(0, lambda: self.log(f"\n✅ {what} saved to: {result_folder}"))
+            self.root.after(0, lambda: messagebox.showinfo("Completed", f"Processing completed!\n\n{what} saved to:\n{result_folder}"))
             
         except Exception as e:
             error_msg = f"❌ ERROR: {str(e)}"
@@ -606,7 +752,10 @@ Features:
     def processing_complete(self):
         self.processing = False
         self.process_btn.config(state=tk.NORMAL, text="▶️  START PROCESSING", bg="#107c10")
+        self.log_pump.pump()
         self.progress.stop()
+        self.progress.config(mode="determinate", value=0)
+        self.progress_label.config(text="")
 
     def open_coffee(self):
         webbrowser.open("https://buymeacoffee.com/mariopbay")
@@ -0,0 +1,250 @@
+"""
+Job journal: checkpoints of the job writing an output folder, so an
+interrupted job can resume where it stopped.
+
+A job appends to `.asmr_job.jsonl` in its output folder: the start of the
+job (source fingerprint and a hash of its settings), the plan (the cut list,
+once the analysis is done), every finished output file (name, size and clip
+windows) and the end of the job. Each record is flushed and fsynced as it
+is written, so a crash loses at most the clips being encoded at that moment.
+
+Outputs are written under a hidden `.partial-<host>.<pid>.` name next to
+their final name and renamed into place once complete (atomic_output), so a
+file with a clip's name is always a whole clip, and two processes writing
+the same output never share a partial file. A resumed job only trusts the
+journal when the source content and the settings are unchanged, and only
+keeps a journaled output if it still has the journaled size and window and
+its container can be read. It removes the partial outputs and work folders
+of dead processes of its own host only (remove_leftovers): the folder may be
+shared with jobs or workers that are still writing theirs.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+import cutlist
+from analysis_cache import fingerprint
+from smart_render import owner_tag, probe_media
+
+JOURNAL_NAME = ".asmr_job.jsonl"
+PARTIAL_PREFIX = ".partial-"
+# Work folders of smart_render (smart cuts, merges, concatenations) and partial
+# outputs; the prefix is followed by the <host>.<pid> of the process writing them
+LEFTOVER_PREFIXES = (PARTIAL_PREFIX, "asmr_smart_", "asmr_merge_", "asmr_concat_")
+
+
+class Cancelled(Exception):
+    """An output was discarded because its job was cancelled (see atomic_output)."""
+
+
+def partial_path(path):
+    """Name this process writes an output under until it is complete (same folder and extension)."""
+    folder, name = os.path.split(path)
+    return os.path.join(folder, f"{PARTIAL_PREFIX}{owner_tag()}.{name}")
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@contextlib.contextmanager
+def atomic_output(path, cancel=None):
+    """Yield the partial path to write `path` to.
+
+    The file is renamed to `path` when the block succeeds and removed when
+    it raises. An existing file at `path` is replaced, not written into.
+    With a `cancel` event (threading.Event) that is set before the block
+    starts or ends, the output is discarded and Cancelled is raised instead.
+    """
+    tmp = partial_path(path)
+    _remove(tmp)
+    try:
+        if cancel is not None and cancel.is_set():
+            raise Cancelled(f"{os.path.basename(path)} discarded: job cancelled")
+        yield tmp
+        if cancel is not None and cancel.is_set():
+            raise Cancelled(f"{os.path.basename(path)} discarded: job cancelled")
+        os.replace(tmp, path)
+    except BaseException:
+        _remove(tmp)
+        raise
+
+
+def _process_alive(pid):
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        import ctypes
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        # SYNCHRONIZE | PROCESS_QUERY_LIMITED_INFORMATION
+        handle = kernel32.OpenProcess(0x00100000 | 0x1000, False, pid)
+        if not handle:
+            return ctypes.get_last_error() == 5  # Access denied: it exists
+        try:
+            return kernel32.WaitForSingleObject(handle, 0) == 0x102  # WAIT_TIMEOUT: still running
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _dead_local_owner(name):
+    """Whether leftover `name` was written by a process of this host that is no longer running."""
+    host = owner_tag().rsplit(".", 1)[0]
+    for prefix in LEFTOVER_PREFIXES:
+        if name.startswith(f"{prefix}{host}."):
+            match = re.match(r"(\d+)[._]", name[len(prefix) + len(host) + 1:])
+            return match is not None and not _process_alive(int(match.group(1)))
+    return False
+
+
+def remove_leftovers(folder):
+    """Delete partial outputs and work folders that killed processes of this
+    host left in `folder`. Returns how many.
+
+    Entries of other hosts and of processes still running are kept: the
+    folder may be shared with jobs or workers still writing them.
+    """
+    removed = 0
+    try:
+        names = os.listdir(folder)
+    except FileNotFoundError:
+        return 0
+    for name in names:
+        if not _dead_local_owner(name):
+            continue
+        path = os.path.join(folder, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            _remove(path)
+        removed += 1
+    return removed
+
+
+def settings_key(settings):
+    """Short hash of a settings dict (JSON-serializable values)."""
+    data = json.dumps(settings, sort_keys=True, default=str)
+    return hashlib.sha1(data.encode()).hexdigest()[:16]
+
+
+def _windows(windows):
+    return [[round(float(t0), 6), round(float(t1), 6)] for t0, t1 in windows]
+
+
+class JobJournal:
+    """Journal of the job rendering `source` with `settings` into `folder`.
+
+    Records of an earlier job are loaded when its source content and
+    settings match; otherwise the journal starts empty. The file is only
+    written (and a non-matching one replaced) by the first record().
+    """
+
+    def __init__(self, folder, source, settings):
+        self.folder = folder
+        self.path = os.path.join(folder, JOURNAL_NAME)
+        self.source = os.path.abspath(source)
+        self.fingerprint = fingerprint(source)
+        self.settings = settings_key(settings)
+        self._lock = threading.Lock()
+        self._torn = False
+        self.records = self._load()
+
+    def _load(self):
+        records = []
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue  # Torn last line after a crash
+                    finally:
+                        self._torn = not line.endswith("\n")
+        except FileNotFoundError:
+            return []
+        start = records[0] if records else {}
+        if (start.get("event"), start.get("fingerprint"), start.get("settings")) != \
+                ("start", self.fingerprint, self.settings):
+            return []
+        return records
+
+    def reset(self):
+        """Forget earlier records: the job starts over (the file is rewritten on the next record)."""
+        with self._lock:
+            self.records = []
+
+    def record(self, event, **fields):
+        """Append one record and sync it to disk."""
+        with self._lock:
+            mode = "a"
+            lines = []
+            if not self.records:
+                # First record of a new job: replace any earlier journal
+                mode = "w"
+                start = {"event": "start", "source": self.source, "fingerprint": self.fingerprint,
+                         "settings": self.settings, "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+                self.records.append(start)
+                lines.append(start)
+            entry = dict(event=event, time=time.strftime("%Y-%m-%dT%H:%M:%S"), **fields)
+            self.records.append(entry)
+            lines.append(entry)
+            os.makedirs(self.folder, exist_ok=True)
+            with open(self.path, mode) as f:
+                # Never append to a torn last line
+                f.write(("\n" if mode == "a" and self._torn else "")
+                        + "".join(json.dumps(line) + "\n" for line in lines))
+                f.flush()
+                os.fsync(f.fileno())
+            self._torn = False
+
+    @property
+    def finished(self):
+        """Whether the job ran to its end."""
+        return any(r["event"] == "done" for r in self.records)
+
+    def cut_list(self):
+        """The journaled plan as a cutlist.CutList (None before the plan was recorded)."""
+        plans = [r for r in self.records if r["event"] == "plan"]
+        if not plans:
+            return None
+        return cutlist.from_dict(plans[-1]["cut_list"])
+
+    def record_plan(self, cut_list):
+        self.record("plan", cut_list=cut_list.to_dict())
+
+    def record_output(self, path, windows):
+        """Record a finished output file made of the given (t_start, t_end) windows."""
+        self.record("output", file=os.path.basename(path), bytes=os.path.getsize(path),
+                    windows=_windows(windows))
+
+    def has_output(self, path, windows):
+        """Whether `path` was finished by this job from these windows and is still intact."""
+        name = os.path.basename(path)
+        with self._lock:
+            entries = [r for r in self.records if r["event"] == "output" and r["file"] == name]
+        if not entries or entries[-1]["windows"] != _windows(windows):
+            return False
+        try:
+            if os.path.getsize(path) != entries[-1]["bytes"]:
+                return False
+        except OSError:
+            return False
+        # A truncated or corrupted container has no readable duration
+        return probe_media(path)["duration"] is not None
+
+    def finish(self):
+        self.record("done")
@@ -0,0 +1,168 @@
+"""
+Per-clip normalization gains, computed for all clips of a job at once.
+
+"peak" mode raises every clip so its loudest sample reaches 0 dBFS (what
+moviepy's audio_normalize did). "lufs" mode brings the integrated loudness
+of every clip to a target (ITU-R BS.1770 / EBU R128: K-weighting, 400 ms
+blocks every 100 ms, absolute gate at -70 LUFS and relative gate 10 LU
+below the ungated level), limited so the sample peak stays below a ceiling.
+
+The clip windows are gathered into one padded (clips, samples, channels)
+array, from the PCM store when there is one, and measured with a
+handful of vectorized numpy/scipy operations. The gains are then applied
+while encoding (an ffmpeg volume filter, or a scale of the clip audio in
+moviepy renders), so no clip's audio is rendered twice.
+"""
+import math
+
+import numpy as np
+
+from audio_ingest import SAMPLE_RATE
+from smart_render import _ts, probe_media, run_ffmpeg
+
+MODES = ("peak", "lufs")
+BLOCK_SECONDS = 0.4       # BS.1770 gating block
+BLOCK_STEP_SECONDS = 0.1  # 75 % overlap between blocks
+ABSOLUTE_GATE = -70.0     # LUFS
+RELATIVE_GATE = -10.0     # LU below the level of the blocks above the absolute gate
+
+
+def k_weighting(sr):
+    """(b, a) coefficients of the two BS.1770 K-weighting biquads at `sr` Hz.
+
+    Same pre-filter (high shelf) and RLB high-pass as the 48 kHz reference
+    coefficients of the standard, re-derived for the sample rate.
+    """
+    # High shelf: +4 dB above ~1.7 kHz (head acoustics)
+    f0, gain_db, q = 1681.974450955533, 3.999843853973347, 0.7071752369554196
+    k = math.tan(math.pi * f0 / sr)
+    vh = 10.0 ** (gain_db / 20.0)
+    vb = vh ** 0.4996667741545416
+    a0 = 1.0 + k / q + k * k
+    shelf = (
+        np.array([(vh + vb * k / q + k * k) / a0, 2.0 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0]),
+        np.array([1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0]),
+    )
+    # RLB high-pass at ~38 Hz
+    f0, q = 38.13547087602444, 0.5003270373238773
+    k = math.tan(math.pi * f0 / sr)
+    a0 = 1.0 + k / q + k * k
+    highpass = (
+        np.array([1.0, -2.0, 1.0]),
+        np.array([1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0]),
+    )
+    return [shelf, highpass]
+
+
+def gather(windows_audio):
+    """Padded (clips, samples, channels) float32 array and the length of every clip.
+
+    Shorter clips are padded by repeating them: the K-weighting filters are
+    causal, so the padding never changes a clip's own samples (nor its
+    peak), while filters decaying into zero padding slow down on subnormal
+    floats.
+    """
+    lengths = np.array([len(a) for a in windows_audio], dtype=np.int64)
+    channels = max((a.shape[1] for a in windows_audio), default=1)
+    batch = np.zeros((len(windows_audio), int(lengths.max(initial=0)), channels), dtype=np.float32)
+    for i, audio in enumerate(windows_audio):
+        if len(audio):
+            batch[i, :, :audio.shape[1]] = audio[np.arange(batch.shape[1]) % len(audio)]
+    return batch, lengths
+
+
+def peak_levels(batch):
+    """Sample peak of every clip in dBFS (-inf for silence)."""
+    if not batch.size:
+        return np.full(len(batch), -np.inf)
+    peaks = np.abs(batch).max(axis=(1, 2)).astype(np.float64)
+    with np.errstate(divide="ignore"):
+        return 20.0 * np.log10(peaks)
+
+
+def loudness_levels(batch, lengths, sr):
+    """Gated integrated loudness of every clip in LUFS (-inf when every block is gated out).
+
+    Clips shorter than one gating block are measured as a single block.
+    """
+    import scipy.signal
+
+    n_clips = len(batch)
+    if not batch.size:
+        return np.full(n_clips, -np.inf)
+    weighted = batch.astype(np.float64)
+    for b, a in k_weighting(sr):
+        # Zero state at every clip start, as a meter reading the rendered clip
+        weighted = scipy.signal.lfilter(b, a, weighted, axis=1)
+    # Channel-summed energy (L/R weight 1), cumulated for block sums
+    energy = np.zeros((n_clips, batch.shape[1] + 1))
+    np.cumsum((weighted ** 2).sum(axis=2), axis=1, out=energy[:, 1:])
+
+    block = int(round(BLOCK_SECONDS * sr))
+    step = int(round(BLOCK_STEP_SECONDS * sr))
+    starts = np.arange(0, max(1, batch.shape[1] - block + 1), step)
+    ends = np.minimum(starts + block, batch.shape[1])
+    power = (energy[:, ends] - energy[:, starts]) / (ends - starts)
+    # Blocks past the end of a clip do not count, but every clip keeps at least its first block
+    valid = ends[np.newaxis, :] <= np.maximum(lengths, min(block, batch.shape[1]))[:, np.newaxis]
+    short = lengths < block
+    power[short, 0] = energy[short, lengths[short]] / np.maximum(1, lengths[short])
+
+    with np.errstate(divide="ignore"):
+        block_lufs = -0.691 + 10.0 * np.log10(power)
+    gated = valid & (block_lufs > ABSOLUTE_GATE)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ungated = -0.691 + 10.0 * np.log10((power * gated).sum(axis=1) / gated.sum(axis=1))
+        gated &= block_lufs > (ungated + RELATIVE_GATE)[:, np.newaxis]
+        level = -0.691 + 10.0 * np.log10((power * gated).sum(axis=1) / gated.sum(axis=1))
+    return np.where(gated.any(axis=1), level, -np.inf)
+
+
+def clip_gains(windows_audio, sr, mode="peak", target_lufs=-16.0, max_peak_db=-1.0):
+    """Gain in dB for every clip (None for silent clips).
+
+    Args:
+        windows_audio: (frames, channels) sample arrays, one per clip
+        sr: Sample rate of the arrays
+        mode: "peak" (loudest sample to 0 dBFS) or "lufs"
+        target_lufs: Integrated loudness target of "lufs" mode
+        max_peak_db: Sample peak ceiling in dBFS of "lufs" mode
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown normalization mode '{mode}' (expected one of {', '.join(MODES)})")
+    if not windows_audio:
+        return []
+    batch, lengths = gather(windows_audio)
+    peaks = peak_levels(batch)
+    if mode == "peak":
+        gains = -peaks
+    else:
+        gains = np.minimum(target_lufs - loudness_levels(batch, lengths, sr), max_peak_db - peaks)
+    return [round(float(g), 3) if math.isfinite(g) else None for g in gains]
+
+
+def decode_window(video_path, t_start, t_end, sr=SAMPLE_RATE, channels=2):
+    """(frames, channels) float32 samples of one window, decoded by ffmpeg (without a PCM store)."""
+    raw = run_ffmpeg(
+        ["-ss", _ts(t_start), "-t", _ts(t_end - t_start), "-i", video_path,
+         "-map", "0:a:0", "-vn", "-ac", channels, "-ar", sr, "-f", "f32le", "-acodec", "pcm_f32le", "-"],
+        capture_stdout=True,
+    )
+    return np.frombuffer(raw, dtype=np.float32).reshape(-1, channels)
+
+
+def window_gains(video_path, windows, pcm=None, **settings):
+    """clip_gains of (t_start, t_end) windows of a source.
+
+    The samples are slices of `pcm` (a PCMStore) when given, otherwise every
+    window is decoded on its own. Windows are measured in stereo, the
+    layout every render path writes (a mono source is upmixed 3 dB lower
+    per channel, see smart_render.audio_encoder_args). `settings` are
+    passed to clip_gains.
+    """
+    if pcm is not None:
+        return clip_gains([pcm.stereo(t0, t1) for t0, t1 in windows], pcm.sr, **settings)
+    if not probe_media(video_path)["has_audio"]:
+        return [None] * len(windows)
+    audio = [decode_window(video_path, t0, t1, channels=2) for t0, t1 in windows]
+    return clip_gains(audio, SAMPLE_RATE, **settings)
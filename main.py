@@ -1,10 +1,34 @@
+import contextlib
+import functools
+import json
 import os
+import shutil
+import sqlite3
 import tempfile
+import threading
+import time
+from collections import namedtuple
+
 import numpy as np
-import librosa
-from moviepy.editor import VideoFileClip, concatenate_videoclips
-from moviepy.audio.fx.all import audio_normalize
-from scipy.signal import find_peaks
+
+import analysis_cache
+import audio_ingest
+import batch
+import candidate_index
+import coarse_to_fine
+import cutlist
+import encoders
+import features
+import job_journal
+import loudness
+import pcm_store
+import progress
+import render_cache
+import render_pool
+import selection
+import smart_render
+import streaming_analysis
+import tracing
 
 # --- DIRECTOR PARAMETERS (Tweak these to change the "feel") ---
 INPUT_FOLDER = "video_input"  # Folder containing source videos to process
@@ -17,20 +41,92 @@ POST_ROLL = 1.3   # Seconds to show AFTER the click
 FINAL_CLIP_EXTRA = 2.0  # Extra seconds for last clip (closing shot)
 MERGE_CLIPS = False # If True, merge all clips into one video. If False, save separate clips.
 AUDIO_NORMALIZE = False # If True, normalize audio for each clip
+NORMALIZE_MODE = "peak"  # "peak": loudest sample to 0 dBFS; "lufs": integrated loudness to NORMALIZE_LUFS
+NORMALIZE_LUFS = -16.0     # Loudness target of "lufs" mode (EBU R128 / BS.1770 LUFS)
+NORMALIZE_MAX_PEAK = -1.0  # "lufs" mode: gains are limited so the sample peak stays below this (dBFS)
+PLAN_ONLY = False # If True, only write the cut list (cut_list.json / .edl), no encoding
+RESUME = False    # If True, continue interrupted jobs from their journal (finished videos and clips are kept)
 # Total clip duration = 2.5s. With 58s target, we'll have ~23 clips.
 
 MIN_FREQ = 1800   # Hz. Filter out low frequencies. We only want the "snap".
 HOP_LENGTH = 512  # Constant hop for syncing time/frames in features
+STREAMING_MIN_DURATION = 3600.0  # Seconds. Longer sources are analyzed in bounded-memory blocks
+PEAK_THRESHOLD = 1.2  # Adaptive threshold: events must score above this x mean score
+COARSE_TO_FINE = True  # HOP_LENGTH 256 or less: scan at a coarse hop, compute fine frames near peaks only
+
+# Analysis cache (scores are reused when only clip/selection parameters change)
+ANALYSIS_CACHE = True
+ANALYSIS_CACHE_DIR = None     # None = ~/.cache/asmr-pro-cutter/analysis
+ANALYSIS_CACHE_MAX_MB = 2048  # Least recently used entries are evicted above this size
+
+# Candidate index (every analyzed video's candidate moments, for library-wide compilations)
+CANDIDATE_INDEX = True
+CANDIDATE_INDEX_PATH = None     # None = ~/.cache/asmr-pro-cutter/candidates.sqlite
+COMPILATION_MAX_PER_VIDEO = 3   # Clips one video may contribute to a compilation (None = no limit)
+
+# Render cache (unchanged clips are reused instead of encoded again)
+RENDER_CACHE = True
+RENDER_CACHE_DIR = None       # None = ~/.cache/asmr-pro-cutter/renders
+RENDER_CACHE_MAX_MB = 10240   # Least recently used renders are evicted above this size
+
+# PCM store (each source's audio decoded once to a memory-mapped float32 file,
+# shared by analysis, clip peak measurement and clip audio)
+PCM_STORE = True
+PCM_STORE_DIR = None          # None = ~/.cache/asmr-pro-cutter/pcm
+PCM_STORE_MAX_MB = 8192       # Least recently used stores are evicted; larger sources are not stored
+
+# Batch processing (process_all_videos)
+ANALYSIS_WORKERS = None  # Processes analyzing upcoming videos (None = CPU cores - 1, 0 = inline)
+ENCODE_SLOTS = 1         # Videos encoded at the same time while others are analyzed
+
+# Watch-folder daemon (asmr-cutter-watch)
+WATCH_STABLE_SECONDS = 5.0  # A new file is processed once it stopped growing for this long
+WATCH_POLL_INTERVAL = 2.0   # Seconds between folder scans (without inotify)
+WATCH_MAX_ATTEMPTS = 3      # Attempts at a failing video before it is left alone
+WATCH_RETRY_DELAY = 60.0    # Seconds before a failed video is tried again (doubled after each failure)
+
+# Distributed mode (asmr-cutter-queue: a coordinator and workers sharing a task queue)
+QUEUE_PATH = None           # None = .asmr_queue.sqlite in the input folder (must be on the filesystem the workers share)
+QUEUE_LEASE_SECONDS = 60.0  # A task goes back to the queue when its worker sent no heartbeat for this long
+QUEUE_MAX_ATTEMPTS = 3      # Attempts of a task before it is marked failed
+QUEUE_RETRY_DELAY = 10.0    # Seconds before the first retry of a failed task (doubled for every further one)
+QUEUE_POLL_INTERVAL = 1.0   # Seconds between queue checks of idle workers and the coordinator
+
+# Tracing: per-stage timing records (JSON lines) for finding where time goes
+TRACE_FILE = None     # Path of the .jsonl trace (None = tracing off)
+TRACE_CHROME = False  # Also export <TRACE_FILE>.trace.json for chrome://tracing / Perfetto
 
 # Encoding parameters
-ENCODING_PRESET = "nvidia"  # Options: "nvidia", "intel", "amd"
+ENCODING_PRESET = "nvidia"  # Options: "nvidia", "intel", "amd", "x264", "x264-fast", "x265"
+# Encoder presets whose encoder does not open on this machine fall back to
+# software x264/x265 (see encoders.py). With ENCODER_CALIBRATE, a few seconds
+# of each source are encoded with every usable preset and the fastest one
+# meeting the quality target is used instead of ENCODING_PRESET.
+ENCODER_CALIBRATE = False
 VIDEO_CODEC = "h264_nvenc"
 ENCODING_QUALITY = "18"  # CQ value for constant quality
 AUDIO_BITRATE = "320k"
 THREADS = 4
 ENCODING_SPEED = "slow"  # Preset speed: slow, medium, fast
+# Render mode for separate clips:
+#   "reencode" - decode/encode every frame through moviepy (original behavior)
+#   "smart"    - stream-copy whole GOPs, re-encode only the partial GOPs at the edges
+#   "copy"     - stream copy only, cuts snapped to the nearest keyframe (fast previews)
+RENDER_MODE = "reencode"
+# Dense clip sets in "reencode" mode (software encoders) are cut in sweeps:
+# one ffmpeg run decodes the source once across several close windows and
+# writes all of their clips, instead of seeking and decoding per clip.
+SWEEP_MAX_GAP = 10.0  # Seconds between windows of one sweep (0 = always one clip per run)
+SWEEP_MIN_CLIPS = 3   # Fewer close windows are rendered clip by clip
+SWEEP_MAX_CLIPS = 6   # Clips per sweep (each open encoder holds its own frame buffers)
+# Concurrent encoder sessions for separate clips, per encoder type:
+#   "hardware" - NVENC/QSV/AMF (consumer GPUs cap concurrent sessions)
+#   "software" - libx264/libx265 (each session uses THREADS threads)
+#   "copy"     - stream copy only
+# Specific encoder names (e.g. "h264_qsv") can be added as keys.
+ENCODER_SESSIONS = {"hardware": 2, "software": 2, "copy": 4}
 
-# GPU Presets
+# Encoder presets (GPU, and software presets used as fallbacks)
 GPU_PRESETS = {
     "nvidia": {
         "codec": "h264_nvenc",
@@ -52,224 +148,966 @@ GPU_PRESETS = {
         "quality_value": "18",
         "preset": "quality",
         "extra_params": ["-profile:v", "high", "-quality", "quality"]
+    },
+    "x264": {
+        "codec": "libx264",
+        "quality_param": "-crf",
+        "quality_value": "18",
+        "preset": "medium",
+        "extra_params": ["-profile:v", "high"]
+    },
+    "x264-fast": {
+        "codec": "libx264",
+        "quality_param": "-crf",
+        "quality_value": "18",
+        "preset": "veryfast",
+        "extra_params": ["-profile:v", "high"]
+    },
+    "x265": {
+        "codec": "libx265",
+        "quality_param": "-crf",
+        "quality_value": "18",
+        "preset": "fast",
+        "extra_params": ["-tag:v", "hvc1"]
     }
 }
 
-def calculate_crispness_index(y, sr, hop_length: int = HOP_LENGTH):
+# Settings that belong to one job. The module values above are the defaults;
+# jobs run with a JobConfig snapshot, so jobs with different settings can run
+# side by side. The remaining settings (INPUT_FOLDER, ANALYSIS_WORKERS,
+# ENCODE_SLOTS, ENCODER_SESSIONS, TRACE_FILE, ...) are shared by the process.
+JOB_SETTINGS = (
+    "TARGET_DURATION", "PRE_ROLL", "POST_ROLL", "FINAL_CLIP_EXTRA",
+    "MERGE_CLIPS", "AUDIO_NORMALIZE", "PLAN_ONLY", "RESUME", "OUTPUT_SUFFIX",
+    "NORMALIZE_MODE", "NORMALIZE_LUFS", "NORMALIZE_MAX_PEAK",
+    "MIN_FREQ", "HOP_LENGTH", "STREAMING_MIN_DURATION", "PEAK_THRESHOLD",
+    "COARSE_TO_FINE",
+    "ANALYSIS_CACHE", "ANALYSIS_CACHE_DIR", "ANALYSIS_CACHE_MAX_MB",
+    "CANDIDATE_INDEX", "CANDIDATE_INDEX_PATH", "COMPILATION_MAX_PER_VIDEO",
+    "RENDER_CACHE", "RENDER_CACHE_DIR", "RENDER_CACHE_MAX_MB",
+    "PCM_STORE", "PCM_STORE_DIR", "PCM_STORE_MAX_MB",
+    "ENCODING_PRESET", "ENCODER_CALIBRATE", "ENCODING_QUALITY", "AUDIO_BITRATE", "THREADS", "RENDER_MODE",
+    "SWEEP_MAX_GAP", "SWEEP_MIN_CLIPS", "SWEEP_MAX_CLIPS",
+)
+
+# Immutable settings of one job: JOB_SETTINGS as lower-case fields
+JobConfig = namedtuple("JobConfig", [name.lower() for name in JOB_SETTINGS])
+
+def job_config(**overrides):
+    """JobConfig from the current module settings, with `overrides` applied.
+    
+    >>> config = job_config(target_duration=30.0, render_mode="smart")
+    >>> generate_asmr_short("in.mp4", "out/", config)
+    
+    Use config._replace(...) to derive variants of an existing config.
+    """
+    return JobConfig(**{name.lower(): globals()[name] for name in JOB_SETTINGS})._replace(**overrides)
+
+def job_preset(config, video_path=None):
+    """GPU_PRESETS entry of the job, with its ENCODING_QUALITY.
+    
+    Falls back to a software preset when the encoder of ENCODING_PRESET does
+    not open here. With ENCODER_CALIBRATE (and a video_path), the preset is
+    picked by encoding a sample of the source with every usable preset.
+    """
+    presets = {name: dict(preset, quality_value=str(config.encoding_quality))
+               for name, preset in GPU_PRESETS.items()}
+    requested = config.encoding_preset if config.encoding_preset in presets else "nvidia"
+    if config.encoder_calibrate and video_path and config.render_mode != "copy":
+        with tracing.span("calibrate_encoder"):
+            name, results = encoders.calibrate(video_path, presets, threads=config.threads)
+        r = results[name]
+        print(f"Calibrated encoder: '{name}' ({presets[name]['codec']}, {r['fps']:.0f} fps, SSIM {r['ssim']:.3f})")
+    else:
+        name = encoders.resolve(requested, presets)
+        if name != requested:
+            print(f"⚠️ Encoder {presets[requested]['codec']} is not available here, "
+                  f"using preset '{name}' ({presets[name]['codec']})")
+    return presets[name]
+
+def open_pcm_store(video_path, config=None, sr=44100):
+    """pcm_store.PCMStore of the source (decoded on first use), or None when
+    the store is disabled, the source has no audio or its audio would not fit.
+    """
+    config = config or job_config()
+    if not config.pcm_store:
+        return None
+    store = pcm_store.PCMStore(video_path, sr=sr, root=config.pcm_store_dir,
+                               max_bytes=config.pcm_store_max_mb * 1024 ** 2)
+    return store if store.fits() else None
+
+def preload():
+    """Import the analysis and encoding libraries (librosa, scipy, moviepy) now.
+    
+    They load on first use otherwise; the GUI calls this from a background
+    thread so the window opens without waiting for them.
+    """
+    import librosa
+    import librosa.onset
+    import scipy.signal
+    import moviepy.editor
+
+def calculate_crispness_index(y, sr, hop_length: int = HOP_LENGTH, min_freq: float = MIN_FREQ):
     """
     Calculate the 'Crispness' index.
     In a clean video, this distinguishes a sharp cut from background noise.
     """
-    # 1. Spectral Centroid (Brightness)
-    spectral_centroid = librosa.feature.spectral_centroid(y=y, sr=sr, hop_length=hop_length)[0]
-    centroid_norm = librosa.util.normalize(spectral_centroid)
+    # Onset (impact), Spectral Centroid (quality) and Zero Crossing Rate from
+    # one spectrogram above min_freq, each normalized to its peak and
+    # weighted by features.WEIGHTS
+    raw = features.crispness_features(y, sr, hop_length, min_freq)
+    return features.combine_scores(raw, features.feature_peaks(raw))
+
+def analyze_audio(video_path, duration, sr=44100, config=None):
+    """Candidate events of a source: (frames, scores) of every local maximum
+    above the adaptive threshold. Served from the analysis cache when the
+    source and analysis parameters are unchanged.
+    """
+    config = config or job_config()
+    # Two-stage analysis (in memory only): scan at a coarse hop, fine frames around events
+    refine = bool(config.coarse_to_fine and coarse_to_fine.stride_for(config.hop_length)
+                  and duration < config.streaming_min_duration)
+    params = {
+        "sr": sr,
+        "hop_length": config.hop_length,
+        "min_freq": config.min_freq,
+        "weights": list(features.WEIGHTS),
+        "peak_threshold": config.peak_threshold,
+        "coarse_to_fine": refine,
+    }
+    cache = None
+    if config.analysis_cache:
+        with tracing.span("cache_lookup") as span:
+            cache = analysis_cache.AnalysisCache(config.analysis_cache_dir, config.analysis_cache_max_mb * 1024 ** 2)
+            cached = cache.get(video_path, params)
+            span.set(hit=cached is not None)
+        if cached is not None:
+            print("Using cached audio analysis...")
+            progress.report("analysis", 1, 1)
+            return cached.candidate_frames, cached.candidate_heights
     
-    # 2. Onset Strength (Suddenness)
-    onset_env = librosa.onset.onset_strength(y=y, sr=sr, hop_length=hop_length)
-    onset_norm = librosa.util.normalize(onset_env)
+    with tempfile.TemporaryDirectory(prefix="asmr_analysis_") as workdir:
+        if duration >= config.streaming_min_duration:
+            # Bounded-memory blocks for long sources
+            print("Analyzing audio in streaming blocks...")
+            with tracing.span("streaming_analysis") as span:
+                quality_scores, mean_score = streaming_analysis.analyze_video(
+                    video_path, os.path.join(workdir, "scores.npy"),
+                    sr=sr, hop_length=config.hop_length, min_freq=config.min_freq,
+                    progress=lambda seconds: progress.report("analysis", min(seconds, duration), duration),
+                    pcm=open_pcm_store(video_path, config, sr)
+                )
+                span.set(frames=len(quality_scores))
+        else:
+            print("Extracting audio from video...")
+            progress.report("analysis", 0.0, 1.0)
+            with tracing.span("decode") as span:
+                store = open_pcm_store(video_path, config, sr)
+                if store is not None:
+                    # Decoded once into the PCM store, which the render reads too
+                    y = store.mono()
+                else:
+                    # Decode mono float32 PCM straight from ffmpeg (no temporary WAV)
+                    y, sr = audio_ingest.load_audio(video_path, sr=sr, duration=duration)
+                span.set(bytes_read=y.nbytes, samples=len(y), pcm_store=store is not None)
+            
+            print("Calculating crispness index...")
+            # Rough split of the in-memory analysis time: decode, then features
+            progress.report("analysis", 0.3, 1.0)
+            with tracing.span("crispness") as span:
+                if refine:
+                    quality_scores, mean_score, frames, heights = coarse_to_fine.analyze(
+                        y, sr, config.hop_length, config.min_freq, config.peak_threshold)
+                else:
+                    quality_scores = calculate_crispness_index(y, sr, hop_length=config.hop_length,
+                                                               min_freq=config.min_freq)
+                    mean_score = float(np.mean(quality_scores))
+                span.set(frames=len(quality_scores), coarse_to_fine=refine)
+        
+        # Local maxima above the adaptive threshold
+        if not refine:
+            with tracing.span("peaks") as span:
+                frames, heights = streaming_analysis.local_peaks(quality_scores, mean_score * config.peak_threshold)
+                span.set(candidates=len(frames))
+        progress.report("analysis", 1.0, 1.0)
+        
+        if cache is not None:
+            with tracing.span("cache_store"):
+                cache.put(video_path, params, quality_scores, mean_score, frames, heights)
+        del quality_scores
     
-    # 3. Zero Crossing Rate (Typical of sharp metallic/plastic sounds)
-    zcr = librosa.feature.zero_crossing_rate(y, hop_length=hop_length)[0]
-    zcr_norm = librosa.util.normalize(zcr)
+    return frames, heights
 
-    # SCORING FORMULA
-    # Give high weight to Onset (impact) and Centroid (quality)
-    combined_score = (onset_norm * 0.5) + (centroid_norm * 0.3) + (zcr_norm * 0.2)
+def _drop_edge_frames(frames, scores, sr, duration, hop_length):
+    # Candidates whose features see librosa's zero padding at either end of the audio
+    frames = np.asarray(frames)
+    scores = np.asarray(scores, dtype=np.float64)
+    left, right = features.frame_context(hop_length)
+    inside = frames >= left
+    if duration is not None:
+        inside &= frames <= duration * sr / hop_length - right
+    return frames[inside], scores[inside]
+
+def select_moments(candidate_frames, candidate_scores, sr=44100, duration=None, config=None):
+    """(time, score) of the events to cut, in chronological order: the
+    non-overlapping clip windows with the highest total score whose rendered
+    length (edge clips clipped to the video, last clip with final_clip_extra)
+    fits in target_duration.
+    
+    Candidates within the feature context of either end of the audio are
+    dropped: their features see librosa's zero padding (the onset flux
+    jumps there), so they are artifacts rather than events.
+    """
+    config = config or job_config()
+    candidate_frames, candidate_scores = _drop_edge_frames(candidate_frames, candidate_scores,
+                                                           sr, duration, config.hop_length)
+    order = np.argsort(candidate_frames, kind="stable")
+    candidate_times = candidate_frames[order] * config.hop_length / sr
+    candidate_scores = candidate_scores[order]
+    
+    print(f"Found {len(candidate_times)} potential ASMR triggers.")
     
-    # Square it to clearly separate top sounds from average ones
-    return combined_score ** 2
+    # Strategic Selection: best total score within the duration budget
+    picked = selection.select_windows(
+        candidate_times, candidate_scores, config.target_duration,
+        config.pre_roll, config.post_roll, config.final_clip_extra, duration
+    )
+    
+    return [(float(candidate_times[i]), float(candidate_scores[i])) for i in picked]
 
-def generate_asmr_short(video_path, output_folder):
-    print(f"\n{'='*60}")
-    print(f"--- AUTO DIRECTOR START: {os.path.basename(video_path)} ---")
-    print(f"{'='*60}")
+def plan_clips(moments, duration, config=None):
+    """Cut window (cutlist.Clip) around every selected (time, score) event."""
+    config = config or job_config()
+    clips = []
+    for idx, (t_event, score) in enumerate(moments, start=1):
+        # Check if this is the last clip
+        is_last_clip = (idx == len(moments))
+        
+        # Asymmetric cutting logic (Pre-Roll vs Post-Roll)
+        t_start = max(0, t_event - config.pre_roll)
+        
+        # Last clip gets extra time for closing shot
+        if is_last_clip:
+            t_end = min(duration, t_event + config.post_roll + config.final_clip_extra)
+        else:
+            t_end = min(duration, t_event + config.post_roll)
+        clips.append(cutlist.Clip(t_event, t_start, t_end, score))
+    return clips
+
+def clip_jobs(clips, output_folder):
+    """ClipJob (cut window and output file) for every clip, numbered in time order."""
+    jobs = []
+    for idx, c in enumerate(sorted(clips, key=lambda c: c.t_start), start=1):
+        # Save with timestamp in name for guaranteed sorting
+        time_marker = f"{int(c.t_event):04d}s"
+        output_filename = os.path.join(output_folder, f"clip_{idx:03d}_at_{time_marker}.mp4")
+        jobs.append(render_pool.ClipJob(idx, c.t_event, c.t_start, c.t_end, output_filename))
+    return jobs
+
+def _prepare_subclip(source, t_start, t_end, gain_db=None, pcm=None):
+    """moviepy subclip of the window with micro-fades (and its normalization gain, if any)."""
+    # Cut - preserve original dimensions
+    sub = source.subclip(t_start, t_end)
     
-    # 1. Audio Analysis
-    print("Extracting audio from video...")
-    clip = VideoFileClip(video_path)
-    # Extract audio robustly via temporary WAV (compatible with all codecs)
-    sr = 44100
-    fd, tmp_wav = tempfile.mkstemp(suffix=".wav")
-    os.close(fd)
-    try:
-        clip.audio.write_audiofile(
-            tmp_wav,
-            fps=sr,
-            nbytes=2,
-            codec="pcm_s16le",
-            ffmpeg_params=["-ac", "1"],
-            logger=None,
+    if pcm is not None:
+        # Same fades and gain, computed on a slice of the PCM store
+        from moviepy.audio.AudioClip import AudioArrayClip
+        audio = pcm.clip_audio(t_start, t_end, smart_render.AUDIO_FADE, gain_db)
+        return sub.set_audio(AudioArrayClip(audio, fps=pcm.sr))
+    
+    # Micro-fade audio (essential to avoid 'pop')
+    sub = sub.audio_fadein(0.05).audio_fadeout(0.05)
+    
+    # Normalization gain, applied while the audio is written
+    if gain_db:
+        sub = sub.volumex(10.0 ** (gain_db / 20.0))
+    return sub
+
+def _moviepy_ffmpeg_params(preset, audio_bitrate):
+    return [
+        "-pix_fmt", "yuv420p",
+        preset["quality_param"], preset["quality_value"],
+        "-b:a", audio_bitrate,
+    ] + preset["extra_params"]
+
+def _render_params(config, preset, fps, **extra):
+    """Everything besides source and window that changes a rendered file (render cache key)."""
+    return dict(
+        render_mode=config.render_mode,
+        preset=preset,
+        audio_bitrate=config.audio_bitrate,
+        normalize=config.audio_normalize and (config.normalize_mode, config.normalize_lufs, config.normalize_max_peak),
+        fade=smart_render.AUDIO_FADE,
+        fps=fps,
+        **extra
+    )
+
+# Job settings that change the output files. A resumed job only trusts its
+# journal while these are unchanged; threads, caches, sweeps, streaming and
+# coarse-to-fine analysis change how the same outputs are made, not what they are.
+OUTPUT_SETTINGS = (
+    "target_duration", "pre_roll", "post_roll", "final_clip_extra", "merge_clips",
+    "audio_normalize", "normalize_mode", "normalize_lufs", "normalize_max_peak",
+    "min_freq", "hop_length", "peak_threshold",
+    "encoding_preset", "encoder_calibrate", "encoding_quality", "audio_bitrate", "render_mode",
+)
+
+def _journal_settings(config):
+    return {name: getattr(config, name) for name in OUTPUT_SETTINGS}
+
+def open_job_journal(video_path, output_folder, config=None):
+    """job_journal.JobJournal of the job rendering video_path into output_folder.
+    
+    Unless config.resume, the job starts over (its journal is replaced on the first record).
+    """
+    config = config or job_config()
+    journal = job_journal.JobJournal(output_folder, video_path, _journal_settings(config))
+    if not config.resume:
+        journal.reset()
+    return journal
+
+def clip_gains(video_path, jobs, config=None, pcm=None):
+    """Normalization gain in dB of every job's window ({idx: gain_db}, None = unchanged).
+    
+    All windows are measured in one vectorized pass (see loudness.py), on
+    slices of `pcm` when given, in the stereo layout every render path
+    writes. Empty when AUDIO_NORMALIZE is off.
+    """
+    config = config or job_config()
+    if not config.audio_normalize or not jobs:
+        return {}
+    with tracing.span("loudness", clips=len(jobs), mode=config.normalize_mode):
+        gains = loudness.window_gains(
+            video_path, [(job.t_start, job.t_end) for job in jobs], pcm, mode=config.normalize_mode,
+            target_lufs=config.normalize_lufs, max_peak_db=config.normalize_max_peak,
         )
-        y, sr = librosa.load(tmp_wav, sr=None, mono=True)
+    applied = [g for g in gains if g is not None]
+    if applied:
+        target = "0 dBFS peak" if config.normalize_mode == "peak" else f"{config.normalize_lufs:g} LUFS"
+        print(f"  Normalizing to {target}: gains {min(applied):+.1f} to {max(applied):+.1f} dB")
+    return {job.idx: g for job, g in zip(jobs, gains)}
+
+def render_separate_clips(video_path, jobs, preset, fps, config=None, pcm=None, journal=None, cancel=None,
+                          clip_count=None):
+    """Encode every clip window to its own file, several clips at a time.
+    
+    Concurrency is bounded per encoder type by ENCODER_SESSIONS. Clips found
+    in the render cache are copied into place instead. In "reencode" mode,
+    runs of close windows are cut in sweeps (see SWEEP_MAX_GAP). Normalization
+    gains (see clip_gains) and moviepy clip audio come from `pcm` (a
+    PCMStore) when given. Every clip is written under a partial name and
+    renamed when complete; with a `journal` (a job_journal.JobJournal),
+    finished clips are recorded and clips it already holds are kept. Once
+    `cancel` (a threading.Event) is set, clips are discarded instead of
+    renamed (job_journal.Cancelled). clip_count: clips of the whole job, when
+    `jobs` is only part of it (progress lines). Returns
+    render_pool.ClipResult entries in clip order.
+    """
+    config = config or job_config()
+    render_pool.SESSIONS.configure(ENCODER_SESSIONS)
+    readers = []
+    
+    if config.render_mode in ("smart", "copy"):
+        cutter = smart_render.SmartCutter(video_path, preset, threads=config.threads, audio_bitrate=config.audio_bitrate)
+        cutter.index  # Probe keyframes once, before the workers start
+        if config.render_mode == "smart":
+            codec = preset["codec"]
+            render = lambda job: cutter.cut(job.output_path, job.t_start, job.t_end, gains.get(job.idx))
+            frames_encoded = lambda job: cutter.frames_to_encode(job.t_start, job.t_end)
+        else:
+            codec = "copy"
+            render = lambda job: cutter.cut_copy(job.output_path, job.t_start, job.t_end)
+            frames_encoded = lambda job: 0
+    else:
+        from moviepy.editor import VideoFileClip
+        codec = preset["codec"]
+        frames_encoded = lambda job: int(round((job.t_end - job.t_start) * fps))
+        # moviepy readers are not thread-safe: one source clip per worker
+        local = threading.local()
+        
+        def render(job):
+            if not hasattr(local, "source"):
+                local.source = VideoFileClip(video_path, audio=pcm is None)
+                readers.append(local.source)
+            sub = _prepare_subclip(local.source, job.t_start, job.t_end, gains.get(job.idx), pcm)
+            sub.write_videofile(
+                job.output_path,
+                codec=preset["codec"],
+                audio_codec="aac",
+                fps=fps,  # Keep original FPS
+                preset=preset["preset"],
+                bitrate=None,  # Disable fixed bitrate for quality-based encoding
+                threads=config.threads,
+                # Next to the (partial) output, not moviepy's <name>TEMP_MPY_wvf_snd.m4a in
+                # the working directory, which jobs writing the same clip names would share
+                temp_audiofile=os.path.splitext(job.output_path)[0] + ".audio.m4a",
+                logger=None,
+                ffmpeg_params=_moviepy_ffmpeg_params(preset, config.audio_bitrate)
+            )
+    
+    # Keep the clips an interrupted run of this job already finished
+    pending, kept, reused = jobs, [], []
+    if journal is not None:
+        pending = []
+        for job in jobs:
+            (kept if journal.has_output(job.output_path, [(job.t_start, job.t_end)]) else pending).append(job)
+    
+    # Dense windows: decode the source once per sweep instead of once per clip
+    sweeping = (config.render_mode == "reencode" and render_pool.encoder_kind(codec) == "software"
+                and config.sweep_max_gap)
+    
+    def plan_batches(jobs):
+        if not sweeping:
+            return [[job] for job in jobs]
+        return render_pool.plan_sweeps(jobs, config.sweep_max_gap, config.sweep_min_clips,
+                                       config.sweep_max_clips, parallel=render_pool.SESSIONS.limit(codec))
+    
+    batch_kind = lambda batch: "clip" if len(batch) == 1 else "sweep"
+    
+    # Reuse clips rendered before from the same source, window and settings.
+    # Swept clips and clips rendered one by one come from different encoders,
+    # so the batch kind is part of the key: a clip is looked up under the kind
+    # it would be rendered as, and stored under the kind it was rendered as.
+    cache = None
+    if config.render_cache:
+        cache = render_cache.RenderCache(config.render_cache_dir, config.render_cache_max_mb * 1024 ** 2)
+        source_keys = {kind: cache.source_key(video_path, _render_params(config, preset, fps, batch=kind))
+                       for kind in ("clip", "sweep")}
+        clip_key = lambda job, kind: cache.key(source_keys[kind], [(job.t_start, job.t_end)])
+        planned = {job.idx: batch_kind(batch) for batch in plan_batches(pending) for job in batch}
+        candidates, pending = pending, []
+        for job in candidates:
+            try:
+                hit = cache.fetch(clip_key(job, planned[job.idx]), job.output_path)
+            except OSError:
+                hit = False
+            (reused if hit else pending).append(job)
+    
+    batches = plan_batches(pending)
+    if sweeping:
+        swept = [batch for batch in batches if len(batch) > 1]
+        if swept:
+            print(f"  Cutting {sum(len(b) for b in swept)} close clips in {len(swept)} single-decode sweeps.")
+            sweeper = smart_render.SmartCutter(video_path, preset, threads=config.threads,
+                                               audio_bitrate=config.audio_bitrate)
+    
+    # Gains of the clips still to encode, measured before any encoder starts
+    gains = clip_gains(video_path, pending, config, pcm)
+    
+    def render_fresh(batch):
+        # Encode to partial files, renamed into place once the whole batch is written
+        with contextlib.ExitStack() as outputs:
+            parts = [job._replace(output_path=outputs.enter_context(job_journal.atomic_output(job.output_path, cancel)))
+                     for job in batch]
+            if len(parts) == 1:
+                render(parts[0])
+            else:
+                sweeper.cut_sweep([(job.output_path, job.t_start, job.t_end, gains.get(job.idx)) for job in parts])
+        if cache is not None:
+            for job in batch:
+                cache.store(clip_key(job, batch_kind(batch)), job.output_path)
+    
+    name = os.path.basename(video_path)
+    
+    def traced_render(batch):
+        with tracing.span(batch_kind(batch), video=name, clip=batch[0].idx, clips=len(batch), mode=config.render_mode,
+                          codec=codec) as span:
+            render_fresh(batch)
+            span.set(bytes_written=sum(os.path.getsize(job.output_path) for job in batch),
+                     frames_encoded=sum(frames_encoded(job) for job in batch))
+    
+    by_idx = {job.idx: job for job in jobs}
+    windows = {job.idx: job.t_end - job.t_start for job in jobs}
+    done = []
+    encoded = []
+    started = time.perf_counter()
+    progress.report("clips", 0, len(jobs))
+    
+    def report(result):
+        if result.error is None:
+            print(f"  ✓ Clip {result.idx}/{clip_count or len(jobs)}: {result.output_path}")
+            if journal is not None:
+                job = by_idx[result.idx]
+                journal.record_output(job.output_path, [(job.t_start, job.t_end)])
+        else:
+            print(f"  ✗ Error on clip {result.idx}: {result.error}")
+        done.append(windows[result.idx])
+        encoded.append(windows[result.idx])
+        # Output frames per second of wall time, across all concurrent sessions
+        frames = float(sum(encoded) * fps)
+        progress.report("clips", len(done), len(jobs), fps=frames / max(1e-6, time.perf_counter() - started))
+    
+    results = []
+    for job in kept:
+        print(f"  ✓ Clip {job.idx}/{len(jobs)} (finished before, kept): {job.output_path}")
+        results.append(render_pool.ClipResult(job.idx, job.output_path, None, 0.0))
+        done.append(windows[job.idx])
+    for job in reused:
+        print(f"  ✓ Clip {job.idx}/{len(jobs)} (unchanged, reused): {job.output_path}")
+        results.append(render_pool.ClipResult(job.idx, job.output_path, None, 0.0))
+        done.append(windows[job.idx])
+        if journal is not None:
+            journal.record_output(job.output_path, [(job.t_start, job.t_end)])
+    if kept:
+        print(f"  Resumed: {len(kept)} clips were finished before.")
+    if kept or reused:
+        progress.report("clips", len(done), len(jobs))
+    if reused:
+        print(f"  Reused {len(reused)} unchanged clips, encoding {len(pending)}.")
+    
+    try:
+        results += render_pool.render_batches(batches, traced_render if tracing.TRACER.enabled else render_fresh,
+                                              codec, on_done=report)
     finally:
+        for reader in readers:
+            reader.close()
+    return sorted(results, key=lambda r: r.idx)
+
+def render_merged(video_path, jobs, preset, output_path, config=None, pcm=None, journal=None, cancel=None):
+    """Join every clip window into one video with ffmpeg (no frames pass through Python).
+    
+    The render_mode setting picks how the video is produced: one re-encoding filter
+    graph ("reencode"), stream-copied GOPs with re-encoded edges ("smart") or
+    keyframe-snapped stream copy ("copy"). Normalization gains are measured
+    on slices of `pcm` (a PCMStore) when given. The video is written under a
+    partial name and renamed when complete; with a `journal` it is recorded
+    there, and kept if the journal already holds it. Once `cancel` (a
+    threading.Event) is set, the video is discarded (job_journal.Cancelled).
+    """
+    config = config or job_config()
+    windows = [(job.t_start, job.t_end) for job in jobs]
+    if journal is not None and journal.has_output(output_path, windows):
+        print("  Merged video was finished before, kept.")
+        progress.report("merge", 1, 1)
+        return
+    cache = None
+    if config.render_cache:
+        cache = render_cache.RenderCache(config.render_cache_dir, config.render_cache_max_mb * 1024 ** 2)
+        key = cache.key(cache.source_key(video_path, _render_params(config, preset, None, merged=True)), windows)
         try:
-            os.remove(tmp_wav)
+            hit = cache.fetch(key, output_path)
         except OSError:
-            pass
+            hit = False
+        if hit:
+            print("  Merged video unchanged, reused.")
+            if journal is not None:
+                journal.record_output(output_path, windows)
+            progress.report("merge", 1, 1)
+            return
     
-    print("Calculating crispness index...")
-    quality_scores = calculate_crispness_index(y, sr, hop_length=HOP_LENGTH)
+    gains = clip_gains(video_path, jobs, config, pcm)
+    gains = [gains.get(job.idx) for job in jobs] if gains else None
+    cutter = smart_render.SmartCutter(video_path, preset, threads=config.threads, audio_bitrate=config.audio_bitrate)
+    progress.report("merge", 0, 1)
+    with tracing.span("merge", mode=config.render_mode, clips=len(jobs)) as span:
+        with job_journal.atomic_output(output_path, cancel) as part:
+            if config.render_mode == "smart":
+                cutter.merge(part, windows, gains)
+            elif config.render_mode == "copy":
+                cutter.merge_copy(part, windows, gains)
+            else:
+                cutter.merge_reencode(part, windows, gains)
+        span.set(bytes_written=os.path.getsize(output_path))
+    if cache is not None:
+        cache.store(key, output_path)
+    if journal is not None:
+        journal.record_output(output_path, windows)
+    progress.report("merge", 1, 1)
+
+@contextlib.contextmanager
+def trace_session():
+    """Trace into TRACE_FILE for the duration of the block (no-op when already tracing)."""
+    if not TRACE_FILE or tracing.TRACER.enabled:
+        yield
+        return
+    tracing.configure(TRACE_FILE)
+    try:
+        yield
+    finally:
+        tracing.configure(None)
+        if TRACE_CHROME:
+            chrome_path = tracing.export_chrome_trace(TRACE_FILE, os.path.splitext(TRACE_FILE)[0] + ".trace.json")
+            print(f"Chrome trace written to {chrome_path}")
+
+def analyze_video_file(video_path, config=None, trace_file=None):
+    """analyze_audio for a video path, usable from a worker process.
     
-    # 2. Find peaks (Events)
-    # Minimum distance in FRAMES: prevents duplicates too close together
-    frames_per_sec = sr / HOP_LENGTH
-    min_dist_frames = int((PRE_ROLL + POST_ROLL) * frames_per_sec)
+    Args:
+        video_path: Path to video file
+        config: JobConfig (worker processes do not see settings changed in the parent)
+        trace_file: TRACE_FILE of the parent, so workers append to the same trace
+    """
+    if trace_file and not tracing.TRACER.enabled:
+        # Worker process: append to the same trace as the parent
+        tracing.configure(trace_file)
+    print(f"Analyzing '{os.path.basename(video_path)}'...")
+    with tracing.span("analysis", video=os.path.basename(video_path)):
+        duration = smart_render.probe_media(video_path)["duration"]
+        if duration is None:
+            raise RuntimeError(f"Cannot read duration of '{video_path}' (not a valid media file?)")
+        return analyze_audio(video_path, duration, config=config)
+
+def analyze_unplanned(video_path, config=None, trace_file=None):
+    """analyze_video_file, skipped (None) when a resumed job already journaled its plan."""
+    config = config or job_config()
+    if config.resume:
+        journal = open_job_journal(video_path, default_output_folder(video_path, config), config)
+        if journal.cut_list() is not None:
+            return None
+    return analyze_video_file(video_path, config, trace_file)
+
+def plan_asmr_short(video_path, analysis=None, config=None):
+    """Plan phase: analyze a video (unless `analysis` from analyze_audio is
+    given) and select the clip windows, without encoding anything.
     
-    peaks, properties = find_peaks(
-        quality_scores, 
-        height=np.mean(quality_scores) * 1.2, # Adaptive threshold
-        distance=min_dist_frames
-    )
+    Returns a cutlist.CutList.
+    """
+    config = config or job_config()
+    info = smart_render.probe_media(video_path)
+    if info["duration"] is None:
+        raise RuntimeError(f"Cannot read duration of '{video_path}' (not a valid media file?)")
+    sr = 44100
     
-    peak_times = librosa.frames_to_time(peaks, sr=sr, hop_length=HOP_LENGTH)
-    peak_scores = properties['peak_heights']
+    # 1. Audio Analysis
+    if analysis is None:
+        with tracing.span("analysis"):
+            analysis = analyze_audio(video_path, info["duration"], sr, config)
+    candidate_frames, candidate_scores = analysis
+    if config.candidate_index:
+        index_candidates(video_path, analysis, info, config, sr)
     
-    print(f"Found {len(peak_times)} potential ASMR triggers.")
+    # 2-3. Events and strategic selection
+    with tracing.span("selection") as span:
+        moments = select_moments(candidate_frames, candidate_scores, sr, info["duration"], config)
+        span.set(candidates=len(candidate_frames), selected=len(moments))
+    
+    settings = {
+        "target_duration": config.target_duration,
+        "pre_roll": config.pre_roll,
+        "post_roll": config.post_roll,
+        "final_clip_extra": config.final_clip_extra,
+        "min_freq": config.min_freq,
+        "hop_length": config.hop_length,
+    }
+    return cutlist.CutList(os.path.abspath(video_path), plan_clips(moments, info["duration"], config),
+                           duration=info["duration"], fps=info["fps"], settings=settings)
 
-    # 3. Strategic Selection (Ranking)
-    clip_duration = PRE_ROLL + POST_ROLL
-    max_clips = int(TARGET_DURATION / clip_duration)
+def candidate_features(video_path, frames, duration, config=None, sr=44100):
+    """Raw (onset, centroid, ZCR) features of the analysis at candidate frames, shape (3, n).
     
-    # Create pairs (time, score)
-    candidates = list(zip(peak_times, peak_scores))
+    Read from the PCM store, or None when the source audio is not in the
+    store and too long to load at once.
+    """
+    config = config or job_config()
+    store = open_pcm_store(video_path, config, sr)
+    if store is not None:
+        y = store.mono_signal()
+    elif duration < config.streaming_min_duration:
+        y, sr = audio_ingest.load_audio(video_path, sr=sr, duration=duration)
+    else:
+        return None
+    return features.FeatureEngine(sr, config.hop_length, config.min_freq).features_at(y, frames)
+
+def _index_params(config):
+    # Analysis parameters the indexed candidates depend on
+    return json.dumps({
+        "hop_length": config.hop_length,
+        "min_freq": config.min_freq,
+        "peak_threshold": config.peak_threshold,
+        "weights": list(features.WEIGHTS),
+        "edge_context": list(features.frame_context(config.hop_length)),
+    }, sort_keys=True)
+
+def index_candidates(video_path, analysis, info=None, config=None, sr=44100):
+    """Record the candidates of an analyze_audio result in the candidate index.
     
-    # Sort by SCORE (the best sounds overall)
-    candidates.sort(key=lambda x: x[1], reverse=True)
+    Skipped when the index already holds this content and these analysis
+    parameters. Candidates at either end of the audio are dropped as in
+    select_moments, so compilations never pick them. Index errors are
+    reported, not raised.
+    """
+    config = config or job_config()
+    info = info or smart_render.probe_media(video_path)
+    frames, scores = _drop_edge_frames(*analysis, sr, info["duration"], config.hop_length)
+    params = _index_params(config)
+    try:
+        with candidate_index.CandidateIndex(config.candidate_index_path) as index:
+            fp = analysis_cache.fingerprint(video_path)
+            if index.is_current(video_path, fp, params):
+                return
+            with tracing.span("index_candidates", candidates=len(frames)):
+                breakdown = candidate_features(video_path, frames, info["duration"], config, sr)
+                times = np.asarray(frames) * config.hop_length / sr
+                index.add_video(video_path, fp, info["duration"], info["fps"], times, scores, breakdown, params)
+    except (sqlite3.Error, OSError) as e:
+        print(f"⚠️ Could not update the candidate index: {e}")
+
+def plan_compilation(config=None, since=None, folder=None):
+    """Best moments across all indexed videos, read from the candidate index
+    (no analysis): [(source, cutlist.Clip)] in compilation order.
+    
+    Args:
+        config: JobConfig; target_duration, pre_roll, post_roll,
+            final_clip_extra and compilation_max_per_video shape the selection
+        since: Only videos modified at or after this Unix time
+        folder: Only videos inside this folder
+    """
+    config = config or job_config()
+    with candidate_index.CandidateIndex(config.candidate_index_path) as index:
+        index.remove_missing()
+        videos = index.videos(since, folder)
+        return candidate_index.select_compilation(
+            index.top_moments(since, folder), videos, config.target_duration,
+            config.pre_roll, config.post_roll, config.final_clip_extra, config.compilation_max_per_video,
+        )
+
+def render_compilation(output_folder, config=None, since=None, folder=None):
+    """Render the best moments across the indexed library (plan_compilation) to output_folder.
     
-    # Take the best to fill the time
-    best_moments = candidates[:max_clips]
+    Clips are named after their position and source. With merge_clips they
+    are joined into final_compilation.mp4 instead. The selection is saved
+    as compilation.json. Returns the output folder, or None when no indexed
+    moment matches.
+    """
+    config = config or job_config()
+    compilation = plan_compilation(config, since, folder)
+    if not compilation:
+        print("No indexed moments match (index videos first with --index or by processing them).")
+        return None
+    sources = list(dict.fromkeys(source for source, _ in compilation))
+    print(f"Compiling {len(compilation)} clips from {len(sources)} videos...")
     
-    # Re-sort by TIME (chronological order)
-    best_moments.sort(key=lambda x: x[0])
+    os.makedirs(output_folder, exist_ok=True)
+    with job_journal.atomic_output(os.path.join(output_folder, "compilation.json")) as part, open(part, "w") as f:
+        json.dump({"clips": [
+            {"source": source, "t_event": round(c.t_event, 6), "t_start": round(c.t_start, 6),
+             "t_end": round(c.t_end, 6), "score": round(c.score, 6)}
+            for source, c in compilation
+        ]}, f, indent=2)
     
-    final_timestamps = [x[0] for x in best_moments]
+    clip_folder = tempfile.mkdtemp(prefix=".clips-", dir=output_folder) if config.merge_clips else output_folder
+    try:
+        files = {}
+        with trace_session():
+            for source in sources:
+                jobs = []
+                for n, (clip_source, c) in enumerate(compilation, start=1):
+                    if clip_source == source:
+                        name = os.path.splitext(os.path.basename(source))[0]
+                        path = os.path.join(clip_folder, f"clip_{n:03d}_{name}_at_{int(c.t_event):04d}s.mp4")
+                        jobs.append(render_pool.ClipJob(n, c.t_event, c.t_start, c.t_end, path))
+                print(f"\n--- {os.path.basename(source)}: {len(jobs)} clips ---")
+                with tracing.span("video", video=os.path.basename(source)):
+                    preset = job_preset(config, source)
+                    info = smart_render.probe_media(source)
+                    results = render_separate_clips(source, jobs, preset, info["fps"], config,
+                                                    open_pcm_store(source, config))
+                files.update((r.idx, r.output_path) for r in results if r.error is None)
+        
+        if config.merge_clips and files:
+            output_path = os.path.join(output_folder, "final_compilation.mp4")
+            print(f"Merging {len(files)} clips into one video...")
+            with job_journal.atomic_output(output_path) as part:
+                smart_render.concat_files(part, [files[n] for n in sorted(files)],
+                                          job_preset(config), config.threads, config.audio_bitrate)
+            print(f"  ✓ Saved compilation: {output_path}")
+    finally:
+        if clip_folder != output_folder:
+            shutil.rmtree(clip_folder, ignore_errors=True)
+    print(f"\n✅ Compilation completed in '{output_folder}'!")
+    return output_folder
 
+def write_cut_list(cut_list, output_folder):
+    """Save the cut list as cut_list.json (editable) and cut_list.edl. Returns the JSON path."""
+    os.makedirs(output_folder, exist_ok=True)
+    edl_path = os.path.join(output_folder, "cut_list.edl")
+    json_path = os.path.join(output_folder, "cut_list.json")
+    with job_journal.atomic_output(edl_path) as part:
+        cut_list.write_edl(part)
+    with job_journal.atomic_output(json_path) as part:
+        cut_list.write_json(part)
+    return json_path
+
+def render_cut_list(cut_list, output_folder, config=None, journal=None):
+    """Render phase: encode the clips of a cut list to output_folder (no analysis).
+    
+    Outputs finished by an interrupted run are kept when `journal` (a
+    job_journal.JobJournal) holds them. Returns whether every output was written.
+    """
+    config = config or job_config()
+    clips = cut_list.clips
     # 4. Save Clips
-    if MERGE_CLIPS:
-        print(f"Preparing {len(final_timestamps)} clips for merging...")
+    if config.merge_clips:
+        print(f"Preparing {len(clips)} clips for merging...")
     else:
-        print(f"Saving {len(final_timestamps)} separate clips to '{output_folder}/'...")
+        print(f"Saving {len(clips)} separate clips to '{output_folder}/'...")
     
     # Create folder if it doesn't exist
     os.makedirs(output_folder, exist_ok=True)
+    # Partial files of a killed run are never complete: start them over (those of
+    # live processes and other hosts sharing the folder are left alone)
+    if config.resume:
+        leftovers = job_journal.remove_leftovers(output_folder)
+        if leftovers:
+            print(f"  Removed {leftovers} partial outputs of an interrupted run.")
     
-    clips_to_merge = []
+    # Get encoding preset
+    preset = job_preset(config, cut_list.source)
+    # Clip loudness and audio are read from the source's PCM store (decoded at most once)
+    pcm = open_pcm_store(cut_list.source, config)
     
-    for idx, t_event in enumerate(final_timestamps, start=1):
-        # Check if this is the last clip
-        is_last_clip = (idx == len(final_timestamps))
-        
-        # Asymmetric cutting logic (Pre-Roll vs Post-Roll)
-        t_start = max(0, t_event - PRE_ROLL)
-        
-        # Last clip gets extra time for closing shot
-        if is_last_clip:
-            t_end = min(clip.duration, t_event + POST_ROLL + FINAL_CLIP_EXTRA)
-        else:
-            t_end = min(clip.duration, t_event + POST_ROLL)
-        
-        # Cut - preserve original dimensions
-        sub = clip.subclip(t_start, t_end)
-        
-        # Micro-fade audio (essential to avoid 'pop')
-        sub = sub.audio_fadein(0.05).audio_fadeout(0.05)
-        
-        # Normalize audio if requested
-        if AUDIO_NORMALIZE:
-            sub = sub.fx(audio_normalize)
-        
-        if MERGE_CLIPS:
-            clips_to_merge.append(sub)
-        else:
-            # Save with timestamp in name for guaranteed sorting
-            time_marker = f"{int(t_event):04d}s"
-            output_filename = os.path.join(output_folder, f"clip_{idx:03d}_at_{time_marker}.mp4")
-            
-            # Get encoding preset
-            preset = GPU_PRESETS.get(ENCODING_PRESET, GPU_PRESETS["nvidia"])
-            
-            # Build ffmpeg parameters
-            ffmpeg_params = [
-                "-pix_fmt", "yuv420p",
-                preset["quality_param"], preset["quality_value"],
-                "-b:a", AUDIO_BITRATE,
-            ] + preset["extra_params"]
-            
-            try:
-                sub.write_videofile(
-                    output_filename,
-                    codec=preset["codec"],
-                    audio_codec="aac",
-                    fps=clip.fps,  # Keep original FPS
-                    preset=preset["preset"],
-                    bitrate=None,  # Disable fixed bitrate for quality-based encoding
-                    threads=THREADS,
-                    logger=None,
-                    ffmpeg_params=ffmpeg_params
-                )
-                print(f"  ✓ Clip {idx}/{len(final_timestamps)}: {output_filename}")
-            except Exception as e:
-                print(f"  ✗ Error on clip {idx}: {e}")
+    jobs = clip_jobs(clips, output_folder)
+    
+    with tracing.span("render", clips=len(jobs), merge=config.merge_clips):
+        if config.merge_clips:
+            if jobs:
+                print(f"Merging {len(jobs)} clips into one video...")
+                output_filename = os.path.join(output_folder, "final_short.mp4")
+                try:
+                    render_merged(cut_list.source, jobs, preset, output_filename, config, pcm, journal)
+                    print(f"  ✓ Saved merged video: {output_filename}")
+                except Exception as e:
+                    print(f"  ✗ Error saving merged video: {e}")
+                    return False
+            return True
+        results = render_separate_clips(cut_list.source, jobs, preset, cut_list.fps, config, pcm, journal)
+        return all(r.error is None for r in results)
 
-    if MERGE_CLIPS and clips_to_merge:
-        print(f"Merging {len(clips_to_merge)} clips into one video...")
-        try:
-            final_clip = concatenate_videoclips(clips_to_merge)
-            
-            output_filename = os.path.join(output_folder, "final_short.mp4")
-            
-            # Get encoding preset
-            preset = GPU_PRESETS.get(ENCODING_PRESET, GPU_PRESETS["nvidia"])
-            
-            # Build ffmpeg parameters
-            ffmpeg_params = [
-                "-pix_fmt", "yuv420p",
-                preset["quality_param"], preset["quality_value"],
-                "-b:a", AUDIO_BITRATE,
-            ] + preset["extra_params"]
-            
-            final_clip.write_videofile(
-                output_filename,
-                codec=preset["codec"],
-                audio_codec="aac",
-                fps=clip.fps,
-                preset=preset["preset"],
-                bitrate=None,
-                threads=THREADS,
-                logger=None,
-                ffmpeg_params=ffmpeg_params
-            )
-            print(f"  ✓ Saved merged video: {output_filename}")
-        except Exception as e:
-            print(f"  ✗ Error saving merged video: {e}")
+def render_cut_list_file(path, output_folder=None, config=None):
+    """Render a (possibly hand-edited) cut_list.json or .edl without re-analysis.
+    
+    Args:
+        path: Cut list file
+        output_folder: Output folder (optional). If None, clips are written next to the cut list.
+        config: JobConfig (optional). If None, the module settings are used. With
+            resume, clips an interrupted render of the same windows finished are kept.
+    """
+    cut_list = cutlist.read(path)
+    if not os.path.exists(cut_list.source):
+        raise FileNotFoundError(f"Video not found: {cut_list.source}")
+    if output_folder is None:
+        output_folder = os.path.dirname(os.path.abspath(path))
+    
+    with trace_session(), tracing.span("video", video=os.path.basename(cut_list.source)):
+        journal = open_job_journal(cut_list.source, output_folder, config)
+        render_cut_list(cut_list, output_folder, config, journal)
+    print(f"\n✅ Completed '{os.path.basename(cut_list.source)}'!")
+    return output_folder
 
-    print(f"\n✅ Completed '{os.path.basename(video_path)}'!")
+def generate_asmr_short(video_path, output_folder, config=None, analysis=None):
+    """Analyze a video (unless `analysis` from analyze_audio is given), select
+    the best moments and render them to output_folder.
+    
+    All settings come from `config` (a JobConfig; default: job_config()), so
+    several calls with different configs can run at the same time.
+    The cut list is saved next to the clips (cut_list.json / .edl). With
+    plan_only nothing is encoded.
+    
+    Progress is checkpointed in the output folder's job journal. With
+    resume, a finished job is skipped and an interrupted one continues from
+    its journaled plan (no analysis) and keeps the clips it finished.
+    """
+    config = config or job_config()
+    print(f"\n{'='*60}")
+    print(f"--- AUTO DIRECTOR START: {os.path.basename(video_path)} ---")
+    print(f"{'='*60}")
+    
+    journal = open_job_journal(video_path, output_folder, config)
+    if journal.finished:
+        print(f"✓ '{os.path.basename(video_path)}' was completed before, nothing to resume.")
+        return
+    cut_list = journal.cut_list()
+    if cut_list is not None:
+        print(f"Resuming the interrupted job: {len(cut_list.clips)} clips planned before.")
+        cut_list_path = os.path.join(output_folder, "cut_list.json")
+    else:
+        cut_list = plan_asmr_short(video_path, analysis, config)
+        cut_list_path = write_cut_list(cut_list, output_folder)
+        journal.record_plan(cut_list)
+    
+    if config.plan_only:
+        for n, c in enumerate(cut_list.clips, start=1):
+            print(f"  {n:3d}. {c.t_start:9.2f}s - {c.t_end:9.2f}s  (event {c.t_event:.2f}s, score {c.score:.3f})")
+        print(f"\n📝 Cut list saved to '{cut_list_path}' (plan only, nothing encoded)")
+        return
     
-    clip.close()
+    if render_cut_list(cut_list, output_folder, config, journal):
+        journal.finish()
 
+    print(f"\n✅ Completed '{os.path.basename(video_path)}'!")
 
-def process_single_video(video_path, output_folder=None):
+
+def default_output_folder(video_path, config=None):
+    """<video name><output_suffix> folder next to the video."""
+    config = config or job_config()
+    video_dir = os.path.dirname(os.path.abspath(video_path))
+    video_name = os.path.splitext(os.path.basename(video_path))[0]
+    return os.path.join(video_dir, f"{video_name}{config.output_suffix}")
+
+def process_single_video(video_path, output_folder=None, analysis=None, config=None):
     """Process a single video.
     
     Args:
         video_path: Path to video file
         output_folder: Output folder (optional). If None, uses same folder as video.
+        analysis: Precomputed analyze_audio result (optional)
+        config: JobConfig (optional). If None, the module settings are used.
     """
+    config = config or job_config()
     if not os.path.exists(video_path):
         raise FileNotFoundError(f"Video not found: {video_path}")
     
     # If output not specified, create folder in same directory as video
     if output_folder is None:
-        video_dir = os.path.dirname(os.path.abspath(video_path))
-        video_name = os.path.splitext(os.path.basename(video_path))[0]
-        output_folder = os.path.join(video_dir, f"{video_name}{OUTPUT_SUFFIX}")
+        output_folder = default_output_folder(video_path, config)
     
-    generate_asmr_short(video_path, output_folder)
+    with trace_session(), tracing.span("video", video=os.path.basename(video_path)):
+        generate_asmr_short(video_path, output_folder, config, analysis=analysis)
     return output_folder
 
 
-def process_all_videos():
+VIDEO_EXTENSIONS = ('.mp4', '.MP4', '.mov', '.MOV', '.avi', '.AVI', '.mkv', '.MKV')
+
+def index_all_videos(config=None):
+    """Add the videos in INPUT_FOLDER to the candidate index.
+    
+    Only videos that are new, changed or indexed with other analysis
+    parameters are analyzed (from the analysis cache when possible).
+    """
+    config = config or job_config()
+    if not os.path.isdir(INPUT_FOLDER):
+        print(f"Folder '{INPUT_FOLDER}/' not found")
+        return
+    video_paths = [os.path.join(INPUT_FOLDER, f) for f in sorted(os.listdir(INPUT_FOLDER))
+                   if f.endswith(VIDEO_EXTENSIONS)]
+    params = _index_params(config)
+    with candidate_index.CandidateIndex(config.candidate_index_path) as index:
+        gone = index.remove_missing()
+        pending = [p for p in video_paths if not index.is_current(p, analysis_cache.fingerprint(p), params)]
+    if gone:
+        print(f"Removed {len(gone)} missing videos from the index.")
+    print(f"{len(video_paths) - len(pending)} videos already indexed, indexing {len(pending)}...")
+    
+    def report_error(video_path, e):
+        print(f"\n❌ ERROR indexing '{os.path.basename(video_path)}': {e}")
+    
+    def index(video_path, analysis):
+        index_candidates(video_path, analysis, config=config)
+        print(f"  ✓ Indexed {len(analysis[0])} moments of '{os.path.basename(video_path)}'")
+    
+    with trace_session():
+        batch.run_batch(
+            pending,
+            analyze=functools.partial(analyze_video_file, config=config, trace_file=TRACE_FILE),
+            render=index,
+            analysis_workers=ANALYSIS_WORKERS,
+            encode_slots=1,
+            on_error=report_error,
+        )
+
+def process_all_videos(config=None):
     """Process all videos in INPUT_FOLDER"""
+    config = config or job_config()
     
     # Create input folder if it doesn't exist
     if not os.path.exists(INPUT_FOLDER):
@@ -279,13 +1117,12 @@ def process_all_videos():
         return
     
     # Find all videos (mp4, mov, avi, mkv)
-    video_extensions = ('.mp4', '.MP4', '.mov', '.MOV', '.avi', '.AVI', '.mkv', '.MKV')
     video_files = [f for f in os.listdir(INPUT_FOLDER) 
-                   if f.endswith(video_extensions)]
+                   if f.endswith(VIDEO_EXTENSIONS)]
     
     if not video_files:
         print(f"No videos found in '{INPUT_FOLDER}/'")
-        print(f"Supported formats: {', '.join(video_extensions)}")
+        print(f"Supported formats: {', '.join(VIDEO_EXTENSIONS)}")
         return
     
     print(f"Found {len(video_files)} videos to process:")
@@ -293,23 +1130,77 @@ def process_all_videos():
         print(f"  - {vf}")
     print()
     
-    # Process each video
-    for video_file in video_files:
-        video_path = os.path.join(INPUT_FOLDER, video_file)
-        
-        try:
-            process_single_video(video_path)
-        except Exception as e:
-            print(f"\n❌ ERROR processing '{video_file}':")
-            print(f"   {e}")
-            import traceback
-            traceback.print_exc()
-            continue
+    video_paths = [os.path.join(INPUT_FOLDER, f) for f in video_files]
+    if config.resume:
+        # Finished jobs are skipped before any analysis
+        finished = {p for p in video_paths
+                    if open_job_journal(p, default_output_folder(p, config), config).finished}
+        if finished:
+            print(f"Resuming: {len(finished)} videos were completed before, skipping them.\n")
+            video_paths = [p for p in video_paths if p not in finished]
+    
+    def report_error(video_path, e):
+        print(f"\n❌ ERROR processing '{os.path.basename(video_path)}':")
+        print(f"   {e}")
+        import traceback
+        traceback.print_exception(type(e), e, e.__traceback__)
+    
+    def render(video_path, analysis):
+        return process_single_video(video_path, analysis=analysis, config=config)
+    
+    # Analyze upcoming videos in worker processes while earlier ones encode
+    with trace_session():
+        results = batch.run_batch(
+            video_paths,
+            analyze=functools.partial(analyze_unplanned, config=config, trace_file=TRACE_FILE),
+            render=render,
+            analysis_workers=ANALYSIS_WORKERS,
+            encode_slots=ENCODE_SLOTS,
+            on_error=report_error,
+        )
+    failed = [r for r in results if r.error is not None]
+    if failed:
+        print(f"\n⚠️  {len(failed)} of {len(results)} videos failed:")
+        for r in failed:
+            print(f"  - {os.path.basename(r.video_path)}")
     
     print(f"\n{'='*60}")
     print("🎬 PROCESSING COMPLETE!")
     print(f"{'='*60}")
 
 
+def cli(argv=None):
+    """Command line entry point (asmr-cutter-cli)."""
+    import argparse
+    parser = argparse.ArgumentParser(description=f"Cut ASMR shorts from the videos in '{INPUT_FOLDER}/'.")
+    parser.add_argument("--plan", action="store_true",
+                        help="only write each video's cut list (cut_list.json / .edl), no encoding")
+    parser.add_argument("--render", metavar="CUT_LIST",
+                        help="render a cut list (.json or .edl) without analyzing the video again")
+    parser.add_argument("--output", help="output folder for --render (default: the cut list's folder)")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue interrupted jobs: skip finished videos and keep finished clips")
+    parser.add_argument("--index", action="store_true",
+                        help="add the videos to the candidate index (analyzing only new or changed ones), no encoding")
+    parser.add_argument("--compile", metavar="OUTPUT",
+                        help="render the best moments across all indexed videos to OUTPUT, without analysis")
+    parser.add_argument("--since", type=float, metavar="DAYS",
+                        help="with --compile: only videos modified in the last DAYS days")
+    parser.add_argument("--folder", help="with --compile: only indexed videos inside this folder")
+    args = parser.parse_args(argv)
+    
+    if args.render:
+        render_cut_list_file(args.render, args.output, job_config(resume=args.resume))
+        return
+    if args.index:
+        index_all_videos()
+        return
+    if args.compile:
+        since = time.time() - args.since * 86400 if args.since is not None else None
+        render_compilation(args.compile, since=since, folder=args.folder)
+        return
+    process_all_videos(job_config(plan_only=args.plan, resume=args.resume))
+
+
 if __name__ == "__main__":
-    process_all_videos()
\ No newline at end of file
+    cli()
\ No newline at end of file
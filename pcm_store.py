@@ -0,0 +1,175 @@
+"""
+Per-source PCM store: the audio of a source decoded once into a float32
+file on disk and memory-mapped.
+
+Analysis, per-clip loudness measurement (loudness.py) and the faded
+audio of moviepy renders all read slices of the same memory map instead
+of each starting an ffmpeg audio reader. Stores are kept in
+~/.cache/asmr-pro-cutter/pcm, keyed by the source fingerprint and sample
+rate; the least recently used ones are removed above a size limit.
+
+Samples are stored as (frames, channels) in the source's channel count
+(mono or stereo; more channels are downmixed to stereo).
+"""
+import math
+import os
+import threading
+
+import numpy as np
+
+from analysis_cache import cache_home, fingerprint
+from audio_ingest import SAMPLE_RATE
+from smart_render import probe_media, run_ffmpeg
+
+STORE_VERSION = 1
+MONO_GAIN = np.float32(math.sqrt(0.5))  # ffmpeg's stereo <-> mono (-ac) coefficient
+
+
+def default_store_dir():
+    return os.path.join(cache_home(), "pcm")
+
+
+class PCMStore:
+    """Float32 samples of the first audio stream of one source, decoded on first use."""
+
+    def __init__(self, video_path, sr=SAMPLE_RATE, root=None, max_bytes=8 * 1024 ** 3, info=None):
+        self.video_path = video_path
+        self.sr = sr
+        self.root = root or default_store_dir()
+        self.max_bytes = max_bytes
+        info = info or probe_media(video_path)
+        self.has_audio = info["has_audio"]
+        self.channels = min(2, info["audio_channels"] or 2)
+        self.duration = info["duration"] or 0.0
+        self._samples = None
+        self._lock = threading.Lock()
+
+    def fits(self):
+        """Whether the decoded audio stays within the store size limit."""
+        return self.has_audio and self.duration * self.sr * self.channels * 4 <= self.max_bytes
+
+    def _path(self):
+        key = f"{fingerprint(self.video_path)}_{self.sr}_v{STORE_VERSION}"
+        return os.path.join(self.root, key[:2], key + ".f32")
+
+    @property
+    def samples(self):
+        """Read-only (frames, channels) float32 memory map, decoded on first access."""
+        with self._lock:
+            if self._samples is None:
+                path = self._path()
+                if not os.path.isfile(path):
+                    self._decode(path)
+                # Record the access for LRU eviction
+                os.utime(path)
+                frames = os.path.getsize(path) // (4 * self.channels)
+                if frames:
+                    self._samples = np.memmap(path, dtype=np.float32, mode="r", shape=(frames, self.channels))
+                else:
+                    self._samples = np.zeros((0, self.channels), dtype=np.float32)
+            return self._samples
+
+    def _decode(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        try:
+            run_ffmpeg(["-i", self.video_path, "-map", "0:a:0", "-vn", "-ac", self.channels, "-ar", self.sr,
+                        "-f", "f32le", "-acodec", "pcm_f32le", tmp])
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self.evict(keep=path)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def _range(self, t_start, t_end):
+        # Sample index of a time as moviepy computes it (floor, float slack)
+        n = len(self.samples)
+        start = min(n, max(0, int(t_start * self.sr + 1e-5)))
+        stop = n if t_end is None else min(n, max(start, int(t_end * self.sr + 1e-5)))
+        return start, stop
+
+    def window(self, t_start, t_end):
+        """(frames, channels) samples of [t_start, t_end) seconds: a view, no copy."""
+        start, stop = self._range(t_start, t_end)
+        return self.samples[start:stop]
+
+    def mono(self, start=0, stop=None):
+        """Mono samples [start, stop) as ffmpeg's -ac 1 would decode them (a view for mono sources)."""
+        samples = self.samples[start:stop]
+        if self.channels == 1:
+            return samples[:, 0]
+        return (samples[:, 0] + samples[:, 1]) * MONO_GAIN
+
+    def mono_signal(self):
+        """Sliceable mono signal of the whole store; slices are mixed on access."""
+        if self.channels == 1:
+            return self.samples[:, 0]
+        return _MonoSignal(self)
+
+    def iter_mono_blocks(self, block_samples):
+        """Consecutive mono blocks of at most block_samples samples."""
+        for start in range(0, len(self.samples), block_samples):
+            yield self.mono(start, start + block_samples)
+
+    def stereo(self, t_start, t_end):
+        """Stereo samples of the window as moviepy reads them (ffmpeg -ac 2 upmixes mono by -3 dB)."""
+        samples = self.window(t_start, t_end)
+        if self.channels == 2:
+            return samples
+        return np.repeat(samples * MONO_GAIN, 2, axis=1)
+
+    def clip_audio(self, t_start, t_end, fade, gain_db=None):
+        """Stereo audio of a clip with linear fades of `fade` seconds at both ends
+        (moviepy's audio_fadein/out), amplified by `gain_db` if given.
+        """
+        audio = np.array(self.stereo(t_start, t_end), dtype=np.float32)
+        t = np.arange(len(audio), dtype=np.float64) / self.sr
+        gain = np.minimum(1.0, np.minimum(t, (t_end - t_start) - t) / fade)
+        if gain_db:
+            gain = gain * 10.0 ** (gain_db / 20.0)
+        audio *= np.maximum(0.0, gain).astype(np.float32)[:, np.newaxis]
+        return audio
+
+    def evict(self, keep=None):
+        """Remove least recently used stores until the directory fits in max_bytes."""
+        entries = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith(".f32"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+
+        for last_used, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+
+class _MonoSignal:
+    """store.mono() of a stereo store, without mixing more than the slices read."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __len__(self):
+        return len(self.store)
+
+    def __getitem__(self, key):
+        start, stop, step = key.indices(len(self))
+        return self.store.mono(start, stop)[::step]
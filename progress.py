@@ -0,0 +1,37 @@
+"""
+Determinate progress of the running job.
+
+Pipeline stages call `report(stage, done, total, **info)` (e.g. analysis
+seconds decoded, clips finished, encode fps) and every registered listener
+receives a ProgressUpdate. Listeners are called on the reporting thread and
+must hand the update over to their own thread themselves (see gui.LogPump).
+With no listener registered, `report` returns immediately.
+"""
+import threading
+from collections import namedtuple
+
+ProgressUpdate = namedtuple("ProgressUpdate", ["stage", "done", "total", "info"])
+
+_listeners = []
+_lock = threading.Lock()
+
+
+def add_listener(listener):
+    with _lock:
+        _listeners.append(listener)
+
+
+def remove_listener(listener):
+    with _lock:
+        if listener in _listeners:
+            _listeners.remove(listener)
+
+
+def report(stage, done, total, **info):
+    if not _listeners:
+        return
+    update = ProgressUpdate(stage, done, total, info)
+    with _lock:
+        listeners = list(_listeners)
+    for listener in listeners:
+        listener(update)
@@ -0,0 +1,106 @@
+"""
+Content-addressed cache of rendered clips.
+
+Every rendered clip is stored under a key made of the source fingerprint,
+the exact cut window and everything that changes the encoded output
+(render mode, encoder preset, fades, normalization, audio bitrate, fps).
+On a re-run, clips whose key is already cached are copied into the output
+folder instead of being encoded again, so a small tweak only costs the
+windows it actually changed. Outputs never share data with the cache:
+editing one in place cannot corrupt a cache entry, and the access times
+kept for LRU eviction never touch the user's files.
+"""
+import hashlib
+import json
+import os
+import shutil
+
+from analysis_cache import cache_home, fingerprint
+
+RENDER_CACHE_VERSION = 3  # Bump when the rendering pipeline changes its output (3: stereo audio everywhere)
+
+
+def default_cache_dir():
+    return os.path.join(cache_home(), "renders")
+
+
+def _place(src, dest):
+    """Copy src to dest, replacing dest atomically."""
+    tmp = os.path.join(os.path.dirname(dest), f".{os.path.basename(dest)}.tmp-{os.getpid()}")
+    try:
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dest)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class RenderCache:
+    """Directory of rendered files named by key, with LRU eviction above `max_bytes`."""
+
+    def __init__(self, root=None, max_bytes=10 * 1024 ** 3):
+        self.root = root or default_cache_dir()
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+    def source_key(self, video_path, params):
+        """Key prefix shared by all windows of one source rendered with `params`."""
+        text = json.dumps({"version": RENDER_CACHE_VERSION, "source": fingerprint(video_path), **params},
+                          sort_keys=True)
+        return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+    @staticmethod
+    def key(source_key, windows):
+        """Key of one output: the source key plus its exact (t_start, t_end) window(s)."""
+        text = json.dumps([source_key, [[round(float(a), 6), round(float(b), 6)] for a, b in windows]])
+        return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key + ".mp4")
+
+    def fetch(self, key, dest):
+        """Put the cached output for `key` at dest. Returns False on a miss."""
+        path = self._path(key)
+        if not os.path.isfile(path):
+            return False
+        _place(path, dest)
+        # Record the access for LRU eviction (on the cache's own copy)
+        os.utime(path)
+        return True
+
+    def store(self, key, rendered_path):
+        """Add a copy of a freshly rendered file to the cache."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _place(rendered_path, path)
+        self.evict(keep=path)
+
+    def evict(self, keep=None):
+        """Remove least recently used renders until the cache fits in max_bytes."""
+        entries = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.startswith("."):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+
+        for last_used, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
@@ -0,0 +1,157 @@
+"""
+Concurrent clip rendering with bounded encoder sessions.
+
+Short clip encodes are dominated by ffmpeg startup and container
+finalization, so independent clips are rendered by a worker pool. A
+process-wide SessionLimiter caps how many encoder sessions of each type run
+at once (hardware encoders limit concurrent sessions; software encoders
+compete for CPU cores), even when several jobs share the process.
+
+Clips close together in the source can instead be rendered in sweeps:
+`plan_sweeps` groups them so one encoder run decodes their stretch of the
+source once and writes all of their outputs, and `render_batches` runs
+such groups like single clips.
+"""
+import math
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+
+HARDWARE_SUFFIXES = ("_nvenc", "_qsv", "_amf", "_vaapi", "_videotoolbox", "_v4l2m2m")
+DEFAULT_LIMITS = {"hardware": 2, "software": 2, "copy": 4}
+
+# One clip window to render, and its outcome
+ClipJob = namedtuple("ClipJob", ["idx", "t_event", "t_start", "t_end", "output_path"])
+ClipResult = namedtuple("ClipResult", ["idx", "output_path", "error", "elapsed"])
+
+
+def encoder_kind(codec):
+    """'copy', 'hardware' or 'software' for an ffmpeg encoder name."""
+    if codec == "copy":
+        return "copy"
+    if codec.endswith(HARDWARE_SUFFIXES):
+        return "hardware"
+    return "software"
+
+
+class SessionLimiter:
+    """Caps concurrent encoder sessions per encoder type.
+
+    Limits are looked up by encoder name first (e.g. "h264_qsv"), then by
+    kind ("hardware", "software", "copy"), and can be changed at any time.
+    """
+
+    def __init__(self, limits=None):
+        self.limits = dict(DEFAULT_LIMITS)
+        self.limits.update(limits or {})
+        self._active = {}
+        self._cond = threading.Condition()
+
+    def configure(self, limits):
+        with self._cond:
+            self.limits.update(limits)
+            self._cond.notify_all()
+
+    def slot(self, codec):
+        """Counter shared by all sessions that `codec` competes with."""
+        return codec if codec in self.limits else encoder_kind(codec)
+
+    def limit(self, codec):
+        return max(1, int(self.limits.get(self.slot(codec), 1)))
+
+    @contextmanager
+    def session(self, codec):
+        slot = self.slot(codec)
+        with self._cond:
+            while self._active.get(slot, 0) >= self.limit(codec):
+                self._cond.wait()
+            self._active[slot] = self._active.get(slot, 0) + 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active[slot] -= 1
+                self._cond.notify_all()
+
+
+# Shared by every render in this process
+SESSIONS = SessionLimiter()
+
+
+def plan_sweeps(jobs, max_gap, min_clips=3, max_clips=6, parallel=1):
+    """Group ClipJobs into batches: sweeps of dense windows, single clips for the rest.
+
+    Windows less than `max_gap` seconds apart form a run. Runs of at least
+    `min_clips` windows become sweeps of at most `max_clips` windows (split
+    further, while sweeps keep `min_clips` windows, so that `parallel`
+    sessions stay busy); every other window stays a batch of its own.
+    Batches are returned in time order.
+    """
+    jobs = sorted(jobs, key=lambda job: job.t_start)
+    runs = []
+    for job in jobs:
+        if runs and job.t_start - runs[-1][-1].t_end <= max_gap:
+            runs[-1].append(job)
+        else:
+            runs.append([job])
+
+    batches = []
+    for run in runs:
+        if len(run) < min_clips:
+            batches += [[job] for job in run]
+            continue
+        n = max(math.ceil(len(run) / max_clips), min(parallel, len(run) // min_clips))
+        bounds = [round(i * len(run) / n) for i in range(n + 1)]
+        batches += [run[a:b] for a, b in zip(bounds, bounds[1:])]
+    return batches
+
+
+def render_batches(batches, render, codec, limiter=SESSIONS, on_done=None):
+    """Run render(batch) for every list of ClipJobs concurrently, one encoder session each.
+
+    A failing batch fails every clip in it. `on_done` receives the ClipResult
+    of each clip as its batch finishes (elapsed is shared out evenly).
+
+    Returns:
+        ClipResult list in the same order as the jobs in `batches`.
+    """
+    if not batches:
+        return []
+
+    def run(batch):
+        with limiter.session(codec):
+            started = time.perf_counter()
+            try:
+                render(batch)
+                error = None
+            except Exception as e:
+                error = e
+            elapsed = (time.perf_counter() - started) / len(batch)
+            return [ClipResult(job.idx, job.output_path, error, elapsed) for job in batch]
+
+    workers = min(len(batches), limiter.limit(codec))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="clip-render") as pool:
+        futures = [pool.submit(run, batch) for batch in batches]
+        if on_done is not None:
+            for future in as_completed(futures):
+                for result in future.result():
+                    on_done(result)
+        return [result for future in futures for result in future.result()]
+
+
+def render_clips(jobs, render, codec, limiter=SESSIONS, on_done=None):
+    """Run render(job) for every ClipJob concurrently.
+
+    Args:
+        jobs: ClipJob list
+        render: Callable encoding one job; exceptions are captured per clip
+        codec: Encoder used by `render` ("copy" for stream copy)
+        limiter: SessionLimiter bounding concurrent encoder sessions
+        on_done: Optional callback receiving each ClipResult as it finishes
+
+    Returns:
+        ClipResult list in the same order as `jobs`.
+    """
+    return render_batches([[job] for job in jobs], lambda batch: render(batch[0]), codec, limiter, on_done)
@@ -0,0 +1,125 @@
+"""
+Budget-constrained selection of clip windows.
+
+Every candidate event t becomes the window [t - pre_roll, t + post_roll],
+clipped to the source, and the last window of the short is extended by
+final_extra. `select_windows` picks the non-overlapping windows with the
+highest total score whose rendered length, including the shorter edge
+windows and the extended last one, fits in the duration budget.
+
+This is weighted interval scheduling with a length budget. Every window
+that is neither the first nor the last of a selection is exactly
+pre_roll + post_roll long, so the budget only depends on the number of
+windows, the first one (head windows clipped at 0 are shorter) and the
+last one. The DP runs over the number of windows and each layer is a
+prefix maximum plus a searchsorted lookup over all candidates:
+O(layers * n) in numpy, with layers ~ budget / window length.
+"""
+import numpy as np
+
+EPSILON = 1e-9  # Seconds of float slack for touching windows and the budget
+
+
+def _windows(times, pre_roll, post_roll, final_extra, duration):
+    starts = np.maximum(0.0, times - pre_roll)
+    ends = np.minimum(duration, times + post_roll)
+    # Length of a window when it is the last one of the short
+    closing = np.minimum(duration, times + post_roll + final_extra) - starts
+    return starts, ends, closing
+
+
+def _prefix_argmax(values):
+    """Running maximum of values and the index where it was reached."""
+    best = np.maximum.accumulate(values)
+    where = np.where(values == best, np.arange(len(values)), 0)
+    return best, np.maximum.accumulate(where)
+
+
+def _chains(seed, scores, before, closing, slot, budget, first_len, keep=False):
+    """Best chains of non-overlapping windows starting from `seed`.
+
+    seed: scores of one-window chains (-inf where a window cannot come first).
+    before[i]: number of windows ending at or before window i starts.
+    A chain of k windows ending with window i lasts
+    first_len + (k - 2) * slot + closing[i] (closing[i] alone when k = 1).
+    Returns (score, k, last) of the best chain within budget, plus the
+    back pointers of every layer when `keep` is set.
+    """
+    best = (-np.inf, 0, -1)
+    pointers = []
+    # Index 0 stands for "no earlier window": chains cannot be extended from it
+    top = np.empty(len(seed) + 1)
+    top[0] = -np.inf
+    arg = np.full(len(seed) + 1, -1, dtype=np.int64)
+    layer = seed
+    k = 1
+    while True:
+        used = 0.0 if k == 1 else first_len + (k - 2) * slot
+        over = closing > budget - used + EPSILON
+        if over.all():
+            break
+        total = np.where(over, -np.inf, layer)
+        i = int(np.argmax(total))
+        if total[i] > best[0]:
+            best = (float(total[i]), k, i)
+
+        # Extend every chain by one window
+        if keep:
+            top[1:], arg[1:] = _prefix_argmax(layer)
+            pointers.append(arg[before])
+        else:
+            np.maximum.accumulate(layer, out=top[1:])
+        if top[-1] == -np.inf:
+            break
+        layer = scores + top[before]
+        k += 1
+    return best, pointers
+
+
+def select_windows(times, scores, budget, pre_roll, post_roll, final_extra=0.0, duration=None):
+    """Indices (in time order) of the candidate events to cut.
+
+    times must be sorted. Maximizes the total score of non-overlapping
+    windows whose combined length stays within `budget` seconds.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    scores = np.asarray(scores, dtype=np.float64)
+    if len(times) == 0:
+        return np.zeros(0, dtype=np.int64)
+    duration = np.inf if duration is None else float(duration)
+    slot = pre_roll + post_roll
+
+    starts, ends, closing = _windows(times, pre_roll, post_roll, final_extra, duration)
+    before = np.searchsorted(ends, starts + EPSILON, side="right")
+    head = starts <= 0.0
+    head_len = ends - starts
+
+    # Selections whose first window is full length
+    runs = [(np.where(head & (head_len < slot), -np.inf, scores), slot)]
+    # Selections opening with a shorter head window. A head window that
+    # ends earlier and scores no lower is better in every respect, so only
+    # heads scoring above all earlier ones are tried.
+    record = -np.inf
+    for h in np.flatnonzero(head & (head_len < slot)):
+        if scores[h] > record:
+            record = scores[h]
+            seed = np.full(len(times), -np.inf)
+            seed[h] = scores[h]
+            runs.append((seed, head_len[h]))
+
+    best, best_run = (-np.inf, 0, -1), None
+    for seed, first_len in runs:
+        result, _ = _chains(seed, scores, before, closing, slot, budget, first_len)
+        if result[0] > best[0]:
+            best, best_run = result, (seed, first_len)
+    if best_run is None:
+        return np.zeros(0, dtype=np.int64)
+
+    # Walk the winning chain back from its last window
+    _, k, i = best
+    _, pointers = _chains(best_run[0], scores, before, closing, slot, budget, best_run[1], keep=True)
+    picked = [i]
+    for layer in range(k - 2, -1, -1):
+        i = int(pointers[layer][i])
+        picked.append(i)
+    return np.asarray(picked[::-1], dtype=np.int64)
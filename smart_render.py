@@ -0,0 +1,533 @@
+"""
+Keyframe-aware cutting ("smart render") on top of the ffmpeg binary bundled
+with imageio-ffmpeg.
+
+Instead of decoding every frame into Python and encoding it again through
+moviepy, the whole GOPs inside a clip window are stream-copied and only the
+partial GOPs at the two boundaries are re-encoded with the selected preset.
+Merged shorts are built the same way, one ffmpeg run joining all windows.
+"""
+import os
+import re
+import shutil
+import socket
+import subprocess
+import tempfile
+
+import numpy as np
+import imageio_ffmpeg
+
+AUDIO_FADE = 0.05  # Seconds of micro-fade at both clip edges (avoids 'pop')
+
+# Encoder name -> codec name as ffmpeg reports it for a source stream
+ENCODER_CODECS = {
+    "h264_nvenc": "h264",
+    "h264_qsv": "h264",
+    "h264_amf": "h264",
+    "libx264": "h264",
+    "hevc_nvenc": "hevc",
+    "hevc_qsv": "hevc",
+    "hevc_amf": "hevc",
+    "libx265": "hevc",
+}
+
+
+def get_ffmpeg_exe():
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def owner_tag():
+    """`<host>.<pid>` of this process, in the names of its work folders and partial
+    outputs, so a cleanup can tell which ones a live process may still be writing."""
+    return f"{socket.gethostname()}.{os.getpid()}"
+
+
+def work_folder(kind, output_path):
+    """New asmr_<kind>_<host>.<pid>_ work folder next to output_path."""
+    return tempfile.mkdtemp(prefix=f"asmr_{kind}_{owner_tag()}_", dir=os.path.dirname(os.path.abspath(output_path)))
+
+
+def run_ffmpeg(args, capture_stdout=False, loglevel="error"):
+    """Run the bundled ffmpeg and raise RuntimeError with its stderr on failure."""
+    cmd = [get_ffmpeg_exe(), "-hide_banner", "-nostdin", "-y", "-loglevel", loglevel] + [str(a) for a in args]
+    proc = subprocess.run(
+        cmd,
+        stdout=subprocess.PIPE if capture_stdout else subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    if proc.returncode != 0:
+        message = proc.stderr.decode(errors="replace").strip()
+        raise RuntimeError(f"ffmpeg exited with code {proc.returncode}: {message}")
+    return proc.stdout if capture_stdout else proc.stderr
+
+
+def _ts(seconds):
+    return f"{max(0.0, seconds):.6f}"
+
+
+def probe_media(video_path):
+    """Return basic stream info parsed from `ffmpeg -i` (ffprobe is not bundled)."""
+    proc = subprocess.run(
+        [get_ffmpeg_exe(), "-hide_banner", "-nostdin", "-i", video_path],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    text = proc.stderr.decode(errors="replace")
+    info = {
+        "duration": None,
+        "start": 0.0,
+        "video_codec": None,
+        "fps": None,
+        "width": None,
+        "height": None,
+        "has_audio": False,
+        "audio_channels": None,
+    }
+
+    m = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?), start: (-?\d+(?:\.\d+)?)", text)
+    if m:
+        h, mnt, s, start = m.groups()
+        info["duration"] = int(h) * 3600 + int(mnt) * 60 + float(s)
+        info["start"] = float(start)
+
+    for line in text.splitlines():
+        if "Stream #" not in line:
+            continue
+        if ": Video:" in line and info["video_codec"] is None:
+            info["video_codec"] = re.search(r": Video: (\w+)", line).group(1)
+            fps = re.search(r"(\d+(?:\.\d+)?) fps", line)
+            if fps:
+                info["fps"] = float(fps.group(1))
+            size = re.search(r", (\d{2,5})x(\d{2,5})", line)
+            if size:
+                info["width"], info["height"] = int(size.group(1)), int(size.group(2))
+        elif ": Audio:" in line and not info["has_audio"]:
+            info["has_audio"] = True
+            layout = re.search(r" Hz, ([^,]+),", line)
+            if layout:
+                layout = layout.group(1)
+                count = re.match(r"(\d+) channels", layout)
+                info["audio_channels"] = (1 if layout == "mono" else 2 if layout == "stereo"
+                                          else int(count.group(1)) if count else None)
+
+    return info
+
+
+class KeyframeIndex:
+    """Presentation times (seconds from file start) of every video frame and keyframe."""
+
+    def __init__(self, frame_times, keyframe_times):
+        self.frame_times = np.asarray(frame_times, dtype=np.float64)
+        self.keyframes = np.asarray(keyframe_times, dtype=np.float64)
+
+    @classmethod
+    def probe(cls, video_path, start=0.0):
+        """Index the first video stream by stream-copying it into ffmpeg's framecrc muxer.
+
+        No frame is decoded, so this costs roughly one read of the file.
+        """
+        out = run_ffmpeg(
+            ["-i", video_path, "-map", "0:v:0", "-c", "copy", "-f", "framecrc", "-"],
+            capture_stdout=True,
+        ).decode(errors="replace")
+
+        time_base = 1.0
+        frames = []
+        keyframes = []
+        for line in out.splitlines():
+            if line.startswith("#tb 0:"):
+                num, den = line.split(":", 1)[1].strip().split("/")
+                time_base = int(num) / int(den)
+                continue
+            if not line or line.startswith("#"):
+                continue
+            fields = [f.strip() for f in line.split(",")]
+            t = int(fields[2]) * time_base - start
+            frames.append(t)
+            # framecrc only prints packet flags when they differ from "keyframe"
+            if len(fields) < 7 or not fields[6].startswith("F="):
+                keyframes.append(t)
+
+        frames.sort()
+        keyframes.sort()
+        return cls(frames, keyframes)
+
+    def next_keyframe(self, t, eps=1e-6):
+        """First keyframe at or after t, or None."""
+        i = np.searchsorted(self.keyframes, t - eps, side="left")
+        return float(self.keyframes[i]) if i < len(self.keyframes) else None
+
+    def prev_keyframe(self, t, eps=1e-6):
+        """Last keyframe at or before t, or None."""
+        i = np.searchsorted(self.keyframes, t + eps, side="right")
+        return float(self.keyframes[i - 1]) if i > 0 else None
+
+    def nearest_keyframe(self, t):
+        before, after = self.prev_keyframe(t), self.next_keyframe(t)
+        if before is None:
+            return after
+        if after is None:
+            return before
+        return before if (t - before) <= (after - t) else after
+
+    def frame_span(self, t0, t1, eps=1e-6):
+        """(start, end) actually covered by the frames with t0 <= pts < t1."""
+        lo = np.searchsorted(self.frame_times, t0 - eps, side="left")
+        hi = np.searchsorted(self.frame_times, t1 - eps, side="left")
+        if hi <= lo:
+            return t0, t1
+        if hi < len(self.frame_times):
+            end = self.frame_times[hi]
+        else:
+            # Last frame of the file: assume it lasts as long as the one before
+            end = self.frame_times[-1] + (self.frame_times[-1] - self.frame_times[-2] if hi > 1 else 0.0)
+        return float(self.frame_times[lo]), float(end)
+
+    def count_frames(self, t0, t1, eps=1e-6):
+        """Number of frames with t0 <= pts < t1."""
+        lo = np.searchsorted(self.frame_times, t0 - eps, side="left")
+        hi = np.searchsorted(self.frame_times, t1 - eps, side="left")
+        return int(max(0, hi - lo))
+
+
+def video_encoder_args(preset, threads):
+    """ffmpeg video encoder options for a GPU_PRESETS entry (same settings moviepy receives)."""
+    return [
+        "-c:v", preset["codec"],
+        "-preset", preset["preset"],
+        preset["quality_param"], preset["quality_value"],
+        "-pix_fmt", "yuv420p",
+        "-threads", str(threads),
+    ] + list(preset["extra_params"])
+
+
+def audio_encoder_args(bitrate):
+    """ffmpeg audio encoder options: AAC in the layout moviepy writes (44.1 kHz stereo).
+
+    Every render path writes this one layout, so normalization gains, which
+    are measured on it (see loudness.window_gains), mean the same everywhere.
+    """
+    return ["-ac", "2", "-ar", "44100", "-c:a", "aac", "-b:a", bitrate]
+
+
+def audio_filter(duration, fade=AUDIO_FADE, gain_db=None):
+    """afade in/out (and optional gain) for a clip of the given duration."""
+    filters = [
+        f"afade=t=in:st=0:d={fade}",
+        f"afade=t=out:st={max(0.0, duration - fade):.6f}:d={fade}",
+    ]
+    if gain_db:
+        filters.append(f"volume={gain_db:.3f}dB")
+    return ",".join(filters)
+
+
+class SmartCutter:
+    """Cuts clip windows out of one source video with the bundled ffmpeg.
+
+    `cut` re-encodes only the boundary GOPs and stream-copies the rest;
+    `cut_copy` is a stream-copy-only preview that snaps both ends to the
+    nearest keyframe. Audio gains (see loudness.py) are passed in per
+    window and applied by ffmpeg's volume filter.
+    """
+
+    def __init__(self, video_path, preset, threads=4, audio_bitrate="320k"):
+        self.video_path = video_path
+        self.preset = preset
+        self.threads = threads
+        self.audio_bitrate = audio_bitrate
+        self.info = probe_media(video_path)
+        if self.info["video_codec"] is None:
+            raise RuntimeError(f"No video stream found in {video_path}")
+        self._index = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = KeyframeIndex.probe(self.video_path, start=self.info["start"])
+        return self._index
+
+    def can_stream_copy(self):
+        """Copied GOPs can only be spliced with re-encoded ones of the same codec."""
+        return ENCODER_CODECS.get(self.preset["codec"]) == self.info["video_codec"]
+
+    def _audio_args(self, duration, gain_db):
+        if not self.info["has_audio"]:
+            return []
+        return [
+            "-af", audio_filter(duration, gain_db=gain_db),
+        ] + audio_encoder_args(self.audio_bitrate)
+
+    def _window_inputs(self, windows):
+        """One input-seeked ffmpeg input per (t_start, t_end) window."""
+        args = []
+        for t_start, t_end in windows:
+            args += ["-ss", _ts(t_start), "-t", _ts(t_end - t_start), "-i", self.video_path]
+        return args
+
+    def _faded_audio(self, input_idx, duration, gain_db, label):
+        """Filter chain fading (and optionally amplifying) the audio of one window input."""
+        return f"[{input_idx}:a:0]asetpts=PTS-STARTPTS,{audio_filter(duration, gain_db=gain_db)}[{label}]"
+
+    def _has_whole_gop(self, t_start, t_end):
+        k_in = self.index.next_keyframe(t_start)
+        k_out = self.index.prev_keyframe(t_end)
+        return k_in is not None and k_out is not None and k_out > k_in
+
+    def _smart_spans(self, t_start, t_end):
+        """(t0, t1, copy) pieces of a window: whole GOPs copied, partial GOPs re-encoded."""
+        if not self._has_whole_gop(t_start, t_end):
+            return [(t_start, t_end, False)]
+        k_in = self.index.next_keyframe(t_start)
+        k_out = self.index.prev_keyframe(t_end)
+        return [(t_start, k_in, False), (k_in, k_out, True), (k_out, t_end, False)]
+
+    def frames_to_encode(self, t_start, t_end):
+        """Frames `cut` re-encodes for the window (the rest are stream-copied)."""
+        if not self.can_stream_copy():
+            return self.index.count_frames(t_start, t_end)
+        return sum(self.index.count_frames(t0, t1)
+                   for t0, t1, copy in self._smart_spans(t_start, t_end) if not copy)
+
+    def _video_parts(self, workdir, spans, name):
+        """Write the video of each span to its own part, ready for the concat demuxer.
+
+        Every part is cut with an exact frame count; copied and re-encoded
+        parts keep SPS/PPS in-band so they can be spliced.
+        """
+        annexb = ["-bsf:v", f"{self.info['video_codec']}_mp4toannexb", "-f", "mp4"]
+        venc = video_encoder_args(self.preset, self.threads)
+        parts = []
+        for i, (t0, t1, copy) in enumerate(spans):
+            n_frames = self.index.count_frames(t0, t1)
+            if not n_frames:
+                continue
+            part = os.path.join(workdir, f"{name}_{i}.mp4")
+            run_ffmpeg(["-ss", _ts(t0), "-i", self.video_path, "-map", "0:v:0", "-frames:v", n_frames]
+                       + (["-c:v", "copy"] if copy else venc) + annexb + [part])
+            parts.append(part)
+        return parts
+
+    def cut_reencode(self, output_path, t_start, t_end, gain_db=None):
+        """Plain ffmpeg re-encode of the window (used when nothing can be copied)."""
+        duration = t_end - t_start
+        run_ffmpeg(
+            ["-ss", _ts(t_start), "-i", self.video_path, "-t", _ts(duration),
+             "-map", "0:v:0", "-map", "0:a:0?"]
+            + video_encoder_args(self.preset, self.threads)
+            + self._audio_args(duration, gain_db)
+            + ["-movflags", "+faststart", output_path]
+        )
+
+    def cut_sweep(self, clips):
+        """Re-encode several (output_path, t_start, t_end, gain_db) windows from one decode of the source.
+
+        The source is seeked once to the first window and decoded up to the
+        end of the last; split/trim filters route every window to its own
+        output and encoder in the same ffmpeg run. Meant for windows close
+        together, where seeking per clip would decode the same GOPs again.
+        Every output gets the source frame rate, square pixels and 44.1 kHz
+        stereo audio, as the clips moviepy renders one by one.
+        """
+        clips = sorted(clips, key=lambda c: c[1])
+        span_start = clips[0][1]
+        span_end = max(clip[2] for clip in clips)
+        has_audio = self.info["has_audio"]
+        n = len(clips)
+
+        graph = [f"[0:v:0]split={n}" + "".join(f"[sv{i}]" for i in range(n))]
+        if has_audio:
+            graph.append(f"[0:a:0]asplit={n}" + "".join(f"[sa{i}]" for i in range(n)))
+        outputs = []
+        for i, (output_path, t_start, t_end, gain_db) in enumerate(clips):
+            t0, t1 = t_start - span_start, t_end - span_start
+            graph.append(f"[sv{i}]trim=start={t0:.6f}:end={t1:.6f},setpts=PTS-STARTPTS,setsar=1[v{i}]")
+            outputs += ["-map", f"[v{i}]"] + video_encoder_args(self.preset, self.threads)
+            if self.info["fps"]:
+                # Filter graph outputs do not carry the source frame rate over
+                outputs += ["-r", self.info["fps"]]
+            if has_audio:
+                graph.append(f"[sa{i}]atrim=start={t0:.6f}:end={t1:.6f},asetpts=PTS-STARTPTS,"
+                             f"{audio_filter(t_end - t_start, gain_db=gain_db)}[a{i}]")
+                outputs += ["-map", f"[a{i}]"] + audio_encoder_args(self.audio_bitrate)
+            outputs += ["-movflags", "+faststart", output_path]
+
+        run_ffmpeg(["-ss", _ts(span_start), "-t", _ts(span_end - span_start + 1.0), "-i", self.video_path,
+                    "-filter_complex", ";".join(graph)] + outputs)
+
+    def cut(self, output_path, t_start, t_end, gain_db=None):
+        """Smart render: copy whole GOPs in [t_start, t_end], re-encode the partial ones."""
+        if not self.can_stream_copy() or not self._has_whole_gop(t_start, t_end):
+            # No complete GOP inside the window (or incompatible codec)
+            self.cut_reencode(output_path, t_start, t_end, gain_db)
+            return
+
+        workdir = work_folder("smart", output_path)
+        try:
+            parts = self._video_parts(workdir, self._smart_spans(t_start, t_end), "part")
+            list_file = write_concat_list(os.path.join(workdir, "parts.txt"), parts)
+
+            # Splice video parts and mux with the (faded) audio window of the source
+            duration = t_end - t_start
+            run_ffmpeg(
+                ["-f", "concat", "-safe", "0", "-i", list_file,
+                 "-ss", _ts(t_start), "-t", _ts(duration), "-i", self.video_path,
+                 "-map", "0:v:0", "-map", "1:a:0?", "-c:v", "copy"]
+                + self._audio_args(duration, gain_db)
+                + ["-movflags", "+faststart", output_path]
+            )
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _copy_window(self, t_start, t_end):
+        """Window snapped to the nearest keyframes (at least one GOP long)."""
+        index = self.index
+        k_start = index.nearest_keyframe(t_start)
+        k_end = index.nearest_keyframe(t_end)
+        if k_start is None:
+            k_start = t_start
+        if k_end is None or k_end <= k_start:
+            # Window shorter than a GOP: keep at least the GOP the start falls in
+            k_end = index.next_keyframe(k_start + 1e-3) or t_end
+        return k_start, k_end
+
+    def cut_copy(self, output_path, t_start, t_end):
+        """Preview cut: stream copy only, both ends snapped to the nearest keyframe."""
+        k_start, k_end = self._copy_window(t_start, t_end)
+        run_ffmpeg(
+            ["-ss", _ts(k_start), "-i", self.video_path, "-t", _ts(k_end - k_start),
+             "-frames:v", self.index.count_frames(k_start, k_end),
+             "-map", "0:v:0", "-map", "0:a:0?", "-c", "copy",
+             "-avoid_negative_ts", "make_zero", "-movflags", "+faststart", output_path]
+        )
+        return k_start, k_end
+
+    def merge_reencode(self, output_path, windows, gains=None):
+        """Render all (t_start, t_end) windows into one video with a single ffmpeg run.
+
+        Each window is its own input-seeked input and a concat filter graph
+        joins them after the audio micro-fades, so only the windows are decoded.
+        `gains` holds an optional gain in dB per window.
+        """
+        has_audio = self.info["has_audio"]
+        gains = gains or [None] * len(windows)
+        graph, labels = [], []
+        for i, (t_start, t_end) in enumerate(windows):
+            graph.append(f"[{i}:v:0]setpts=PTS-STARTPTS[v{i}]")
+            labels.append(f"[v{i}]")
+            if has_audio:
+                graph.append(self._faded_audio(i, t_end - t_start, gains[i], f"a{i}"))
+                labels.append(f"[a{i}]")
+        outputs = "[v][a]" if has_audio else "[v]"
+        graph.append("".join(labels) + f"concat=n={len(windows)}:v=1:a={int(has_audio)}{outputs}")
+
+        args = self._window_inputs(windows) + ["-filter_complex", ";".join(graph), "-map", "[v]"]
+        if has_audio:
+            args += ["-map", "[a]"] + audio_encoder_args(self.audio_bitrate)
+        if self.info["fps"]:
+            # The concat filter does not carry the source frame rate over
+            args += ["-r", self.info["fps"]]
+        run_ffmpeg(args + video_encoder_args(self.preset, self.threads)
+                   + ["-movflags", "+faststart", output_path])
+
+    def merge(self, output_path, windows, gains=None):
+        """Smart render of all windows into one video.
+
+        The copied and re-encoded video parts of every window are spliced by
+        the concat demuxer, and the faded audio windows are joined in the same
+        final ffmpeg run.
+        """
+        if not self.can_stream_copy():
+            self.merge_reencode(output_path, windows, gains)
+            return
+        self._merge_parts(output_path, windows, gains, self._smart_spans)
+
+    def merge_copy(self, output_path, windows, gains=None):
+        """Preview merge: stream copy only, every window snapped to the nearest keyframes."""
+        windows = [self._copy_window(t_start, t_end) for t_start, t_end in windows]
+        self._merge_parts(output_path, windows, gains, lambda t0, t1: [(t0, t1, True)])
+
+    def _merge_parts(self, output_path, windows, gains, spans):
+        # Audio follows the frames each window really contains, so the
+        # spliced video and the joined audio cannot drift apart
+        windows = [self.index.frame_span(t_start, t_end) for t_start, t_end in windows]
+        gains = gains or [None] * len(windows)
+
+        workdir = work_folder("merge", output_path)
+        try:
+            parts = []
+            for i, (t_start, t_end) in enumerate(windows):
+                parts += self._video_parts(workdir, spans(t_start, t_end), f"clip{i:03d}")
+            list_file = write_concat_list(os.path.join(workdir, "parts.txt"), parts)
+
+            args = ["-f", "concat", "-safe", "0", "-i", list_file]
+            if self.info["has_audio"]:
+                graph = [self._faded_audio(i + 1, t_end - t_start, gains[i], f"a{i}")
+                         for i, (t_start, t_end) in enumerate(windows)]
+                labels = "".join(f"[a{i}]" for i in range(len(windows)))
+                graph.append(f"{labels}concat=n={len(windows)}:v=0:a=1[a]")
+                args += self._window_inputs(windows) + [
+                    "-filter_complex", ";".join(graph), "-map", "0:v:0", "-map", "[a]",
+                ] + audio_encoder_args(self.audio_bitrate)
+            else:
+                args += ["-map", "0:v:0"]
+            run_ffmpeg(args + ["-c:v", "copy", "-movflags", "+faststart", output_path])
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def write_concat_list(list_path, files):
+    """Write an ffmpeg concat demuxer list for `files`. Returns list_path."""
+    with open(list_path, "w") as f:
+        for path in files:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    return list_path
+
+
+def concat_files(output_path, files, preset, threads=4, audio_bitrate="320k"):
+    """Join finished clips, possibly cut from different sources, into one video.
+
+    When every clip has the same video codec, size and frame rate, the
+    video is stream-copied through the concat demuxer; otherwise it is
+    re-encoded to the size and frame rate of the first clip (scaled to fit
+    and padded). The audio is always joined by the concat filter, as stereo
+    at 44.1 kHz, so mono and stereo clips can be mixed.
+    """
+    infos = [probe_media(path) for path in files]
+    first = infos[0]
+    same_video = all((i["video_codec"], i["width"], i["height"], i["fps"])
+                     == (first["video_codec"], first["width"], first["height"], first["fps"]) for i in infos)
+
+    # With copied video, input 0 is the concat list and the clips follow
+    offset = 1 if same_video else 0
+    audio = []
+    for i, info in enumerate(infos):
+        if info["has_audio"]:
+            audio.append(f"[{i + offset}:a:0]aformat=sample_rates=44100:channel_layouts=stereo[a{i}]")
+        else:
+            audio.append(f"anullsrc=r=44100:cl=stereo,atrim=duration={info['duration'] or 0.0:.6f}[a{i}]")
+    inputs = []
+    for path in files:
+        inputs += ["-i", path]
+
+    workdir = work_folder("concat", output_path)
+    try:
+        if same_video:
+            list_file = write_concat_list(os.path.join(workdir, "clips.txt"), files)
+            labels = "".join(f"[a{i}]" for i in range(len(files)))
+            graph = audio + [f"{labels}concat=n={len(files)}:v=0:a=1[a]"]
+            args = (["-f", "concat", "-safe", "0", "-i", list_file] + inputs
+                    + ["-filter_complex", ";".join(graph), "-map", "0:v:0", "-map", "[a]", "-c:v", "copy"])
+        else:
+            w, h, fps = first["width"], first["height"], first["fps"] or 30.0
+            graph = [f"[{i}:v:0]scale={w}:{h}:force_original_aspect_ratio=decrease,"
+                     f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={fps}[v{i}]" for i in range(len(files))]
+            graph += audio
+            labels = "".join(f"[v{i}][a{i}]" for i in range(len(files)))
+            graph.append(f"{labels}concat=n={len(files)}:v=1:a=1[v][a]")
+            args = (inputs + ["-filter_complex", ";".join(graph), "-map", "[v]", "-map", "[a]"]
+                    + video_encoder_args(preset, threads))
+        run_ffmpeg(args + audio_encoder_args(audio_bitrate) + ["-movflags", "+faststart", output_path])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return output_path
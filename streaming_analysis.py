@@ -0,0 +1,184 @@
+"""
+Bounded-memory crispness analysis for multi-hour sources.
+
+Audio is decoded and analyzed in overlapping blocks. Raw per-frame features
+are spilled to a temporary memory-mapped file while running per-feature
+peaks and second moments are accumulated; once the whole source has been
+seen, scores are rebuilt block by block into a .npy file. Peaks are then
+detected blockwise with the same rules as scipy.signal.find_peaks on the
+full array. Peak memory stays flat regardless of the source duration.
+"""
+import os
+import tempfile
+
+import numpy as np
+
+import audio_ingest
+from features import WEIGHTS, FeatureEngine, combine_scores, mean_score
+
+BLOCK_SECONDS = 30.0     # Audio decoded/analyzed per step
+PEAK_BLOCK_FRAMES = 1 << 16  # Score frames handled per step when writing/scanning scores
+
+
+class StreamingCrispness:
+    """Accumulates raw crispness features from consecutive audio blocks.
+
+    Call `feed` with consecutive sample blocks, then `finish`, then
+    `write_scores`. Each frame is computed from a window with enough margin on
+    both sides that its value is identical to a full-signal analysis.
+    """
+
+    def __init__(self, sr, hop_length, min_freq=0.0, weights=WEIGHTS, workdir=None):
+        self.sr = sr
+        self.hop_length = hop_length
+        self.weights = weights
+        self.engine = FeatureEngine(sr, hop_length, min_freq)
+
+        self.left_margin, self.right_margin = self.engine.context
+
+        self._buf = np.empty(0, dtype=np.float32)
+        self._buf_start = 0      # Global sample index of self._buf[0]
+        self._next_frame = 0     # First global frame not emitted yet
+        self.n_frames = 0
+
+        self.peaks = np.zeros(3, dtype=np.float64)
+        self.gram = np.zeros((3, 3), dtype=np.float64)
+
+        fd, self._raw_path = tempfile.mkstemp(suffix=".f32", prefix="asmr_features_", dir=workdir)
+        self._raw_file = os.fdopen(fd, "wb")
+        self._raw = None
+
+    def feed(self, samples):
+        self._buf = np.concatenate([self._buf, samples])
+        self._emit(final=False)
+
+    def finish(self):
+        self._emit(final=True)
+        self._buf = np.empty(0, dtype=np.float32)
+        self._raw_file.close()
+        if self.n_frames:
+            self._raw = np.memmap(self._raw_path, dtype=np.float32, mode="r", shape=(self.n_frames, 3))
+        return self.n_frames
+
+    def close(self):
+        self._raw = None
+        if not self._raw_file.closed:
+            self._raw_file.close()
+        try:
+            os.remove(self._raw_path)
+        except OSError:
+            pass
+
+    def _emit(self, final):
+        hop = self.hop_length
+        total = self._buf_start + len(self._buf)
+        if final:
+            end_frame = 1 + total // hop
+        else:
+            end_frame = total // hop - self.right_margin
+        if end_frame <= self._next_frame:
+            return
+
+        first_frame = max(0, self._next_frame - self.left_margin)
+        s0 = first_frame * hop
+        s1 = total if final else min(total, (end_frame + self.right_margin) * hop)
+        segment = self._buf[s0 - self._buf_start:s1 - self._buf_start]
+
+        j0 = self._next_frame - first_frame
+        raw = self.engine.features(segment)[:, j0:j0 + end_frame - self._next_frame]
+
+        # Running normalization statistics
+        self.peaks = np.maximum(self.peaks, np.abs(raw).max(axis=1))
+        raw64 = raw.astype(np.float64)
+        self.gram += raw64 @ raw64.T
+
+        self._raw_file.write(np.ascontiguousarray(raw.T).tobytes())
+        self.n_frames += raw.shape[1]
+        self._next_frame = end_frame
+
+        # Drop samples no future frame depends on
+        keep_from = max(0, self._next_frame - self.left_margin) * hop
+        if keep_from > self._buf_start:
+            self._buf = self._buf[keep_from - self._buf_start:].copy()
+            self._buf_start = keep_from
+
+    def threshold(self, factor=1.2):
+        """Adaptive peak height: factor x mean score (same rule as the in-memory path)."""
+        return self.mean_score() * factor
+
+    def mean_score(self):
+        return mean_score(self.gram, self.n_frames, self.peaks, self.weights)
+
+    def scores(self, start, stop):
+        """Crispness scores for frames [start, stop)."""
+        return combine_scores(np.asarray(self._raw[start:stop]).T, self.peaks, self.weights)
+
+    def write_scores(self, path):
+        """Write the per-frame scores to a .npy file, block by block. Returns a read-only memmap."""
+        out = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(self.n_frames,))
+        for start in range(0, self.n_frames, PEAK_BLOCK_FRAMES):
+            stop = min(self.n_frames, start + PEAK_BLOCK_FRAMES)
+            out[start:stop] = self.scores(start, stop)
+        out.flush()
+        del out
+        return np.load(path, mmap_mode="r")
+
+
+def local_peaks(scores, height):
+    """Local maxima of `scores` above `height`, equal to find_peaks(scores, height=height).
+
+    `scores` can be any sliceable array (e.g. a memmap); it is scanned in
+    blocks and a peak belongs to the block its plateau starts in.
+    """
+    from scipy.signal import find_peaks  # Slow to import; only needed once analysis runs
+    n = len(scores)
+    out_peaks, out_heights = [], []
+    for b0 in range(0, n, PEAK_BLOCK_FRAMES):
+        b1 = min(n, b0 + PEAK_BLOCK_FRAMES)
+        lo = max(0, b0 - 1)
+        pad = 64
+        while True:
+            hi = min(n, b1 + pad)
+            seg = np.asarray(scores[lo:hi])
+            # A plateau reaching the segment end needs more right context
+            if hi == n or len(seg) < 2 or seg[-1] != seg[-2] or pad >= n:
+                break
+            pad *= 4
+
+        idx, props = find_peaks(seg, height=height, plateau_size=1)
+        own = (props["left_edges"] + lo >= b0) & (props["left_edges"] + lo < b1)
+        out_peaks.append(idx[own] + lo)
+        out_heights.append(props["peak_heights"][own])
+
+    if not out_peaks:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.float32)
+    return np.concatenate(out_peaks), np.concatenate(out_heights)
+
+
+def analyze_video(video_path, scores_path, sr=audio_ingest.SAMPLE_RATE, hop_length=512, min_freq=0.0,
+                  weights=WEIGHTS, block_seconds=BLOCK_SECONDS, progress=None, pcm=None):
+    """Stream the audio of `video_path` and write its crispness scores to `scores_path`.
+
+    `progress`, if given, is called with the seconds of audio analyzed so far
+    after every block. With `pcm` (a pcm_store.PCMStore at `sr`), blocks are
+    read from the store instead of an ffmpeg pipe.
+
+    Returns (scores, mean_score) where scores is a read-only memmap of the .npy file.
+    """
+    analyzer = StreamingCrispness(sr, hop_length, min_freq=min_freq, weights=weights,
+                                  workdir=os.path.dirname(os.path.abspath(scores_path)))
+    try:
+        seconds = 0.0
+        if pcm is not None:
+            blocks = pcm.iter_mono_blocks(int(block_seconds * sr))
+        else:
+            blocks = audio_ingest.iter_audio_blocks(video_path, sr, int(block_seconds * sr))
+        for block in blocks:
+            analyzer.feed(block)
+            if progress is not None:
+                seconds += len(block) / sr
+                progress(seconds)
+        analyzer.finish()
+        return analyzer.write_scores(scores_path), analyzer.mean_score()
+    finally:
+        analyzer.close()
@@ -0,0 +1,240 @@
+"""
+Task queue in SQLite, shared by a coordinator and any number of workers.
+
+Tasks are leased rather than popped. A worker that takes a task holds it
+for `lease_seconds` and extends the lease with heartbeats while it works.
+When a worker dies, its lease runs out and the task goes back to the queue
+for another worker. A failed task is retried after a growing delay until
+it has been attempted `max_attempts` times, and is then marked failed.
+
+The database may live on a filesystem shared by several hosts. It keeps
+SQLite's rollback journal instead of WAL (WAL needs memory shared between
+the processes, so it does not work across machines), and every queue
+operation is one short BEGIN IMMEDIATE transaction. File locking must work
+on the shared filesystem, as it does on local disks, NFSv4 and SMB.
+"""
+import contextlib
+import json
+import os
+import socket
+import sqlite3
+import time
+from collections import namedtuple
+
+QUEUE_VERSION = 1
+STATES = ("pending", "leased", "done", "failed")
+
+# One task; payload and result are the JSON-decoded values
+Task = namedtuple("Task", ["id", "kind", "payload", "state", "attempts", "worker", "result", "error"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    key TEXT UNIQUE,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    not_before REAL NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    heartbeat REAL,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, not_before);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_COLUMNS = "id, kind, payload, state, attempts, worker, result, error"
+
+
+def worker_name():
+    """Default worker name: host and process id."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _task(row):
+    task_id, kind, payload, state, attempts, worker, result, error = row
+    return Task(task_id, kind, json.loads(payload), state, attempts, worker,
+                None if result is None else json.loads(result), error)
+
+
+class TaskQueue:
+    """Connection to a task queue; usable as a context manager.
+
+    Connections are not shared between threads: open one per thread.
+    """
+
+    def __init__(self, path, timeout=60.0):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Transactions are explicit (BEGIN IMMEDIATE takes the write lock up front)
+        self.db = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode = DELETE")
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, QUEUE_VERSION):
+            raise RuntimeError(f"{path} is a task queue of version {version}, expected {QUEUE_VERSION}")
+        self.db.executescript(SCHEMA)
+        self.db.execute(f"PRAGMA user_version = {QUEUE_VERSION}")
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+
+    def put(self, kind, payload, key=None, max_attempts=3):
+        """Add a task and return its id.
+
+        A task with the same `key` is not added twice: while it is pending
+        or leased, its id is returned; when it already ended (done or
+        failed), it is queued again with fresh attempts.
+        """
+        now = time.time()
+        with self._transaction():
+            if key is not None:
+                row = self.db.execute("SELECT id, state FROM tasks WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    if row[1] in ("done", "failed"):
+                        self.db.execute(
+                            "UPDATE tasks SET kind = ?, payload = ?, state = 'pending', attempts = 0,"
+                            " max_attempts = ?, not_before = 0, worker = NULL, lease_expires = NULL,"
+                            " result = NULL, error = NULL, updated = ? WHERE id = ?",
+                            (kind, json.dumps(payload), max_attempts, now, row[0]),
+                        )
+                    return row[0]
+            return self.db.execute(
+                "INSERT INTO tasks (key, kind, payload, max_attempts, created, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, kind, json.dumps(payload), max_attempts, now, now),
+            ).lastrowid
+
+    def _expire(self, now):
+        # Leases nobody renewed in time: their worker is gone
+        expired = self.db.execute(
+            "SELECT id, attempts, max_attempts, worker FROM tasks WHERE state = 'leased' AND lease_expires < ?",
+            (now,),
+        ).fetchall()
+        for task_id, attempts, max_attempts, worker in expired:
+            state = "failed" if attempts >= max_attempts else "pending"
+            self.db.execute(
+                "UPDATE tasks SET state = ?, worker = NULL, lease_expires = NULL, error = ?, updated = ? WHERE id = ?",
+                (state, f"lease of {worker} expired", now, task_id),
+            )
+
+    def lease(self, worker, kinds=None, lease_seconds=60.0):
+        """Take the oldest ready task for `worker` (None when there is none).
+
+        Tasks of expired leases are released (or failed, after their last
+        attempt) first. kinds: only lease tasks of these kinds.
+        """
+        now = time.time()
+        with self._transaction():
+            self._expire(now)
+            sql = "SELECT id FROM tasks WHERE state = 'pending' AND not_before <= ?"
+            args = [now]
+            if kinds:
+                sql += f" AND kind IN ({', '.join('?' * len(kinds))})"
+                args += list(kinds)
+            row = self.db.execute(sql + " ORDER BY id LIMIT 1", args).fetchone()
+            if row is None:
+                return None
+            self.db.execute(
+                "UPDATE tasks SET state = 'leased', worker = ?, attempts = attempts + 1, lease_expires = ?,"
+                " heartbeat = ?, updated = ? WHERE id = ?",
+                (worker, now + lease_seconds, now, now, row[0]),
+            )
+            return self.get(row[0])
+
+    def _update_lease(self, task_id, worker, sql, args):
+        # Changes a task only while `worker` still holds its lease
+        with self._transaction():
+            cursor = self.db.execute(sql + " WHERE id = ? AND state = 'leased' AND worker = ?",
+                                     list(args) + [task_id, worker])
+            return cursor.rowcount == 1
+
+    def heartbeat(self, task_id, worker, lease_seconds=60.0):
+        """Extend the lease. False when `worker` lost it (it expired and the task moved on)."""
+        now = time.time()
+        return self._update_lease(task_id, worker, "UPDATE tasks SET lease_expires = ?, heartbeat = ?, updated = ?",
+                                  (now + lease_seconds, now, now))
+
+    def complete(self, task_id, worker, result=None):
+        """Mark a leased task done with a JSON-serializable result. False when the lease was lost."""
+        return self._update_lease(task_id, worker,
+                                  "UPDATE tasks SET state = 'done', lease_expires = NULL, result = ?, updated = ?",
+                                  (json.dumps(result), time.time()))
+
+    def fail(self, task_id, worker, error, retry_delay=10.0):
+        """Record a failed attempt: the task is retried after retry_delay * 2^(attempt - 1)
+        seconds, or failed for good after its last attempt. False when the lease was lost.
+        """
+        now = time.time()
+        return self._update_lease(
+            task_id, worker,
+            "UPDATE tasks SET state = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END,"
+            " not_before = ? * (1 << (attempts - 1)) + ?, worker = NULL, lease_expires = NULL, error = ?, updated = ?",
+            (retry_delay, now, str(error), now),
+        )
+
+    def release(self, task_id, worker):
+        """Give a leased task back without counting the attempt (e.g. when a worker is stopped)."""
+        return self._update_lease(
+            task_id, worker,
+            "UPDATE tasks SET state = 'pending', attempts = attempts - 1, worker = NULL, lease_expires = NULL,"
+            " updated = ?", (time.time(),),
+        )
+
+    def get(self, task_id):
+        row = self.db.execute(f"SELECT {_COLUMNS} FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        return None if row is None else _task(row)
+
+    def tasks(self, ids):
+        """{id: Task} of the given task ids."""
+        ids = list(ids)
+        found = {}
+        # Stay below SQLite's limit on query parameters
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            rows = self.db.execute(f"SELECT {_COLUMNS} FROM tasks WHERE id IN ({', '.join('?' * len(chunk))})",
+                                   chunk)
+            found.update((row[0], _task(row)) for row in rows)
+        return found
+
+    def counts(self):
+        """Number of tasks in every state."""
+        counts = dict.fromkeys(STATES, 0)
+        counts.update(self.db.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state"))
+        return counts
+
+    def clear(self):
+        """Remove every task."""
+        with self._transaction():
+            self.db.execute("DELETE FROM tasks")
+
+    def set_meta(self, name, value):
+        with self._transaction():
+            self.db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+
+    def get_meta(self, name, default=None):
+        row = self.db.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return default if row is None else row[0]
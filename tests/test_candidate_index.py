@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+import pytest
+
+import candidate_index
+from candidate_index import Moment
+
+
+def moment(source, t_event, score):
+    return Moment(source, t_event, score, None, None, None)
+
+
+VIDEOS = {"a.mp4": (60.0, 30.0, 200.0), "b.mp4": (60.0, 30.0, 100.0)}
+
+
+def ranked(moments):
+    return sorted(moments, key=lambda m: -m.score)
+
+
+def length(compilation):
+    return sum(c.t_end - c.t_start for _, c in compilation)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("max_per_video", [None, 1, 3])
+def test_select_compilation_limits(seed, max_per_video):
+    rng = np.random.default_rng(seed)
+    moments = ranked(moment(source, float(t), float(s)) for source in VIDEOS
+                     for t, s in zip(rng.uniform(0, 60, 20), rng.uniform(0, 1, 20)))
+    budget, pre_roll, post_roll, final_extra = 20.0, 1.5, 2.5, 1.0
+    compilation = candidate_index.select_compilation(moments, VIDEOS, budget, pre_roll, post_roll,
+                                                     final_extra, max_per_video)
+    assert compilation and length(compilation) <= budget + 1e-9
+    for source in VIDEOS:
+        clips = [c for s, c in compilation if s == source]
+        if max_per_video is not None:
+            assert len(clips) <= max_per_video
+        for first, second in zip(clips, clips[1:]):
+            assert first.t_end <= second.t_start
+    # Oldest video first, clips in time order within a video
+    sources = [s for s, _ in compilation]
+    assert sources == sorted(sources, key=lambda s: VIDEOS[s][2])
+
+
+def test_select_compilation_picks_best_and_extends_last():
+    moments = ranked([moment("a.mp4", 10.0, 0.9), moment("a.mp4", 11.0, 0.8),
+                      moment("b.mp4", 30.0, 0.7), moment("b.mp4", 59.0, 0.6)])
+    compilation = candidate_index.select_compilation(moments, VIDEOS, 10.0, 1.5, 2.5, final_extra=1.0)
+    # 11.0 overlaps 10.0; 59.0 is clipped at the end of b.mp4 but no longer fits
+    assert [(s, c.t_event) for s, c in compilation] == [("b.mp4", 30.0), ("a.mp4", 10.0)]
+    assert (compilation[-1][1].t_start, compilation[-1][1].t_end) == (8.5, 13.5)
+    assert candidate_index.select_compilation([], VIDEOS, 10.0, 1.5, 2.5) == []
+
+
+@pytest.fixture
+def index(tmp_path):
+    with candidate_index.CandidateIndex(str(tmp_path / "index.sqlite")) as index:
+        yield index
+
+
+def add(index, path, mtime, times, scores, params="p"):
+    with open(path, "wb") as f:
+        f.write(b"video")
+    os.utime(path, (mtime, mtime))
+    index.add_video(path, f"fp-{path}", 60.0, 30.0, times, scores, params=params)
+
+
+def test_index_queries(index, tmp_path):
+    old, new = str(tmp_path / "old.mp4"), str(tmp_path / "sub" / "new.mp4")
+    os.makedirs(tmp_path / "sub")
+    add(index, old, 100.0, [1.0, 2.0], [0.3, 0.9])
+    add(index, new, 200.0, [5.0], [0.5])
+    assert [(m.source, m.score) for m in index.top_moments()] == [(old, 0.9), (new, 0.5), (old, 0.3)]
+    assert [m.source for m in index.top_moments(since=150.0)] == [new]
+    assert [m.source for m in index.top_moments(folder=str(tmp_path / "sub"))] == [new]
+    assert len(list(index.top_moments(limit=2))) == 2
+    assert set(index.videos(since=150.0)) == {new}
+
+    assert index.is_current(old, f"fp-{old}", "p")
+    assert not index.is_current(old, f"fp-{old}", "other params")
+    # Indexing again replaces the candidates
+    add(index, old, 100.0, [4.0], [0.1])
+    assert [m.t_event for m in index.top_moments() if m.source == old] == [4.0]
+
+    os.remove(new)
+    assert index.remove_missing() == [new]
+    assert list(index.videos()) == [old]
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+import coarse_to_fine
+import features
+from streaming_analysis import local_peaks
+
+SR = 22050
+
+
+def bursts(seed, seconds=20, count=30):
+    # Noise bed with short decaying bursts, many of them starting between scan frames
+    rng = np.random.default_rng(seed)
+    y = rng.standard_normal(SR * seconds).astype(np.float32) * 0.02
+    for t in rng.uniform(0.5, seconds - 0.5, count):
+        i = int(t * SR)
+        n = int(rng.integers(1000, 4000))
+        y[i:i + n] += rng.uniform(0.2, 1.0) * rng.standard_normal(n).astype(np.float32) * np.exp(-np.arange(n) / (n / 4))
+    return y
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("hop_length", [128, 256])
+def test_strong_peaks_match_full_pass(seed, hop_length):
+    y = bursts(seed)
+    raw = features.FeatureEngine(SR, hop_length).features(y)
+    scores = features.combine_scores(raw, features.feature_peaks(raw))
+    mean = float(np.mean(scores))
+    frames, heights = local_peaks(scores, mean * 1.2)
+
+    fine_scores, fine_mean, fine_frames, fine_heights = coarse_to_fine.analyze(y, SR, hop_length, peak_threshold=1.2)
+    assert fine_mean == pytest.approx(mean, rel=0.01)
+    # Peaks well above the threshold are found with their full-pass scores;
+    # ones right at it may differ with the estimated mean
+    strong = frames[heights > 1.1 * mean * 1.2]
+    assert len(strong) and np.isin(strong, fine_frames).all()
+    np.testing.assert_allclose(fine_scores[strong], scores[strong], rtol=1e-5)
+    assert (fine_scores > 0).mean() < 0.6
+
+
+def test_too_coarse_hop():
+    assert coarse_to_fine.stride_for(512) is None
+    assert coarse_to_fine.analyze(np.zeros(SR, dtype=np.float32), SR, 512) is None
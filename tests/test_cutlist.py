@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+import cutlist
+from smart_render import run_ffmpeg
+
+CLIPS = [
+    cutlist.Clip(31.6, 29.8, 34.3, 0.917),
+    cutlist.Clip(5.7, 3.9, 8.4, 0.5),
+    cutlist.Clip(3725.0, 3723.2, 3727.7, None),  # Past the hour mark
+]
+
+
+@pytest.fixture(scope="module")
+def source(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("media") / "source.mp4")
+    run_ffmpeg(["-f", "lavfi", "-i", "testsrc=duration=1:size=64x64:rate=30",
+                "-c:v", "libx264", "-pix_fmt", "yuv420p", path])
+    return path
+
+
+def test_clips_in_time_order(source):
+    plan = cutlist.CutList(source, CLIPS, duration=3800.0, fps=30.0)
+    assert [c.t_start for c in plan.clips] == [3.9, 29.8, 3723.2]
+
+
+def test_json_round_trip(source, tmp_path):
+    plan = cutlist.CutList(source, CLIPS, duration=3800.0, fps=30.0, settings={"target_duration": 30.0})
+    path = plan.write_json(str(tmp_path / "cuts.json"))
+    again = cutlist.read(path)
+    assert (again.source, again.clips, again.duration, again.fps, again.settings) == \
+        (plan.source, plan.clips, plan.duration, plan.fps, plan.settings)
+
+
+def test_json_relative_source_and_errors(tmp_path):
+    data = cutlist.CutList("clips/source.mp4", CLIPS[:1]).to_dict()
+    path = tmp_path / "cuts.json"
+    path.write_text(json.dumps(data))
+    assert cutlist.read_json(str(path)).source == str(tmp_path / "clips" / "source.mp4")
+
+    data["clips"][0]["t_end"] = data["clips"][0]["t_start"]
+    with pytest.raises(ValueError):
+        cutlist.from_dict(data)
+    with pytest.raises(ValueError):
+        cutlist.from_dict({"source": "source.mp4"})
+
+
+def test_edl_round_trip(source, tmp_path):
+    plan = cutlist.CutList(source, CLIPS, duration=3800.0, fps=30.0)
+    path = plan.write_edl(str(tmp_path / "cuts.edl"), title="Short")
+    text = open(path).read()
+    assert text.startswith("TITLE: Short\nFCM: NON-DROP FRAME\n")
+    # Record timecodes run back to back
+    assert "001  AX       AA/V  C        00:00:03:27 00:00:08:12 00:00:00:00 00:00:04:15" in text
+    assert "01:02:03:06 01:02:07:21" in text
+
+    again = cutlist.read(path)
+    assert again.source == source and again.fps == 30.0
+    assert len(again.clips) == len(CLIPS)
+    for got, want in zip(again.clips, plan.clips):
+        assert got.t_start == pytest.approx(want.t_start) and got.t_end == pytest.approx(want.t_end)
+        assert (got.t_event, got.score) == (want.t_event, want.score)
+
+
+def test_edl_without_source(tmp_path):
+    path = tmp_path / "cuts.edl"
+    path.write_text("TITLE: Short\n\n001  AX       AA/V  C        00:00:01:00 00:00:02:00 00:00:00:00 00:00:01:00\n")
+    with pytest.raises(ValueError):
+        cutlist.read_edl(str(path))
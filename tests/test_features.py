@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+import features
+
+SR = 22050
+
+
+def signal(seed, seconds=5):
+    rng = np.random.default_rng(seed)
+    y = rng.standard_normal(SR * seconds).astype(np.float32) * 0.05
+    for i in rng.integers(0, len(y) - 2000, 10):
+        y[i:i + 2000] += rng.standard_normal(2000).astype(np.float32) * np.exp(-np.arange(2000) / 500)
+    return y
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("hop_length", [128, 256, 512])
+def test_strided_matches_full_pass(seed, hop_length):
+    y = signal(seed)
+    engine = features.FeatureEngine(SR, hop_length, min_freq=1000.0)
+    full = engine.features(y)
+    stride = 1024 // hop_length
+    strided, span = engine.strided_features(y, stride, span_onset=True)
+    assert strided.shape == (3, -(-full.shape[1] // stride))
+    np.testing.assert_allclose(strided, full[:, ::stride], rtol=1e-4, atol=1e-4)
+    # The flux across a stride is the onset of the same frames one stride apart
+    coarse = features.FeatureEngine(SR, hop_length * stride, min_freq=1000.0).features(y)
+    shift = features.N_FFT // 2 // (hop_length * stride)
+    np.testing.assert_allclose(span[shift + 1:], coarse[0, shift + 1:len(span)], rtol=1e-4, atol=1e-4)
+
+
+def test_strided_rejects_uneven_stride():
+    with pytest.raises(ValueError):
+        features.FeatureEngine(SR, 256).strided_features(signal(0), 3)
+
+
+@pytest.mark.parametrize("hop_length", [128, 512])
+def test_range_and_frames_match_full_pass(hop_length):
+    y = signal(1)
+    engine = features.FeatureEngine(SR, hop_length)
+    full = engine.features(y)
+    n = full.shape[1]
+    for start, stop in [(0, 10), (37, 90), (n - 25, n), (0, n)]:
+        np.testing.assert_allclose(engine.features_range(y, start, stop), full[:, start:stop], rtol=1e-4, atol=1e-4)
+    frames = np.array([n - 1, 3, n // 2, n // 2 + 1, 0, n // 3])
+    np.testing.assert_allclose(engine.features_at(y, frames), full[:, frames], rtol=1e-4, atol=1e-4)
+    assert engine.features_at(y, []).shape == (3, 0)
+
+
+def test_mean_score_from_gram():
+    raw = features.FeatureEngine(SR, 512).features(signal(2))
+    peaks = features.feature_peaks(raw)
+    scores = features.combine_scores(raw, peaks)
+    gram = raw.astype(np.float64) @ raw.T.astype(np.float64)
+    assert features.mean_score(gram, raw.shape[1], peaks) == pytest.approx(float(np.mean(scores)), rel=1e-5)
+    assert scores.max() <= 1.0 + 1e-6
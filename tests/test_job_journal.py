@@ -0,0 +1,181 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import cutlist
+import job_journal
+import smart_render
+from smart_render import run_ffmpeg
+
+SETTINGS = {"target_duration": 30.0, "render_mode": "smart"}
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "source.mp4"
+    path.write_bytes(b"source video" * 100)
+    return str(path)
+
+
+@pytest.fixture
+def folder(tmp_path):
+    return str(tmp_path / "out")
+
+
+@pytest.fixture(scope="module")
+def media(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("media") / "clip.mp4")
+    run_ffmpeg(["-f", "lavfi", "-i", "testsrc=duration=1:size=64x64:rate=10",
+                "-c:v", "libx264", "-pix_fmt", "yuv420p", path])
+    return path
+
+
+def journal_lines(folder):
+    with open(os.path.join(folder, job_journal.JOURNAL_NAME)) as f:
+        return f.read().splitlines()
+
+
+def test_resume_keeps_plan_and_outputs(source, folder):
+    journal = job_journal.JobJournal(folder, source, SETTINGS)
+    plan = cutlist.CutList(source, [cutlist.Clip(5.0, 3.8, 6.3, 0.9)], duration=60.0, fps=30.0)
+    journal.record_plan(plan)
+    journal.record("output", file="clip_001.mp4", bytes=10, windows=[[3.8, 6.3]])
+
+    resumed = job_journal.JobJournal(folder, source, SETTINGS)
+    assert [r["event"] for r in resumed.records] == ["start", "plan", "output"]
+    assert resumed.cut_list().clips == plan.clips
+    assert not resumed.finished
+    resumed.finish()
+    assert job_journal.JobJournal(folder, source, SETTINGS).finished
+
+
+def test_other_settings_or_source_start_over(source, folder):
+    job_journal.JobJournal(folder, source, SETTINGS).record("plan", cut_list={})
+    assert job_journal.JobJournal(folder, source, dict(SETTINGS, render_mode="copy")).records == []
+    with open(source, "ab") as f:
+        f.write(b"more")
+    journal = job_journal.JobJournal(folder, source, SETTINGS)
+    assert journal.records == [] and journal.cut_list() is None
+    # The first record replaces the stale journal
+    journal.record("plan", cut_list={})
+    assert len(journal_lines(folder)) == 2
+
+
+def test_reset_starts_over(source, folder):
+    journal = job_journal.JobJournal(folder, source, SETTINGS)
+    journal.record("plan", cut_list={})
+    journal.finish()
+    journal = job_journal.JobJournal(folder, source, SETTINGS)
+    journal.reset()
+    assert not journal.finished
+    journal.record("plan", cut_list={})
+    assert [json.loads(line)["event"] for line in journal_lines(folder)] == ["start", "plan"]
+
+
+def test_torn_last_line(source, folder):
+    journal = job_journal.JobJournal(folder, source, SETTINGS)
+    journal.record("output", file="clip_001.mp4", bytes=10, windows=[[1.0, 2.0]])
+    # Crash in the middle of writing a record
+    with open(journal.path, "a") as f:
+        f.write('{"event": "output", "file": "clip_0')
+
+    resumed = job_journal.JobJournal(folder, source, SETTINGS)
+    assert [r["event"] for r in resumed.records] == ["start", "output"]
+    resumed.record("output", file="clip_002.mp4", bytes=10, windows=[[3.0, 4.0]])
+
+    lines = journal_lines(folder)
+    assert lines[2].startswith('{"event": "output", "file": "clip_0') and len(lines) == 4
+    again = job_journal.JobJournal(folder, source, SETTINGS)
+    assert [r.get("file") for r in again.records] == [None, "clip_001.mp4", "clip_002.mp4"]
+
+
+def test_has_output_checks_file(source, folder, media):
+    os.makedirs(folder)
+    path = os.path.join(folder, "clip_001.mp4")
+    with open(media, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data)
+    journal = job_journal.JobJournal(folder, source, SETTINGS)
+    journal.record_output(path, [(1.0, 2.0)])
+
+    assert journal.has_output(path, [(1.0, 2.0)])
+    assert not journal.has_output(path, [(1.0, 2.5)])
+    assert not journal.has_output(os.path.join(folder, "clip_002.mp4"), [(1.0, 2.0)])
+    # Same size, unreadable container
+    with open(path, "wb") as f:
+        f.write(b"\0" * len(data))
+    assert not journal.has_output(path, [(1.0, 2.0)])
+    with open(path, "wb") as f:
+        f.write(data[:len(data) // 2])
+    assert not journal.has_output(path, [(1.0, 2.0)])
+
+
+def test_atomic_output(tmp_path):
+    path = str(tmp_path / "clip.mp4")
+    with job_journal.atomic_output(path) as part:
+        assert os.path.basename(part).startswith(job_journal.PARTIAL_PREFIX)
+        assert f".{os.getpid()}." in part and part.endswith(".mp4")
+        with open(part, "w") as f:
+            f.write("whole")
+    assert open(path).read() == "whole" and not os.path.exists(part)
+
+    with pytest.raises(RuntimeError):
+        with job_journal.atomic_output(path) as part:
+            with open(part, "w") as f:
+                f.write("half")
+            raise RuntimeError("encoder died")
+    assert open(path).read() == "whole" and not os.path.exists(part)
+
+
+def test_atomic_output_cancelled(tmp_path):
+    path = str(tmp_path / "clip.mp4")
+    cancel = threading.Event()
+    with pytest.raises(job_journal.Cancelled):
+        with job_journal.atomic_output(path, cancel) as part:
+            with open(part, "w") as f:
+                f.write("stale")
+            cancel.set()
+    assert os.listdir(tmp_path) == []
+    with pytest.raises(job_journal.Cancelled):
+        with job_journal.atomic_output(path, cancel):
+            pytest.fail("cancelled outputs are not started")
+
+
+@pytest.fixture(scope="module")
+def dead_pid():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+def test_remove_leftovers(tmp_path, dead_pid):
+    host = socket.gethostname()
+    dead = [f".partial-{host}.{dead_pid}.clip_001.mp4", f"asmr_smart_{host}.{dead_pid}_x1"]
+    kept = [
+        f".partial-{host}.{os.getpid()}.clip_002.mp4",  # Still being written by a live process
+        f"asmr_merge_{host}.{os.getpid()}_x2",
+        f".partial-{host}x.{dead_pid}.clip_003.mp4",  # Other hosts sharing the folder
+        f".partial-other-host.{dead_pid}.clip_003.mp4",
+        "clip_004.mp4",
+        ".asmr_job.jsonl",
+    ]
+    for name in dead + kept:
+        if name.startswith("asmr_"):
+            (tmp_path / name).mkdir()
+        else:
+            (tmp_path / name).write_text("x")
+    assert job_journal.remove_leftovers(str(tmp_path)) == 2
+    assert sorted(os.listdir(tmp_path)) == sorted(kept)
+    assert job_journal.remove_leftovers(str(tmp_path / "missing")) == 0
+
+
+def test_work_folders_are_owned(tmp_path):
+    folder = smart_render.work_folder("smart", str(tmp_path / "clip.mp4"))
+    assert os.path.basename(folder).startswith(f"asmr_smart_{smart_render.owner_tag()}_")
+    assert job_journal.remove_leftovers(str(tmp_path)) == 0
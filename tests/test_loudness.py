@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+import loudness
+
+
+def tone(seconds, sr, amplitude, channels=2, freq=997.0):
+    t = np.arange(int(seconds * sr)) / sr
+    wave = (amplitude * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+    return np.repeat(wave[:, np.newaxis], channels, axis=1)
+
+
+@pytest.mark.parametrize("sr", [44100, 48000])
+def test_reference_tone(sr):
+    # EBU Tech 3341: a 997 Hz stereo sine at -23 dBFS per channel reads -23 LUFS
+    batch, lengths = loudness.gather([tone(5.0, sr, 10 ** (-23 / 20))])
+    assert loudness.loudness_levels(batch, lengths, sr)[0] == pytest.approx(-23.0, abs=0.1)
+    # Full scale in one channel reads -3.01 LUFS
+    batch, lengths = loudness.gather([tone(5.0, sr, 1.0, channels=1)])
+    assert loudness.loudness_levels(batch, lengths, sr)[0] == pytest.approx(-3.01, abs=0.1)
+
+
+def test_gating_ignores_silence():
+    sr = 48000
+    quiet = np.concatenate([tone(3.0, sr, 10 ** (-23 / 20)), np.zeros((3 * sr, 2), dtype=np.float32)])
+    batch, lengths = loudness.gather([quiet])
+    # Ungated it would read -26 LUFS; only the few blocks straddling the end of the tone count below -23
+    assert loudness.loudness_levels(batch, lengths, sr)[0] == pytest.approx(-23.0, abs=0.3)
+
+
+def test_clip_gains():
+    sr = 48000
+    clicked = tone(2.0, sr, 10 ** (-23 / 20))
+    clicked[sr] = 0.5
+    clips = [tone(2.0, sr, 10 ** (-23 / 20)), clicked, np.zeros((sr, 2), dtype=np.float32)]
+    peak = loudness.clip_gains(clips, sr, mode="peak")
+    assert peak[0] == pytest.approx(23.0, abs=0.01) and peak[1] == pytest.approx(6.02, abs=0.01)
+    assert peak[2] is None
+    lufs = loudness.clip_gains(clips, sr, mode="lufs", target_lufs=-16.0, max_peak_db=-1.0)
+    assert lufs[0] == pytest.approx(7.0, abs=0.1)
+    # Limited by the peak ceiling: the click peaks at -6 dBFS
+    assert lufs[1] == pytest.approx(5.02, abs=0.01)
+    assert lufs[2] is None
+    with pytest.raises(ValueError):
+        loudness.clip_gains(clips, sr, mode="rms")
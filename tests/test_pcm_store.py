@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+import pytest
+
+import audio_ingest
+import loudness
+import pcm_store
+from smart_render import run_ffmpeg
+
+SR = 44100
+
+
+def make_source(path, expr):
+    run_ffmpeg(["-f", "lavfi", "-i", f"aevalsrc={expr}:s={SR}:d=2",
+                "-f", "lavfi", "-i", "testsrc=duration=2:size=64x64:rate=10",
+                "-c:v", "libx264", "-pix_fmt", "yuv420p", "-c:a", "aac", "-shortest", path])
+    return path
+
+
+@pytest.fixture(scope="module")
+def stereo_source(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("media") / "stereo.mp4")
+    return make_source(path, "0.5*sin(2*PI*440*t)|0.25*sin(2*PI*660*t)")
+
+
+@pytest.fixture(scope="module")
+def mono_source(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("media") / "mono.mp4")
+    return make_source(path, "0.5*sin(2*PI*440*t)")
+
+
+def test_mono_matches_ffmpeg_downmix(stereo_source, tmp_path):
+    store = pcm_store.PCMStore(stereo_source, SR, root=str(tmp_path))
+    assert store.channels == 2 and store.fits()
+    y, _ = audio_ingest.load_audio(stereo_source, sr=SR)
+    assert len(store) == len(y)
+    np.testing.assert_allclose(store.mono(), y, atol=1e-5)
+    signal = store.mono_signal()
+    np.testing.assert_array_equal(signal[1000:5000], store.mono(1000, 5000))
+    blocks = list(store.iter_mono_blocks(SR // 2))
+    np.testing.assert_array_equal(np.concatenate(blocks), store.mono())
+
+
+def test_stereo_matches_ffmpeg_upmix(mono_source, tmp_path):
+    store = pcm_store.PCMStore(mono_source, SR, root=str(tmp_path))
+    assert store.channels == 1
+    window = store.stereo(0.5, 1.5)
+    decoded = loudness.decode_window(mono_source, 0.5, 1.5)
+    assert window.shape == (SR, 2)
+    # ffmpeg's seek and our slice can be a few samples apart: compare levels, not samples
+    np.testing.assert_allclose(np.abs(window).max(axis=0), np.abs(decoded).max(axis=0), rtol=1e-3)
+
+
+def test_clip_audio_fades(stereo_source, tmp_path):
+    store = pcm_store.PCMStore(stereo_source, SR, root=str(tmp_path))
+    audio = store.clip_audio(0.5, 1.5, fade=0.05)
+    window = np.asarray(store.window(0.5, 1.5))
+    assert audio.shape == window.shape
+    assert np.all(audio[0] == 0.0)
+    np.testing.assert_array_equal(audio[SR // 4:3 * SR // 4], window[SR // 4:3 * SR // 4])
+    ramp = np.arange(SR // 20) / (SR // 20)
+    np.testing.assert_allclose(audio[:SR // 20, 0], window[:SR // 20, 0] * ramp, atol=1e-6)
+    louder = store.clip_audio(0.5, 1.5, fade=0.05, gain_db=6.0)
+    np.testing.assert_allclose(louder, audio * 10 ** (6.0 / 20), rtol=1e-5, atol=1e-7)
+
+
+def test_decoded_once_and_evicted(stereo_source, mono_source, tmp_path):
+    root = str(tmp_path)
+    first = pcm_store.PCMStore(stereo_source, SR, root=root)
+    first.samples
+    path = first._path()
+    mtime = os.path.getmtime(path)
+    os.utime(path, (mtime - 100, mtime - 100))
+    assert pcm_store.PCMStore(stereo_source, SR, root=root).samples.filename == os.path.abspath(path)
+
+    # Too small for both: the least recently used store goes
+    size = os.path.getsize(path)
+    os.utime(path, (mtime - 100, mtime - 100))
+    second = pcm_store.PCMStore(mono_source, SR, root=root, max_bytes=size)
+    second.samples
+    assert os.path.exists(second._path()) and not os.path.exists(path)
@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+import render_cache
+
+PARAMS = {"render_mode": "smart", "preset": "fast", "fade": 0.05}
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "source.mp4"
+    path.write_bytes(b"source video" * 100)
+    return str(path)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return render_cache.RenderCache(str(tmp_path / "cache"))
+
+
+def rendered(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_keys(cache, source):
+    base = cache.source_key(source, PARAMS)
+    assert cache.source_key(source, dict(PARAMS)) == base
+    assert cache.source_key(source, dict(PARAMS, preset="slow")) != base
+    key = cache.key(base, [(1.0, 3.5)])
+    # Float noise below a microsecond is the same window
+    assert cache.key(base, [(1.0000000001, 3.5)]) == key
+    assert cache.key(base, [(1.0, 3.6)]) != key
+    assert cache.key(base, [(1.0, 3.5), (5.0, 7.0)]) != key
+    with open(source, "ab") as f:
+        f.write(b"edited")
+    assert cache.source_key(source, PARAMS) != base
+
+
+def test_store_and_fetch(cache, source, tmp_path):
+    key = cache.key(cache.source_key(source, PARAMS), [(1.0, 3.5)])
+    dest = str(tmp_path / "clip_001.mp4")
+    assert not cache.fetch(key, dest) and not os.path.exists(dest)
+    cache.store(key, rendered(tmp_path, "render.mp4", b"encoded clip"))
+    assert cache.fetch(key, dest)
+    assert open(dest, "rb").read() == b"encoded clip"
+    # The output is a copy: editing it leaves the cache entry intact
+    with open(dest, "ab") as f:
+        f.write(b" edited")
+    other = str(tmp_path / "clip_002.mp4")
+    assert cache.fetch(key, other) and open(other, "rb").read() == b"encoded clip"
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = render_cache.RenderCache(str(tmp_path / "cache"), max_bytes=250)
+    for n, key in enumerate(["aa01", "bb02"]):
+        cache.store(key, rendered(tmp_path, f"{key}.mp4", b"x" * 100))
+        os.utime(cache._path(key), (1000 + n, 1000 + n))
+    # Fetching the older entry makes it the most recently used
+    assert cache.fetch("aa01", str(tmp_path / "out.mp4"))
+    cache.store("cc03", rendered(tmp_path, "cc03.mp4", b"x" * 100))
+    dest = str(tmp_path / "out2.mp4")
+    assert cache.fetch("aa01", dest) and cache.fetch("cc03", dest)
+    assert not cache.fetch("bb02", dest)
+    # An entry larger than the limit is still kept while it is the newest
+    cache.store("dd04", rendered(tmp_path, "dd04.mp4", b"x" * 300))
+    assert cache.fetch("dd04", dest) and not cache.fetch("aa01", dest)
@@ -0,0 +1,82 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import main
+import selection
+
+SR = 44100
+
+
+def frames(times, hop_length=main.HOP_LENGTH):
+    return np.round(np.asarray(times) * SR / hop_length).astype(np.int64)
+
+
+def test_select_moments_drops_edge_artifacts():
+    # 60 s source, 8.5 s budget: two strong events leave room for a short head
+    # window, which an onset-flux artifact right at the start would fill
+    config = main.job_config(target_duration=8.5)
+    times = [0.03, 5.71, 31.61, 59.99]
+    scores = [0.195, 0.917, 0.917, 0.5]
+    moments = main.select_moments(frames(times), scores, SR, 60.0, config)
+    assert [round(t, 1) for t, _ in moments] == [5.7, 31.6]
+
+
+def test_select_moments_keeps_events_past_the_context():
+    config = main.job_config(target_duration=8.5)
+    left, _ = main.features.frame_context(config.hop_length)
+    times = [(left + 1) * config.hop_length / SR, 5.71, 31.61]
+    moments = main.select_moments(frames(times), [0.195, 0.917, 0.917], SR, 60.0, config)
+    assert len(moments) == 3
+
+
+def test_indexed_candidates_drop_edge_artifacts(tmp_path, monkeypatch):
+    video = tmp_path / "source.mp4"
+    video.write_bytes(b"video")
+    config = main.job_config(target_duration=8.5, candidate_index_path=str(tmp_path / "index.sqlite"))
+    monkeypatch.setattr(main, "candidate_features", lambda *args: None)
+    times = [0.03, 5.71, 31.61, 59.99]
+    info = {"duration": 60.0, "fps": 30.0}
+    main.index_candidates(str(video), (frames(times), [0.195, 0.917, 0.917, 0.5]), info, config, SR)
+    compilation = main.plan_compilation(config)
+    assert [round(c.t_event, 1) for _, c in compilation] == [5.7, 31.6]
+
+
+def brute_force(times, scores, budget, pre_roll, post_roll, final_extra, duration):
+    """Best total score over every subset of candidates (small inputs only)."""
+    starts = np.maximum(0.0, times - pre_roll)
+    ends = np.minimum(duration, times + post_roll)
+    closing = np.minimum(duration, times + post_roll + final_extra) - starts
+    best = 0.0
+    for mask in itertools.product([False, True], repeat=len(times)):
+        picked = np.flatnonzero(mask)
+        if len(picked) == 0:
+            continue
+        if np.any(ends[picked[:-1]] > starts[picked[1:]] + selection.EPSILON):
+            continue
+        length = np.sum(ends[picked[:-1]] - starts[picked[:-1]]) + closing[picked[-1]]
+        if length <= budget + selection.EPSILON:
+            best = max(best, float(np.sum(scores[picked])))
+    return best
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_select_windows_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(1, 10))
+    duration = float(rng.uniform(8.0, 30.0))
+    times = np.sort(rng.uniform(0.0, duration, n))
+    scores = rng.uniform(0.1, 1.0, n)
+    budget = float(rng.uniform(2.0, 15.0))
+    args = (budget, 1.2, 1.3, 2.0, duration)
+
+    picked = selection.select_windows(times, scores, *args)
+    assert list(picked) == sorted(picked)
+    if len(picked):
+        starts = np.maximum(0.0, times[picked] - 1.2)
+        ends = np.minimum(duration, times[picked] + 1.3)
+        assert np.all(ends[:-1] <= starts[1:] + selection.EPSILON)
+        length = np.sum(ends[:-1] - starts[:-1]) + min(duration, times[picked[-1]] + 3.3) - starts[-1]
+        assert length <= budget + selection.EPSILON
+    assert np.sum(scores[picked]) == pytest.approx(brute_force(times, scores, *args))
@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+import smart_render
+from smart_render import KeyframeIndex, SmartCutter, probe_media, run_ffmpeg
+
+PRESET = {"codec": "libx264", "quality_param": "-crf", "quality_value": "23", "preset": "ultrafast",
+          "extra_params": []}
+
+
+@pytest.fixture(scope="module")
+def source(tmp_path_factory):
+    # 6 s at 30 fps with a keyframe every second, mono audio
+    path = str(tmp_path_factory.mktemp("media") / "source.mp4")
+    run_ffmpeg(["-f", "lavfi", "-i", "testsrc=duration=6:size=64x64:rate=30",
+                "-f", "lavfi", "-i", "sine=frequency=440:duration=6",
+                "-c:v", "libx264", "-g", "30", "-keyint_min", "30", "-sc_threshold", "0",
+                "-pix_fmt", "yuv420p", "-c:a", "aac", "-shortest", path])
+    return path
+
+
+def frames_of(path):
+    return len(KeyframeIndex.probe(path).frame_times)
+
+
+def test_keyframe_index():
+    index = KeyframeIndex([n / 10 for n in range(30)], [0.0, 1.0, 2.0])
+    assert (index.next_keyframe(0.5), index.next_keyframe(1.0), index.next_keyframe(2.5)) == (1.0, 1.0, None)
+    assert (index.prev_keyframe(0.5), index.prev_keyframe(1.0), index.prev_keyframe(-0.1)) == (0.0, 1.0, None)
+    assert (index.nearest_keyframe(1.4), index.nearest_keyframe(1.6), index.nearest_keyframe(1.5)) == (1.0, 2.0, 1.0)
+    assert index.count_frames(0.5, 1.0) == 5
+    assert index.frame_span(0.45, 0.95) == pytest.approx((0.5, 1.0))
+    # The last frame lasts as long as the one before it
+    assert index.frame_span(2.8, 5.0) == pytest.approx((2.8, 3.0))
+
+
+def test_audio_filter():
+    assert smart_render.audio_filter(2.0) == "afade=t=in:st=0:d=0.05,afade=t=out:st=1.950000:d=0.05"
+    assert smart_render.audio_filter(2.0, gain_db=-3.25).endswith(",volume=-3.250dB")
+    assert smart_render.audio_encoder_args("192k") == ["-ac", "2", "-ar", "44100", "-c:a", "aac", "-b:a", "192k"]
+
+
+def test_probe(source):
+    info = probe_media(source)
+    assert (info["video_codec"], info["fps"], info["has_audio"], info["audio_channels"]) == ("h264", 30.0, True, 1)
+    assert info["duration"] == pytest.approx(6.0, abs=0.1)
+    index = KeyframeIndex.probe(source, start=info["start"])
+    assert len(index.frame_times) == 180
+    assert list(index.keyframes) == pytest.approx([0.0, 1.0, 2.0, 3.0, 4.0, 5.0])
+
+
+def test_smart_cut(source, tmp_path):
+    cutter = SmartCutter(source, PRESET, threads=1)
+    assert cutter.can_stream_copy()
+    # Only the partial GOPs at both ends are encoded
+    assert cutter.frames_to_encode(1.5, 4.5) == 30
+    output = str(tmp_path / "clip.mp4")
+    cutter.cut(output, 1.5, 4.5, gain_db=-2.0)
+    info = probe_media(output)
+    assert frames_of(output) == 90 and info["audio_channels"] == 2
+    assert info["duration"] == pytest.approx(3.0, abs=0.1)
+    assert not [n for n in os.listdir(tmp_path) if n.startswith("asmr_")]
+
+
+def test_copy_cut_snaps_to_keyframes(source, tmp_path):
+    cutter = SmartCutter(source, PRESET, threads=1)
+    output = str(tmp_path / "preview.mp4")
+    assert cutter.cut_copy(output, 1.4, 3.6) == (1.0, 4.0)
+    assert frames_of(output) == 90
+
+
+@pytest.mark.parametrize("method", ["merge", "merge_reencode"])
+def test_merge(source, tmp_path, method):
+    cutter = SmartCutter(source, PRESET, threads=1)
+    output = str(tmp_path / "merged.mp4")
+    getattr(cutter, method)(output, [(0.5, 2.5), (3.5, 5.0)], gains=[None, 3.0])
+    info = probe_media(output)
+    assert frames_of(output) == 105 and info["audio_channels"] == 2
+    assert info["duration"] == pytest.approx(3.5, abs=0.1)
+
+
+def test_sweep(source, tmp_path):
+    cutter = SmartCutter(source, PRESET, threads=1)
+    clips = [(str(tmp_path / f"clip_{n}.mp4"), t0, t0 + 1.5, None) for n, t0 in enumerate([3.0, 0.5])]
+    cutter.cut_sweep(clips)
+    for path, _, _, _ in clips:
+        info = probe_media(path)
+        assert frames_of(path) == 45 and info["fps"] == 30.0 and info["audio_channels"] == 2
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from scipy.signal import find_peaks
+
+import streaming_analysis
+
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    # Many block boundaries in short arrays
+    monkeypatch.setattr(streaming_analysis, "PEAK_BLOCK_FRAMES", 50)
+
+
+def scores(seed, n=2000, levels=6):
+    # Few distinct values: plenty of plateaus and ties, some across block boundaries
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, levels, n).astype(np.float32)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_local_peaks_match_find_peaks(seed):
+    y = scores(seed)
+    peaks, heights = streaming_analysis.local_peaks(y, 2.0)
+    expected, props = find_peaks(y, height=2.0)
+    np.testing.assert_array_equal(peaks, expected)
+    np.testing.assert_array_equal(heights, props["peak_heights"])
+
+
+def test_local_peaks_long_plateaus():
+    y = np.zeros(1000, dtype=np.float32)
+    y[40:260] = 3.0   # Plateau spanning several blocks
+    y[300] = 5.0
+    y[899:] = 4.0     # Plateau running into the end of the array: not a peak
+    y[598:601] = 2.0  # Plateau starting just before a block boundary
+    peaks, _ = streaming_analysis.local_peaks(y, 1.0)
+    expected, _ = find_peaks(y, height=1.0)
+    np.testing.assert_array_equal(peaks, expected)
+
+
+def test_local_peaks_empty():
+    peaks, heights = streaming_analysis.local_peaks(np.zeros(0, dtype=np.float32), 1.0)
+    assert len(peaks) == 0 and len(heights) == 0
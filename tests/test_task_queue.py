@@ -0,0 +1,133 @@
+import pytest
+
+import task_queue
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(task_queue.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path):
+    with task_queue.TaskQueue(str(tmp_path / "queue.sqlite")) as queue:
+        yield queue
+
+
+def test_lease_and_complete(queue, clock):
+    task_id = queue.put("render", {"clip": 1})
+    task = queue.lease("a", lease_seconds=10)
+    assert (task.id, task.payload, task.state, task.attempts, task.worker) == (task_id, {"clip": 1}, "leased", 1, "a")
+    assert queue.lease("b", lease_seconds=10) is None
+    assert queue.complete(task_id, "a", {"bytes": 5})
+    done = queue.get(task_id)
+    assert (done.state, done.result) == ("done", {"bytes": 5})
+    assert queue.counts() == {"pending": 0, "leased": 0, "done": 1, "failed": 0}
+
+
+def test_lease_kinds(queue, clock):
+    queue.put("analyze", {})
+    render_id = queue.put("render", {})
+    assert queue.lease("a", kinds=["render"]).id == render_id
+
+
+def test_expired_lease_goes_to_another_worker(queue, clock):
+    task_id = queue.put("render", {})
+    queue.lease("a", lease_seconds=10)
+    clock.now += 11
+    task = queue.lease("b", lease_seconds=10)
+    assert (task.id, task.worker, task.attempts) == (task_id, "b", 2)
+    # The first worker lost the task: nothing it reports counts
+    assert not queue.heartbeat(task_id, "a", 10)
+    assert not queue.complete(task_id, "a", "stale")
+    assert not queue.fail(task_id, "a", "stale")
+    assert queue.complete(task_id, "b", "fresh")
+    assert queue.get(task_id).result == "fresh"
+
+
+def test_heartbeat_extends_lease(queue, clock):
+    task_id = queue.put("render", {})
+    queue.lease("a", lease_seconds=10)
+    clock.now += 8
+    assert queue.heartbeat(task_id, "a", 10)
+    clock.now += 8  # 16 s after the lease, 8 s after the heartbeat
+    assert queue.lease("b", lease_seconds=10) is None
+    clock.now += 3
+    assert queue.lease("b", lease_seconds=10).id == task_id
+
+
+def test_expired_last_attempt_fails(queue, clock):
+    task_id = queue.put("render", {}, max_attempts=1)
+    queue.lease("a", lease_seconds=10)
+    clock.now += 11
+    assert queue.lease("b") is None
+    task = queue.get(task_id)
+    assert task.state == "failed" and "expired" in task.error
+
+
+def test_fail_retries_with_backoff(queue, clock):
+    task_id = queue.put("render", {}, max_attempts=3)
+    queue.lease("a")
+    assert queue.fail(task_id, "a", "boom", retry_delay=5)
+    assert queue.get(task_id).state == "pending"
+    clock.now += 4
+    assert queue.lease("a") is None
+    clock.now += 2
+    assert queue.lease("a").attempts == 2
+    queue.fail(task_id, "a", "boom", retry_delay=5)
+    clock.now += 9  # Second retry waits twice as long
+    assert queue.lease("a") is None
+    clock.now += 2
+    assert queue.lease("a").attempts == 3
+    queue.fail(task_id, "a", "boom again", retry_delay=5)
+    task = queue.get(task_id)
+    assert (task.state, task.error) == ("failed", "boom again")
+    clock.now += 1000
+    assert queue.lease("a") is None
+
+
+def test_release_does_not_count_attempt(queue, clock):
+    task_id = queue.put("render", {})
+    queue.lease("a")
+    assert queue.release(task_id, "a")
+    task = queue.lease("b")
+    assert (task.id, task.attempts) == (task_id, 1)
+
+
+def test_keyed_put(queue, clock):
+    task_id = queue.put("render", {"n": 1}, key="clip-1")
+    assert queue.put("render", {"n": 2}, key="clip-1") == task_id
+    assert queue.get(task_id).payload == {"n": 1}
+    queue.lease("a")
+    queue.complete(task_id, "a")
+    # An ended task is queued again with fresh attempts
+    assert queue.put("render", {"n": 3}, key="clip-1") == task_id
+    task = queue.get(task_id)
+    assert (task.state, task.attempts, task.payload) == ("pending", 0, {"n": 3})
+
+
+def test_tasks_and_meta(queue, clock):
+    ids = [queue.put("render", {"n": n}) for n in range(600)]
+    tasks = queue.tasks(ids)
+    assert len(tasks) == 600 and tasks[ids[-1]].payload == {"n": 599}
+    assert queue.get_meta("closed") is None
+    queue.set_meta("closed", "1")
+    assert queue.get_meta("closed") == "1"
+
+
+def test_shared_between_connections(tmp_path, clock):
+    path = str(tmp_path / "queue.sqlite")
+    with task_queue.TaskQueue(path) as a, task_queue.TaskQueue(path) as b:
+        task_id = a.put("render", {})
+        assert b.lease("b").id == task_id
+        assert a.lease("a") is None
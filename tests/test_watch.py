@@ -0,0 +1,44 @@
+import pytest
+
+import watch
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(watch.time, "time", clock)
+    return clock
+
+
+def test_failures_back_off(tmp_path, clock):
+    path = str(tmp_path / watch.JOURNAL_NAME)
+    journal = watch.Journal(path)
+    assert journal.retry_at("a", 60) == 0.0
+    journal.record("a", "a.mp4", "failed", error="boom")
+    assert journal.retry_at("a", 60) == 1060.0
+    clock.now += 100
+    journal.record("a", "a.mp4", "failed", error="boom")
+    assert journal.retry_at("a", 60) == 1220.0  # Twice the delay after the second failure
+    assert not journal.settled("a", 3)
+
+    # Kept across restarts
+    journal = watch.Journal(path)
+    assert (journal.failures("a"), journal.retry_at("a", 60)) == (2, 1220.0)
+    journal.record("a", "a.mp4", "failed", error="boom")
+    assert journal.settled("a", 3)
+
+
+def test_success_clears_failures(tmp_path, clock):
+    journal = watch.Journal(str(tmp_path / watch.JOURNAL_NAME))
+    journal.record("a", "a.mp4", "failed", error="boom")
+    journal.record("a", "a.mp4", "done", output="out")
+    assert journal.failures("a") == 0 and journal.retry_at("a", 60) == 0.0
+    assert journal.settled("a", 3)
@@ -0,0 +1,207 @@
+"""
+Structured timing of pipeline stages.
+
+Stages are wrapped in `span(name, **fields)` blocks. When a span ends, one
+record (name, start/end, duration, process, thread and the span fields,
+e.g. video, clip, bytes_read, bytes_written, frames_encoded) is passed to
+every registered sink. With no sink registered, `span` returns a shared
+no-op object, so instrumented code costs one attribute check.
+
+Sinks are callables taking a record dict; an optional `close()` is called
+by Tracer.close. JsonLinesSink appends one JSON object per line (safe to
+share between processes), ChromeTraceSink writes a Chrome trace
+(chrome://tracing, https://ui.perfetto.dev) and `export_chrome_trace`
+converts a JSON-lines trace into one.
+"""
+import json
+import os
+import threading
+import time
+
+# Fields nested spans take over from the enclosing span of the same thread
+INHERITED_FIELDS = ("video", "clip")
+
+
+class _NullSpan:
+    """Returned by `span` while tracing is off."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **fields):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """One timed stage. Use `set` to attach fields known only at the end (sizes, counts)."""
+
+    __slots__ = ("tracer", "name", "fields", "start", "_t0")
+
+    def __init__(self, tracer, name, fields):
+        self.tracer = tracer
+        self.name = name
+        self.fields = fields
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        if stack:
+            parent = stack[-1].fields
+            for key in INHERITED_FIELDS:
+                if key in parent and key not in self.fields:
+                    self.fields[key] = parent[key]
+        stack.append(self)
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._t0
+        stack = self.tracer._stack()
+        stack.pop()
+        record = {
+            "name": self.name,
+            "start": self.start,
+            "end": self.start + duration,
+            "duration": duration,
+            "pid": os.getpid(),
+            "thread": threading.current_thread().name,
+            "depth": len(stack),
+        }
+        record.update(self.fields)
+        if exc_type is not None:
+            record["error"] = repr(exc)
+        self.tracer.emit(record)
+        return False
+
+
+class Tracer:
+    """Hands finished span records to the registered sinks."""
+
+    def __init__(self):
+        self.sinks = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.sinks)
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def span(self, name, **fields):
+        if not self.sinks:
+            return NULL_SPAN
+        return Span(self, name, fields)
+
+    def emit(self, record):
+        with self._lock:
+            for sink in self.sinks:
+                sink(record)
+
+    def add_sink(self, sink):
+        with self._lock:
+            self.sinks.append(sink)
+
+    def close(self):
+        """Close and remove every sink."""
+        with self._lock:
+            sinks, self.sinks = self.sinks, []
+        for sink in sinks:
+            close = getattr(sink, "close", None)
+            if close is not None:
+                close()
+
+
+class JsonLinesSink:
+    """Appends each record as one JSON line.
+
+    Every record is a single append-mode write, so several processes can
+    trace into the same file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+    def __call__(self, record):
+        os.write(self._fd, (json.dumps(record, default=str) + "\n").encode())
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class ChromeTraceSink:
+    """Collects records and writes them in Chrome trace event format on close."""
+
+    def __init__(self, path):
+        self.path = path
+        self.events = []
+        self._tids = {}
+
+    def _tid(self, pid, thread):
+        key = (pid, thread)
+        if key not in self._tids:
+            self._tids[key] = len(self._tids) + 1
+            self.events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": self._tids[key],
+                                "args": {"name": thread}})
+        return self._tids[key]
+
+    def __call__(self, record):
+        args = {k: v for k, v in record.items()
+                if k not in ("name", "start", "end", "duration", "pid", "thread", "depth")}
+        self.events.append({
+            "name": record["name"],
+            "cat": "asmr",
+            "ph": "X",
+            "ts": record["start"] * 1e6,
+            "dur": record["duration"] * 1e6,
+            "pid": record["pid"],
+            "tid": self._tid(record["pid"], record["thread"]),
+            "args": args,
+        })
+
+    def close(self):
+        with open(self.path, "w") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f, default=str)
+
+
+def export_chrome_trace(jsonl_path, trace_path):
+    """Convert a JSON-lines trace into a Chrome trace file."""
+    sink = ChromeTraceSink(trace_path)
+    with open(jsonl_path) as f:
+        for line in f:
+            if line.strip():
+                sink(json.loads(line))
+    sink.close()
+    return trace_path
+
+
+# Process-wide tracer used by the pipeline
+TRACER = Tracer()
+span = TRACER.span
+
+
+def configure(jsonl_path=None):
+    """Trace into a JSON-lines file, or turn tracing off with None."""
+    TRACER.close()
+    if jsonl_path:
+        TRACER.add_sink(JsonLinesSink(jsonl_path))
@@ -0,0 +1,343 @@
+"""
+Watch-folder daemon: process videos as they land in the input folder.
+
+The folder is watched with inotify on Linux (polling elsewhere or when
+inotify is unavailable). A new file is queued once its size and
+modification time have not changed for `stable_seconds`, so recordings
+still being written or copied are left alone. Queued videos are analyzed
+by a pool of worker processes that stays up (and warmed up) between files
+and are encoded on `encode_slots` threads of the daemon, as in a batch run.
+
+Every finished or failed video is appended to a journal in the watched
+folder, keyed by a content fingerprint, so restarting the daemon does not
+process anything twice. A failed video is tried again, also after a
+restart, until it failed `max_attempts` times, waiting `retry_delay`
+seconds after the first failure and twice as long after each further one.
+Delete an entry (or the journal) to process a file again.
+
+    asmr-cutter-watch                     # watch INPUT_FOLDER
+    asmr-cutter-watch --folder /rec --stable-seconds 30
+"""
+import ctypes
+import ctypes.util
+import functools
+import json
+import os
+import select
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import batch
+import main
+from analysis_cache import fingerprint
+
+JOURNAL_NAME = ".asmr_journal.jsonl"
+
+# inotify(7) event masks
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+
+
+class PollingWatcher:
+    """Wakes up every `interval` seconds."""
+
+    def __init__(self, interval):
+        self.interval = interval
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        return True
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Wakes up when a file in the folder is created, written or moved in."""
+
+    def __init__(self, folder):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_CREATE | IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO
+        if libc.inotify_add_watch(self._fd, os.fsencode(folder), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f"inotify_add_watch failed for '{folder}'")
+
+    def wait(self, timeout):
+        """Block until something changes or `timeout` seconds pass. Returns True on a change."""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return False
+        # Drain the queued events: the folder is rescanned anyway
+        try:
+            while os.read(self._fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self._fd)
+
+
+def open_watcher(folder, poll_interval):
+    """inotify watcher for `folder`, or a polling one where inotify is not available."""
+    try:
+        return InotifyWatcher(folder)
+    except (OSError, AttributeError):
+        return PollingWatcher(poll_interval)
+
+
+class StabilityTracker:
+    """Reports files whose size and mtime stayed the same for `stable_seconds`."""
+
+    def __init__(self, stable_seconds):
+        self.stable_seconds = stable_seconds
+        self._seen = {}
+
+    def update(self, paths, now=None):
+        """Record the current state of `paths`; return the ones that are stable."""
+        now = time.monotonic() if now is None else now
+        ready = []
+        current = {}
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            state = (st.st_size, st.st_mtime_ns)
+            previous = self._seen.get(path)
+            since = previous[1] if previous is not None and previous[0] == state else now
+            current[path] = (state, since)
+            if st.st_size > 0 and now - since >= self.stable_seconds:
+                ready.append(path)
+        self._seen = current
+        return ready
+
+
+class Journal:
+    """Append-only record of processed videos (one JSON object per line)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Torn last line after a crash
+                    self.entries[entry["fingerprint"]] = entry
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def failures(self, key):
+        """Failed attempts in a row recorded for `key` (0 when it last succeeded or is unknown)."""
+        entry = self.entries.get(key)
+        if entry is None or entry["status"] != "failed":
+            return 0
+        return entry.get("attempts", 1)
+
+    def retry_at(self, key, retry_delay):
+        """Unix time from which a failed `key` may be tried again: the delay doubles with every failure."""
+        failures = self.failures(key)
+        if not failures:
+            return 0.0
+        return self.entries[key].get("failed_at", 0.0) + retry_delay * 2 ** (failures - 1)
+
+    def settled(self, key, max_attempts):
+        """Whether `key` needs no further attempt: it was processed, or failed max_attempts times."""
+        return key in self.entries and (self.entries[key]["status"] == "done"
+                                        or self.failures(key) >= max_attempts)
+
+    def record(self, key, video_path, status, output=None, error=None):
+        with self._lock:
+            entry = {
+                "fingerprint": key,
+                "file": os.path.basename(video_path),
+                "status": status,
+                "output": output,
+                "error": error,
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            }
+            if status == "failed":
+                entry["attempts"] = self.failures(key) + 1
+                entry["failed_at"] = time.time()
+            self.entries[key] = entry
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def _warm_up_worker(config):
+    """Run a tiny analysis so imports, FFT plans and JIT caches are ready for the first video."""
+    import numpy as np
+    main.preload()
+    noise = np.random.default_rng(0).standard_normal(config.hop_length * 64).astype(np.float32)
+    main.calculate_crispness_index(noise, 44100, hop_length=config.hop_length, min_freq=config.min_freq)
+
+
+class WatchDaemon:
+    """Queue stable new videos of `folder` and process them with long-lived workers.
+
+    A video that fails is queued again until it failed `max_attempts` times,
+    `retry_delay` seconds after its first failure and twice as long after
+    each further one.
+    """
+
+    def __init__(self, folder, stable_seconds=5.0, poll_interval=2.0, analysis_workers=None, encode_slots=1,
+                 config=None, max_attempts=3, retry_delay=60.0):
+        self.folder = folder
+        self.config = config or main.job_config()
+        self.stable_seconds = stable_seconds
+        self.poll_interval = poll_interval
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = max(0.0, retry_delay)
+        self.analysis_workers = batch.default_analysis_workers() if analysis_workers is None else analysis_workers
+        self.encode_slots = max(1, encode_slots)
+        self.journal = Journal(os.path.join(folder, JOURNAL_NAME))
+        self.stop_event = threading.Event()
+        self._active = set()  # Fingerprints queued or being processed
+        self._keys = {}  # path -> (size, mtime_ns, fingerprint) of files already looked at
+        self._lock = threading.Lock()
+
+    def _videos(self):
+        try:
+            names = os.listdir(self.folder)
+        except OSError:
+            return []
+        return [os.path.join(self.folder, n) for n in sorted(names)
+                if n.endswith(main.VIDEO_EXTENSIONS) and not n.startswith(".")]
+
+    def _key(self, video_path):
+        st = os.stat(video_path)
+        known = self._keys.get(video_path)
+        if known is None or known[:2] != (st.st_size, st.st_mtime_ns):
+            known = self._keys[video_path] = (st.st_size, st.st_mtime_ns, fingerprint(video_path))
+        return known[2]
+
+    def _finish(self, key, video_path, output=None, error=None):
+        if error is None:
+            print(f"✅ Processed '{os.path.basename(video_path)}' -> {output}")
+            self.journal.record(key, video_path, "done", output=output)
+        else:
+            self.journal.record(key, video_path, "failed", error=repr(error))
+            attempts = self.journal.failures(key)
+            if attempts < self.max_attempts:
+                retry = f"retrying in {self.journal.retry_at(key, self.retry_delay) - time.time():.0f}s"
+            else:
+                retry = "giving up"
+            print(f"❌ ERROR processing '{os.path.basename(video_path)}' "
+                  f"(attempt {attempts}/{self.max_attempts}, {retry}): {error}")
+        with self._lock:
+            self._active.discard(key)
+
+    def _render(self, key, video_path, analysis):
+        try:
+            output = main.process_single_video(video_path, analysis=analysis, config=self.config)
+        except Exception as e:
+            self._finish(key, video_path, error=e)
+        else:
+            self._finish(key, video_path, output=output)
+
+    def _submit(self, key, video_path, analyzers, encoders, analyze):
+        if analyzers is None:
+            encoders.submit(self._render, key, video_path, None)
+            return
+
+        def analyzed(future):
+            if future.cancelled() or self.stop_event.is_set():
+                # Stopping: leave the video for the next run
+                with self._lock:
+                    self._active.discard(key)
+                return
+            try:
+                analysis = future.result()
+            except Exception as e:
+                self._finish(key, video_path, error=e)
+                return
+            encoders.submit(self._render, key, video_path, analysis)
+
+        analyzers.submit(analyze, video_path).add_done_callback(analyzed)
+
+    def run(self):
+        """Watch until stop() is called (or SIGINT/SIGTERM when run from `cli`)."""
+        os.makedirs(self.folder, exist_ok=True)
+        tracker = StabilityTracker(self.stable_seconds)
+        watcher = open_watcher(self.folder, self.poll_interval)
+        kind = "inotify" if isinstance(watcher, InotifyWatcher) else f"polling every {self.poll_interval:g}s"
+        analyze = functools.partial(main.analyze_video_file, config=self.config, trace_file=main.TRACE_FILE)
+
+        # Warm up here first: forked workers start from this state
+        _warm_up_worker(self.config)
+        analyzers = None
+        if self.analysis_workers > 0:
+            analyzers = ProcessPoolExecutor(max_workers=self.analysis_workers, initializer=_warm_up_worker,
+                                            initargs=(self.config,))
+            # Start every worker now rather than when the first video arrives
+            for future in [analyzers.submit(os.getpid) for _ in range(self.analysis_workers)]:
+                future.result()
+        encoders = ThreadPoolExecutor(max_workers=self.encode_slots, thread_name_prefix="watch-encode")
+        print(f"👀 Watching '{self.folder}/' ({kind}, {self.analysis_workers} warm analysis workers). "
+              f"Press Ctrl+C to stop.")
+
+        try:
+            with main.trace_session():
+                while not self.stop_event.is_set():
+                    for video_path in tracker.update(self._videos()):
+                        try:
+                            key = self._key(video_path)
+                        except OSError:
+                            continue
+                        with self._lock:
+                            if (self.journal.settled(key, self.max_attempts) or key in self._active
+                                    or time.time() < self.journal.retry_at(key, self.retry_delay)):
+                                continue
+                            self._active.add(key)
+                        print(f"📥 Queued '{os.path.basename(video_path)}'")
+                        self._submit(key, video_path, analyzers, encoders, analyze)
+                    # Files still settling need another look after a while
+                    watcher.wait(min(self.poll_interval, self.stable_seconds))
+        finally:
+            watcher.close()
+            if analyzers is not None:
+                analyzers.shutdown(wait=True, cancel_futures=True)
+            encoders.shutdown(wait=True)
+            print("Watcher stopped.")
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def cli(argv=None):
+    """Command line entry point (asmr-cutter-watch)."""
+    import argparse
+    parser = argparse.ArgumentParser(description="Process videos as they are added to a folder.")
+    parser.add_argument("--folder", default=main.INPUT_FOLDER, help=f"folder to watch (default: {main.INPUT_FOLDER})")
+    parser.add_argument("--stable-seconds", type=float, default=main.WATCH_STABLE_SECONDS,
+                        help="how long a file must stop growing before it is processed")
+    parser.add_argument("--poll-interval", type=float, default=main.WATCH_POLL_INTERVAL,
+                        help="seconds between folder scans when inotify is not available")
+    args = parser.parse_args(argv)
+
+    daemon = WatchDaemon(args.folder, stable_seconds=args.stable_seconds, poll_interval=args.poll_interval,
+                         analysis_workers=main.ANALYSIS_WORKERS, encode_slots=main.ENCODE_SLOTS,
+                         max_attempts=main.WATCH_MAX_ATTEMPTS, retry_delay=main.WATCH_RETRY_DELAY)
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: daemon.stop())
+    daemon.run()
+
+
+if __name__ == "__main__":
+    cli()